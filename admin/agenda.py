@@ -0,0 +1,78 @@
+"""
+Funções auxiliares para os eventos da agenda
+Conversão entre o formulário, o formato armazenado e o formato exibido nos templates
+"""
+from datetime import datetime, time
+
+MONTHS_PT = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+
+# Aceita abreviações em português e em inglês no formato antigo (texto livre)
+_MONTH_LOOKUP = {name.lower(): i + 1 for i, name in enumerate(MONTHS_PT)}
+_MONTH_LOOKUP.update({
+    'feb': 2, 'apr': 4, 'may': 5, 'aug': 8, 'sep': 9, 'oct': 10, 'dec': 12,
+})
+
+
+def format_event(event_id, title, description, starts_at, ends_at, archived=False):
+    """Monta o dicionário usado pelos templates a partir dos campos armazenados"""
+    time_label = starts_at.strftime('%H:%M')
+    if ends_at:
+        time_label += ' - ' + ends_at.strftime('%H:%M')
+    return {
+        'id': event_id,
+        'title': title,
+        'description': description or '',
+        'starts_at': starts_at.isoformat(timespec='minutes'),
+        'ends_at': ends_at.isoformat(timespec='minutes') if ends_at else None,
+        'archived': archived,
+        'day': starts_at.strftime('%d'),
+        'month': MONTHS_PT[starts_at.month - 1],
+        'time': time_label,
+        'date': starts_at.strftime('%Y-%m-%d'),
+        'start_time': starts_at.strftime('%H:%M'),
+        'end_time': ends_at.strftime('%H:%M') if ends_at else '',
+    }
+
+
+def parse_event_form(form):
+    """
+    Converte os campos do formulário (date, start_time, end_time) em datetimes
+    Retorna (starts_at, ends_at) ou levanta ValueError
+    """
+    event_date = datetime.strptime(form.get('date', ''), '%Y-%m-%d').date()
+    start = datetime.strptime(form.get('start_time') or '00:00', '%H:%M').time()
+    starts_at = datetime.combine(event_date, start)
+    ends_at = None
+    if form.get('end_time'):
+        end = datetime.strptime(form.get('end_time'), '%H:%M').time()
+        ends_at = datetime.combine(event_date, end)
+        if ends_at < starts_at:
+            raise ValueError('Horário de término anterior ao início')
+    return starts_at, ends_at
+
+
+def parse_legacy_event(event, year):
+    """
+    Converte um evento no formato antigo ({'day', 'month', 'time'} em texto livre)
+    Retorna (starts_at, ends_at) ou None se não for possível interpretar
+    """
+    try:
+        day = int(str(event.get('day', '')).strip())
+        month = _MONTH_LOOKUP[str(event.get('month', '')).strip().lower()[:3]]
+    except (ValueError, KeyError):
+        return None
+
+    parts = [p.strip() for p in str(event.get('time') or '').replace('às', '-').split('-')]
+    times = []
+    for part in parts:
+        try:
+            times.append(datetime.strptime(part.replace('h', ':00' if part.endswith('h') else ':'), '%H:%M').time())
+        except ValueError:
+            continue
+
+    try:
+        starts_at = datetime.combine(datetime(year, month, day).date(), times[0] if times else time(0, 0))
+    except ValueError:
+        return None
+    ends_at = datetime.combine(starts_at.date(), times[1]) if len(times) > 1 else None
+    return starts_at, ends_at
@@ -0,0 +1,211 @@
+"""
+Cache em memória para os dados do site
+Coalesce recargas concorrentes (single-flight) e, opcionalmente, continua
+servindo a revisão anterior enquanto uma thread em segundo plano busca a nova
+(stale-while-revalidate)
+"""
+import copy
+import threading
+import time
+from flask import current_app, has_app_context
+
+
+class _Call:
+    """Chamada em andamento compartilhada entre as threads que aguardam"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Garante que apenas uma execução por chave aconteça ao mesmo tempo"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        """Executa fn uma vez; chamadas concorrentes com a mesma chave aguardam o resultado"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+
+class SiteDataCache:
+    """
+    Cache dos dados do site com TTL
+
+    - ttl: segundos em que os dados são considerados frescos
+    - stale_while_revalidate: após o TTL, serve a revisão anterior e recarrega
+      em segundo plano em vez de bloquear a requisição
+    - max_stale: segundos além do TTL em que a revisão anterior ainda pode ser servida
+    - max_bytes: orçamento de memória; valores maiores (medidos por sizeof) são
+      servidos sem ficar em cache
+    """
+
+    def __init__(self, loader, ttl=5.0, stale_while_revalidate=False, max_stale=60.0,
+                 max_bytes=None, sizeof=None):
+        self._loader = loader
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.max_stale = max_stale
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self.size = None
+        self.over_budget = False
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = 0.0
+        self._expired = False
+        self._generation = 0
+        self._refreshing = False
+        self.revision = 0
+
+    def get(self, copy_value=True):
+        """
+        Retorna os dados, recarregando apenas quando necessário
+
+        Com copy_value=False retorna o objeto compartilhado do cache, que não
+        deve ser modificado por quem o recebe
+        """
+        with self._lock:
+            value = self._value
+            expired = self._expired
+            age = time.monotonic() - self._loaded_at
+
+        if value is None or expired or age >= self.ttl:
+            if (value is not None and self.stale_while_revalidate
+                    and age < self.ttl + self.max_stale):
+                self._refresh_in_background()
+            else:
+                value = self._load_coalesced()
+
+        return copy.deepcopy(value) if copy_value else value
+
+    def last_value(self):
+        """Cópia da última versão carregada (mesmo expirada), ou None"""
+        with self._lock:
+            value = self._value
+        return copy.deepcopy(value) if value is not None else None
+
+    def refresh(self):
+        """Força uma recarga (coalescida) e retorna uma cópia dos dados novos"""
+        self._expire()
+        return copy.deepcopy(self._load_coalesced())
+
+    def invalidate(self):
+        """Marca os dados como expirados após uma escrita local"""
+        has_value = self._expire()
+        if has_value and self.stale_while_revalidate:
+            self._refresh_in_background()
+
+    def _expire(self):
+        with self._lock:
+            self._generation += 1
+            self._expired = True
+            return self._value is not None
+
+    def stats(self):
+        """Informações sobre o estado atual do cache"""
+        with self._lock:
+            return {
+                'revision': self.revision,
+                'age': time.monotonic() - self._loaded_at if self._value is not None else None,
+                'refreshing': self._refreshing,
+                'stale_while_revalidate': self.stale_while_revalidate,
+                'size': self.size,
+                'over_budget': self.over_budget,
+            }
+
+    def _load_coalesced(self):
+        with self._lock:
+            generation = self._generation
+        # A geração faz parte da chave: uma escrita local nunca reaproveita
+        # uma leitura iniciada antes dela
+        return self._flight.do(('load', generation), lambda: self._load(generation))
+
+    def _load(self, generation):
+        return self.store(self._loader(), generation)
+
+    def peek(self):
+        """Objeto compartilhado do cache se ainda fresco, sem recarregar; senão None"""
+        with self._lock:
+            if self._value is None or self._expired or time.monotonic() - self._loaded_at >= self.ttl:
+                return None
+            return self._value
+
+    def generation(self):
+        """Geração atual (incrementada a cada escrita local); usada com store()"""
+        with self._lock:
+            return self._generation
+
+    def store(self, value, generation):
+        """
+        Guarda dados carregados fora do cache (ex.: pelo backend assíncrono); descartados
+        se houve uma escrita local depois de generation
+        """
+        size = self._sizeof(value) if self._sizeof else None
+        with self._lock:
+            self.size = size
+            if self.max_bytes and size is not None and size > self.max_bytes:
+                # Acima do orçamento: não guarda (cada leitura recarrega do backend)
+                if not self.over_budget and has_app_context():
+                    current_app.logger.warning(
+                        f"Dados com {size} bytes excedem o orçamento de cache de {self.max_bytes} bytes")
+                self.over_budget = True
+                self._value = None
+                return value
+            self.over_budget = False
+            if generation == self._generation:
+                self._value = value
+                self._loaded_at = time.monotonic()
+                self._expired = False
+                self.revision += 1
+        return value
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        app = current_app._get_current_object() if has_app_context() else None
+        thread = threading.Thread(target=self._background_refresh, args=(app,), daemon=True)
+        thread.start()
+
+    def _background_refresh(self, app):
+        try:
+            if app is not None:
+                with app.app_context():
+                    self._load_coalesced()
+            else:
+                self._load_coalesced()
+        except Exception as e:
+            if app is not None:
+                app.logger.error(f"Erro ao recarregar dados em segundo plano: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
@@ -0,0 +1,148 @@
+"""
+Proteções para leituras do banco de dados
+Circuit breaker que falha rápido após erros repetidos e snapshot em disco
+com a última versão válida dos dados do site
+"""
+import json
+import os
+import threading
+import time
+from flask import current_app, has_app_context
+
+
+class CircuitOpenError(Exception):
+    """Levantada quando o circuito está aberto e a chamada nem é tentada"""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker para chamadas ao banco de dados
+
+    Após failure_threshold falhas consecutivas o circuito abre: as chamadas
+    falham imediatamente e uma thread em segundo plano testa o banco a cada
+    probe_interval segundos, fechando o circuito quando ele volta a responder.
+    """
+
+    def __init__(self, probe, failure_threshold=3, probe_interval=5.0, on_recover=None):
+        self._probe = probe
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self._on_recover = on_recover
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None
+
+    def call(self, fn):
+        """Executa fn, ou levanta CircuitOpenError se o circuito estiver aberto"""
+        if self.is_open:
+            raise CircuitOpenError('Banco de dados indisponível')
+        try:
+            result = fn()
+        except Exception:
+            self._record_failure()
+            raise
+        with self._lock:
+            self._failures = 0
+        return result
+
+    async def call_async(self, fn):
+        """Como call, para uma função assíncrona (modo ASGI)"""
+        if self.is_open:
+            raise CircuitOpenError('Banco de dados indisponível')
+        try:
+            result = await fn()
+        except Exception:
+            self._record_failure()
+            raise
+        with self._lock:
+            self._failures = 0
+        return result
+
+    def stats(self):
+        """Estado atual do circuito"""
+        with self._lock:
+            return {
+                'open': self._opened_at is not None,
+                'failures': self._failures,
+                'open_for': time.monotonic() - self._opened_at if self._opened_at else None,
+            }
+
+    def _record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures < self.failure_threshold or self._opened_at is not None:
+                return
+            self._opened_at = time.monotonic()
+            start_probe = not self._probing
+            self._probing = True
+
+        if start_probe:
+            app = current_app._get_current_object() if has_app_context() else None
+            if app is not None:
+                app.logger.error("Circuito do banco de dados aberto; servindo snapshot local")
+            thread = threading.Thread(target=self._probe_loop, args=(app,), daemon=True)
+            thread.start()
+
+    def _probe_loop(self, app):
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                if app is not None:
+                    with app.app_context():
+                        self._probe()
+                else:
+                    self._probe()
+            except Exception:
+                continue
+            break
+
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+        if app is not None:
+            app.logger.info("Banco de dados respondendo novamente; circuito fechado")
+        if self._on_recover:
+            self._on_recover()
+
+
+class SnapshotStore:
+    """Snapshot em disco (JSON compacto) da última leitura bem-sucedida"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._last_written = None
+
+    def save(self, data):
+        """Grava o snapshot de forma atômica, apenas se o conteúdo mudou"""
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+        with self._lock:
+            if payload == self._last_written:
+                return False
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(payload)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                if has_app_context():
+                    current_app.logger.error(f"Erro ao gravar snapshot dos dados: {e}")
+                return False
+            self._last_written = payload
+        return True
+
+    def load(self):
+        """Lê o snapshot do disco, ou None se não existir"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
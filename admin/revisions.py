@@ -0,0 +1,105 @@
+"""
+Histórico de revisões das seções dos dados do site
+Cada alteração de uma seção (ou página, 'pages.<nome>') é guardada como um delta
+comprimido das linhas do JSON da seção em relação à revisão anterior; a cada
+REVISION_CHECKPOINT_INTERVAL revisões é guardada uma cópia completa, o que limita
+quantos deltas são aplicados para reconstruir qualquer revisão
+"""
+import difflib
+import json
+import os
+import zlib
+
+# Revisões entre duas cópias completas de uma seção
+REVISION_CHECKPOINT_INTERVAL = int(os.environ.get('REVISION_CHECKPOINT_INTERVAL', 20))
+# Retenção: revisões mantidas por seção e idade máxima em dias (0 = sem limite de idade)
+REVISION_KEEP = int(os.environ.get('REVISION_KEEP', 200))
+REVISION_MAX_AGE_DAYS = int(os.environ.get('REVISION_MAX_AGE_DAYS', 0))
+
+FULL = 'full'
+DELTA = 'delta'
+
+
+def _lines(value):
+    return json.dumps(value, ensure_ascii=False, indent=1, sort_keys=True).split('\n')
+
+
+def _pack(obj):
+    return zlib.compress(json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 9)
+
+
+def _unpack(payload):
+    return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+
+def encode_full(value):
+    """Cópia completa da seção, comprimida"""
+    return _pack(_lines(value))
+
+
+def encode_delta(old_value, new_value):
+    """
+    Delta comprimido entre duas versões da seção: lista de trechos copiados da versão
+    anterior ([início, fim] em linhas) e de linhas novas (texto)
+    """
+    old_lines, new_lines = _lines(old_value), _lines(new_value)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif tag in ('replace', 'insert'):
+            ops.append('\n'.join(new_lines[j1:j2]))
+    return _pack(ops)
+
+
+def apply_chain(chain):
+    """Valor da última revisão de uma sequência que começa em uma cópia completa"""
+    if not chain or chain[0]['kind'] != FULL:
+        raise ValueError('Sequência de revisões sem cópia completa inicial')
+    lines = _unpack(chain[0]['payload'])
+    for row in chain[1:]:
+        result = []
+        for op in _unpack(row['payload']):
+            if isinstance(op, list):
+                result.extend(lines[op[0]:op[1]])
+            else:
+                result.extend(op.split('\n'))
+        lines = result
+    return json.loads('\n'.join(lines))
+
+
+def encode_revision(number, checkpoint, old_value, new_value):
+    """
+    (tipo, payload) da revisão number; checkpoint é o número da última cópia completa
+    Também grava cópia completa quando o delta não seria menor que ela
+    """
+    full = encode_full(new_value)
+    if checkpoint is None or number - checkpoint >= REVISION_CHECKPOINT_INTERVAL:
+        return FULL, full
+    delta = encode_delta(old_value, new_value)
+    if len(delta) >= len(full):
+        return FULL, full
+    return DELTA, delta
+
+
+def prune_point(index, keep=REVISION_KEEP, older_than=None):
+    """
+    Número da revisão a partir da qual o histórico é mantido (as anteriores podem ser
+    removidas), ou None; index é a lista (número, tipo, data) em ordem crescente
+    O corte é sempre em uma cópia completa, para que as revisões mantidas continuem
+    reconstruíveis, e a revisão mais recente nunca é removida
+    """
+    if not index:
+        return None
+    latest = index[-1][0]
+    expendable = latest - keep
+    if older_than is not None:
+        aged = [number for number, _, created_at in index if created_at and created_at < older_than]
+        if aged:
+            expendable = max(expendable, aged[-1])
+    expendable = min(expendable, latest - 1)
+    cut = max((number for number, kind, _ in index if kind == FULL and number <= expendable + 1), default=None)
+    if cut is None or cut <= index[0][0]:
+        return None
+    return cut
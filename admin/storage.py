@@ -0,0 +1,476 @@
+"""
+Camada de acesso aos dados do site
+Seleciona o backend (banco de dados ou arquivos JSON) e mantém os dados do site
+em cache na memória do worker, coalescendo recargas concorrentes
+Cada tenant (site hospedado) tem os próprios caches, snapshot e índice de busca
+"""
+import copy
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from flask import current_app, has_request_context, session
+from admin import revisions
+from admin.cache import SiteDataCache
+from admin.fallback import CircuitBreaker, CircuitOpenError, SnapshotStore
+from search import SearchIndex, expand_sections
+from startup import LazyModule, startup
+from tenants import TenantRegistry, current_tenant, tenant_context, tenant_path
+
+# Tentar usar banco de dados se DATABASE_URL estiver configurado, senão usar JSON
+USE_DATABASE = bool(os.environ.get('DATABASE_URL'))
+
+if USE_DATABASE:
+    # SQLAlchemy (e o driver do banco) só é importado no primeiro uso do backend,
+    # depois de configurado na aplicação
+    backend = LazyModule('admin.utils_db', on_load=startup.ensure_setup)
+else:
+    from admin import utils as backend
+
+
+def _backend_function(name):
+    """Função do backend; com o banco, resolvida apenas quando chamada"""
+    if not USE_DATABASE:
+        return getattr(backend, name)
+
+    def call(*args, **kwargs):
+        return getattr(backend, name)(*args, **kwargs)
+    call.__name__ = name
+    return call
+
+
+verify_user = _backend_function('verify_user')
+get_all_users = _backend_function('get_all_users')
+get_users_page = _backend_function('get_users_page')
+get_user_by_id = _backend_function('get_user_by_id')
+create_user = _backend_function('create_user')
+update_user = _backend_function('update_user')
+delete_user = _backend_function('delete_user')
+
+create_message = _backend_function('create_message')
+get_messages_page = _backend_function('get_messages_page')
+get_message = _backend_function('get_message')
+mark_message_read = _backend_function('mark_message_read')
+delete_message = _backend_function('delete_message')
+get_undelivered_messages = _backend_function('get_undelivered_messages')
+mark_messages_delivered = _backend_function('mark_messages_delivered')
+
+add_page_views = _backend_function('add_page_views')
+get_daily_views = _backend_function('get_daily_views')
+
+get_revision_sections = _backend_function('get_revision_sections')
+get_revisions_page = _backend_function('get_revisions_page')
+
+SNAPSHOT_FILE = os.environ.get(
+    'SITE_SNAPSHOT_FILE',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'cache', 'site_data.snapshot.json')
+)
+
+# Tenants com caches em memória ao mesmo tempo e orçamento de memória de cada um
+TENANT_CACHE_MAX = int(os.environ.get('TENANT_CACHE_MAX', 32))
+TENANT_CACHE_MAX_BYTES = int(os.environ.get('TENANT_CACHE_MAX_BYTES', 5 * 1024 * 1024))
+
+
+def _on_database_recovered():
+    for state in _tenant_states.values():
+        state.site_cache.invalidate()
+
+
+db_breaker = CircuitBreaker(
+    (lambda: backend.ping()) if USE_DATABASE else (lambda: True),
+    failure_threshold=int(os.environ.get('DB_BREAKER_THRESHOLD', 3)),
+    probe_interval=float(os.environ.get('DB_BREAKER_PROBE_INTERVAL', 5)),
+    on_recover=_on_database_recovered,
+)
+
+
+def _load_site_data():
+    """Carrega os dados do backend; com o banco indisponível, usa o snapshot local"""
+    if not USE_DATABASE:
+        return backend.load_data()
+
+    try:
+        data = db_breaker.call(backend.fetch_data)
+    except Exception as e:
+        # Com o circuito aberto a falha já foi registrada; não repetir no log
+        if not isinstance(e, CircuitOpenError):
+            current_app.logger.error(f"Erro ao carregar dados, usando snapshot local: {e}")
+        snapshot = _state().snapshot.load()
+        return snapshot if snapshot is not None else {}
+
+    _state().snapshot.save(data)
+    return data
+
+
+def _data_size(data):
+    """Tamanho aproximado dos dados em memória (JSON serializado)"""
+    return len(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+
+class TenantState:
+    """Caches, snapshot e índice de busca de um tenant"""
+
+    def __init__(self, tenant):
+        self.tenant = tenant
+        self.snapshot = SnapshotStore(tenant_path(os.path.dirname(SNAPSHOT_FILE),
+                                                  os.path.basename(SNAPSHOT_FILE), tenant=tenant))
+        self.site_cache = SiteDataCache(
+            self._scoped(_load_site_data),
+            ttl=float(os.environ.get('SITE_CACHE_TTL', 5)),
+            stale_while_revalidate=os.environ.get('SITE_CACHE_SWR', '0') == '1',
+            max_stale=float(os.environ.get('SITE_CACHE_MAX_STALE', 60)),
+            max_bytes=TENANT_CACHE_MAX_BYTES,
+            sizeof=_data_size,
+        )
+        self.upcoming_events_cache = SiteDataCache(
+            self._scoped(_load_upcoming_events),
+            ttl=self.site_cache.ttl,
+            stale_while_revalidate=self.site_cache.stale_while_revalidate,
+            max_stale=self.site_cache.max_stale,
+        )
+        self.search_index = SearchIndex()
+        # (objeto carregado, revisões) calculado uma vez por recarga do cache
+        self.revisions_memo = (None, {})
+        self.last_archive = 0.0
+
+    def _scoped(self, loader):
+        # As recargas em segundo plano rodam em outra thread: fixa o tenant
+        def load():
+            with tenant_context(self.tenant):
+                return loader()
+        return load
+
+
+_tenant_states = TenantRegistry(TenantState, max_tenants=TENANT_CACHE_MAX)
+
+
+def _state():
+    """Estado (caches) do tenant atual"""
+    return _tenant_states.get(current_tenant())
+
+
+def section_revision(value):
+    """Revisão (hash do conteúdo serializado) de uma seção dos dados do site"""
+    payload = json.dumps(value, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def get_section_revisions():
+    """
+    Revisões de cada seção dos dados atuais, incluindo as páginas ('pages.sobre', ...)
+    Recalculadas apenas quando o cache carrega uma nova versão dos dados
+    """
+    return _revisions_for(_state().site_cache.get(copy_value=False))
+
+
+def _revisions_for(data):
+    state = _state()
+    loaded, revisions = state.revisions_memo
+    if loaded is data:
+        return revisions
+
+    revisions = {key: section_revision(value) for key, value in data.items()}
+    pages = data.get('pages')
+    if isinstance(pages, dict):
+        for name, value in pages.items():
+            revisions[f'pages.{name}'] = section_revision(value)
+    if not state.site_cache.over_budget:
+        state.revisions_memo = (data, revisions)
+    return revisions
+
+
+def get_cached_section(key):
+    """
+    Retorna (valor, revisão) de uma seção a partir do cache, sem cópia
+    Aceita chaves de páginas no formato 'pages.<nome>'; retorna (None, None) se não existir
+    """
+    return _cached_section(_state().site_cache.get(copy_value=False), key)
+
+
+def _cached_section(data, key):
+    revisions = _revisions_for(data)
+    if key.startswith('pages.'):
+        value = (data.get('pages') or {}).get(key[len('pages.'):])
+    else:
+        value = data.get(key)
+    if value is None:
+        return None, None
+    return value, revisions.get(key)
+
+
+# Funções chamadas com a lista de seções alteradas após cada gravação (ex.: purge do CDN)
+_change_listeners = []
+
+
+def add_change_listener(listener):
+    """Registra uma função chamada com as seções alteradas ('footer', 'pages.sobre', ...)"""
+    _change_listeners.append(listener)
+
+
+def _notify_change(keys):
+    if not keys:
+        return
+    for listener in _change_listeners:
+        try:
+            listener(keys)
+        except Exception as e:
+            current_app.logger.error(f"Erro ao notificar alteração das seções {keys}: {e}")
+
+
+def _section_items(data):
+    """Pares (chave, valor) das seções, com cada página como 'pages.<nome>'"""
+    for key, value in data.items():
+        if key == 'pages' and isinstance(value, dict):
+            for name, page in value.items():
+                yield f'pages.{name}', page
+        else:
+            yield key, value
+
+
+def _changed_sections(changes):
+    """Seções de changes cujo conteúdo difere dos dados atuais em cache"""
+    revisions = _revisions_for(_state().site_cache.get(copy_value=False))
+    changed = [key for key, value in _section_items(changes)
+               if revisions.get(key) != section_revision(value)]
+    if isinstance(changes.get('pages'), dict):
+        # Páginas removidas também precisam ser invalidadas
+        changed.extend(key for key in revisions
+                       if key.startswith('pages.') and key[len('pages.'):] not in changes['pages'])
+    return changed
+
+
+def load_data(fresh=False):
+    """Carrega os dados do site (do cache em memória, a menos que fresh=True)"""
+    site_cache = _state().site_cache
+    if fresh:
+        return site_cache.refresh()
+    return site_cache.get()
+
+
+def _revision_base(changed):
+    """
+    Últimas revisões das seções que serão alteradas e, para as que ainda não têm
+    histórico, o valor atual (gravado como primeira revisão antes da alteração)
+    """
+    try:
+        heads = backend.get_revision_heads(changed)
+        current = {}
+        if any(key not in heads for key in changed):
+            current = dict(_section_items(backend.load_data()))
+        return heads, current
+    except Exception as e:
+        current_app.logger.error(f"Erro ao ler o histórico das seções {changed}: {e}")
+        return None
+
+
+def _record_revisions(changed, changes, base):
+    """Grava uma revisão (delta em relação à anterior) de cada seção alterada"""
+    if not changed or base is None:
+        return
+    heads, current = base
+    values = dict(_section_items(changes))
+    author = session.get('admin_username') if has_request_context() else None
+    rows = []
+    try:
+        for key in changed:
+            # Páginas removidas ficam registradas como revisão vazia (None)
+            value = values.get(key)
+            head = heads.get(key)
+            revision = section_revision(value)
+            if head is None:
+                number, checkpoint, previous = 0, None, None
+                if current.get(key) is not None:
+                    number = checkpoint = 1
+                    previous = current[key]
+                    rows.append(_revision_row(key, 1, revisions.FULL, revisions.encode_full(previous),
+                                              previous, None))
+            elif head['revision'] == revision:
+                continue
+            else:
+                number, checkpoint = head['number'], head['checkpoint']
+                try:
+                    previous = revisions.apply_chain(backend.get_revision_chain(key, number))
+                except ValueError:
+                    # Histórico incompleto: recomeça com uma cópia completa
+                    checkpoint, previous = None, None
+            kind, payload = revisions.encode_revision(number + 1, checkpoint, previous, value)
+            rows.append(_revision_row(key, number + 1, kind, payload, value, author))
+        if rows and not backend.add_revisions(rows):
+            current_app.logger.error(f"Histórico das seções {changed} não gravado")
+            return
+    except Exception as e:
+        current_app.logger.error(f"Erro ao gravar o histórico das seções {changed}: {e}")
+        return
+    # Retenção: aplicada quando uma nova cópia completa permite cortar o histórico
+    for row in rows:
+        if row['kind'] == revisions.FULL and row['number'] > 1:
+            prune_revisions(row['section'])
+
+
+def _revision_row(section, number, kind, payload, value, author):
+    return {'section': section, 'number': number, 'kind': kind, 'payload': payload,
+            'revision': section_revision(value), 'size': _data_size(value), 'author': author}
+
+
+def prune_revisions(section):
+    """Remove as revisões além da retenção (REVISION_KEEP e REVISION_MAX_AGE_DAYS)"""
+    older_than = None
+    if revisions.REVISION_MAX_AGE_DAYS:
+        cutoff = datetime.utcnow() - timedelta(days=revisions.REVISION_MAX_AGE_DAYS)
+        older_than = cutoff.strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        cut = revisions.prune_point(backend.get_revision_index(section), revisions.REVISION_KEEP, older_than)
+        return backend.delete_revisions(section, cut) if cut else 0
+    except Exception as e:
+        current_app.logger.error(f"Erro ao aplicar a retenção do histórico de {section}: {e}")
+        return 0
+
+
+def get_revision_value(section, number):
+    """Conteúdo da seção na revisão number (None se a revisão não existir)"""
+    chain = backend.get_revision_chain(section, number)
+    if not chain or chain[-1]['number'] != number:
+        return None
+    return revisions.apply_chain(chain)
+
+
+def restore_revision(section, number):
+    """
+    Volta a seção ao conteúdo da revisão number; a restauração é gravada como uma
+    nova revisão, então também pode ser desfeita
+    """
+    value = get_revision_value(section, number)
+    if value is None:
+        return False
+    if section.startswith('pages.'):
+        pages = copy.deepcopy(get_section_data('pages')) or {}
+        pages[section[len('pages.'):]] = value
+        return update_section('pages', pages)
+    return update_section(section, value)
+
+
+def save_data(data):
+    """Salva os dados do site, expira o cache e notifica as seções alteradas"""
+    changed = _changed_sections(data)
+    base = _revision_base(changed) if changed else None
+    result = backend.save_data(data)
+    _state().site_cache.invalidate()
+    if result is not False:
+        _record_revisions(changed, data, base)
+        _notify_change(changed)
+    return result
+
+
+def get_section_data(section):
+    """Obtém dados de uma seção específica diretamente do backend"""
+    if USE_DATABASE and db_breaker.is_open:
+        return (_state().snapshot.load() or {}).get(section, {})
+    return backend.get_section_data(section)
+
+
+def update_section(section, new_data):
+    """Atualiza uma seção específica, expira o cache e notifica as seções alteradas"""
+    changed = _changed_sections({section: new_data})
+    base = _revision_base(changed) if changed else None
+    state = _state()
+    result = backend.update_section(section, new_data)
+    state.site_cache.invalidate()
+    if result:
+        _section_updated(section, new_data, changed, base)
+    return result
+
+
+def _section_updated(section, new_data, changed, base):
+    """Revisões, índice de busca e notificações após gravar uma seção"""
+    _record_revisions(changed, {section: new_data}, base)
+    # Reindexa apenas a seção alterada (ou as páginas, no caso de 'pages')
+    state = _state()
+    for key, value in expand_sections({section: new_data}).items():
+        state.search_index.update_section(key, value, section_revision(value))
+    _notify_change(changed)
+
+
+# Eventos da agenda
+HOME_EVENTS_LIMIT = int(os.environ.get('HOME_EVENTS_LIMIT', 4))
+ARCHIVE_INTERVAL = float(os.environ.get('EVENTS_ARCHIVE_INTERVAL', 3600))
+
+
+def _load_upcoming_events():
+    if USE_DATABASE and db_breaker.is_open:
+        raise CircuitOpenError('Banco de dados indisponível')
+    _archive_if_due()
+    return backend.get_upcoming_events(HOME_EVENTS_LIMIT)
+
+
+def _archive_if_due():
+    """Arquiva eventos passados no máximo uma vez por intervalo em cada worker"""
+    state = _state()
+    now = time.monotonic()
+    if now - state.last_archive < ARCHIVE_INTERVAL:
+        return
+    state.last_archive = now
+    archived = backend.archive_past_events()
+    if archived:
+        current_app.logger.info(f"{archived} evento(s) passado(s) arquivado(s)")
+
+
+def get_upcoming_events():
+    """Próximos eventos exibidos na página inicial (em cache)"""
+    upcoming_events_cache = _state().upcoming_events_cache
+    try:
+        return upcoming_events_cache.get()
+    except CircuitOpenError:
+        return upcoming_events_cache.last_value() or []
+
+
+def get_events_page(page=1, per_page=10, archived=False):
+    """Página de eventos para o admin"""
+    _archive_if_due()
+    return backend.get_events_page(page, per_page, archived)
+
+
+def get_event(event_id):
+    """Busca um evento pelo ID"""
+    return backend.get_event(event_id)
+
+
+def create_event(title, description, starts_at, ends_at=None):
+    """Cria um evento e expira o cache de próximos eventos"""
+    result = backend.create_event(title, description, starts_at, ends_at)
+    _state().upcoming_events_cache.invalidate()
+    if result:
+        _notify_change(['events'])
+    return result
+
+
+def update_event(event_id, title, description, starts_at, ends_at=None):
+    """Atualiza um evento e expira o cache de próximos eventos"""
+    result = backend.update_event(event_id, title, description, starts_at, ends_at)
+    _state().upcoming_events_cache.invalidate()
+    if result:
+        _notify_change(['events'])
+    return result
+
+
+def delete_event(event_id):
+    """Remove um evento e expira o cache de próximos eventos"""
+    result = backend.delete_event(event_id)
+    _state().upcoming_events_cache.invalidate()
+    if result:
+        _notify_change(['events'])
+    return result
+
+
+# Busca
+def search_site(query, limit=10):
+    """Busca no conteúdo do site, sincronizando antes as seções alteradas"""
+    state = _state()
+    data = state.site_cache.get(copy_value=False)
+    revisions = dict(_revisions_for(data))
+    sections = expand_sections(data)
+    events = get_upcoming_events()
+    sections['events'] = {'title': 'Agenda', 'items': events}
+    revisions['events'] = section_revision(events)
+    state.search_index.sync(sections, revisions)
+    return state.search_index.search(query, limit)
@@ -0,0 +1,106 @@
+"""
+Versões assíncronas das funções de admin/storage.py (modo ASGI, asgi.py)
+Compartilham os caches, o snapshot, o circuit breaker e o histórico do modo síncrono:
+com o cache do tenant fresco, as leituras não fazem I/O; senão, os dados vêm do backend
+assíncrono (admin/utils_async.py), sem bloquear o loop de eventos, e alimentam o cache
+"""
+import asyncio
+import copy
+from flask import current_app
+from admin import storage, utils_async
+from admin.fallback import CircuitOpenError
+from tenants import current_tenant
+
+verify_user = utils_async.verify_user
+get_all_users = utils_async.get_all_users
+get_users_page = utils_async.get_users_page
+get_user_by_id = utils_async.get_user_by_id
+create_user = utils_async.create_user
+update_user = utils_async.update_user
+delete_user = utils_async.delete_user
+
+# Recargas em andamento por (tenant, geração do cache): requisições simultâneas aguardam a mesma
+_loads = {}
+
+
+async def _fetch_site_data():
+    """Carrega os dados do backend; com o banco indisponível, usa o snapshot local"""
+    if not storage.USE_DATABASE:
+        return await utils_async.load_data()
+
+    state = storage._state()
+    try:
+        data = await storage.db_breaker.call_async(utils_async.fetch_data)
+    except Exception as e:
+        # Com o circuito aberto a falha já foi registrada; não repetir no log
+        if not isinstance(e, CircuitOpenError):
+            current_app.logger.error(f"Erro ao carregar dados, usando snapshot local: {e}")
+        snapshot = await asyncio.to_thread(state.snapshot.load)
+        return snapshot if snapshot is not None else {}
+
+    await asyncio.to_thread(state.snapshot.save, data)
+    return data
+
+
+async def _site_data(fresh=False):
+    """Objeto compartilhado do cache do tenant atual, recarregado se necessário"""
+    site_cache = storage._state().site_cache
+    if not fresh:
+        data = site_cache.peek()
+        if data is not None:
+            return data
+    generation = site_cache.generation()
+    key = (current_tenant(), generation)
+    task = _loads.get(key)
+    if task is None:
+        async def load():
+            return site_cache.store(await _fetch_site_data(), generation)
+        task = _loads[key] = asyncio.ensure_future(load())
+        task.add_done_callback(lambda _: _loads.pop(key, None))
+    # shield: o cancelamento de uma requisição não cancela a recarga das demais
+    return await asyncio.shield(task)
+
+
+async def ensure_site_data():
+    """Garante os dados do tenant atual no cache (antes de atender uma rota sem I/O)"""
+    await _site_data()
+
+
+def site_data_cached():
+    """Se os dados do tenant atual estão no cache (acima do limite de memória não ficam)"""
+    return storage._state().site_cache.peek() is not None
+
+
+async def load_data(fresh=False):
+    """Carrega os dados do site (do cache em memória, a menos que fresh=True)"""
+    return copy.deepcopy(await _site_data(fresh))
+
+
+async def get_cached_section(key):
+    """(valor, revisão) de uma seção a partir do cache, sem cópia; (None, None) se não existir"""
+    return storage._cached_section(await _site_data(), key)
+
+
+async def get_section_data(section):
+    """Obtém dados de uma seção específica diretamente do backend"""
+    if storage.USE_DATABASE and storage.db_breaker.is_open:
+        snapshot = await asyncio.to_thread(storage._state().snapshot.load)
+        return (snapshot or {}).get(section, {})
+    return await utils_async.get_section_data(section)
+
+
+def _prepare_update(section, new_data):
+    changed = storage._changed_sections({section: new_data})
+    return changed, storage._revision_base(changed) if changed else None
+
+
+async def update_section(section, new_data):
+    """Atualiza uma seção específica, expira o cache e notifica as seções alteradas"""
+    await _site_data()
+    # Histórico e notificações usam as funções síncronas (em uma thread, fora do loop)
+    changed, base = await asyncio.to_thread(_prepare_update, section, new_data)
+    result = await utils_async.update_section(section, new_data)
+    storage._state().site_cache.invalidate()
+    if result:
+        await asyncio.to_thread(storage._section_updated, section, new_data, changed, base)
+    return result
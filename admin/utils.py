@@ -1,22 +1,89 @@
+import bisect
+import hmac
 import json
 import os
-from datetime import datetime
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from admin.agenda import format_event, parse_legacy_event
+from tenants import tenant_path
+from throttle import pad_unverified_login
 
-DATA_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'site_data.json')
-USERS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'users.json')
+try:
+    import fcntl
+except ImportError:
+    # Windows: lock de byte com msvcrt no lugar do flock
+    fcntl = None
+    import msvcrt
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+DATA_FILE = 'site_data.json'
+USERS_FILE = 'users.json'
+EVENTS_FILE = 'events.json'
+MESSAGES_FILE = 'messages.json'
+ANALYTICS_FILE = 'analytics.json'
+# Histórico de revisões das seções (SQLite: leituras e gravações por seção, sem reescrever o arquivo)
+REVISIONS_FILE = 'revisions.sqlite3'
+# Dias de estatísticas mantidos no arquivo JSON
+ANALYTICS_RETENTION_DAYS = 90
+
+def _data_file(filename):
+    """Caminho de um arquivo de dados do tenant atual (data/ ou data/tenants/<nome>/)"""
+    return tenant_path(DATA_DIR, filename)
 
 def load_data():
     """Carrega os dados do site do arquivo JSON"""
     try:
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
+        with open(_data_file(DATA_FILE), 'r', encoding='utf-8') as f:
             return json.load(f)
     except FileNotFoundError:
         return {}
 
+def _write_json(path, data):
+    """Grava o JSON em um arquivo temporário e o substitui de uma vez, para que
+    leituras concorrentes (ex.: tarefas em segundo plano) nunca vejam um arquivo parcial"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
+@contextmanager
+def _file_lock(path):
+    """Lock exclusivo entre processos para ler e regravar um arquivo JSON"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'w') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+        else:
+            _msvcrt_lock(lock)
+            try:
+                yield
+            finally:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _msvcrt_lock(lock):
+    # LK_LOCK desiste após ~10 s de espera: tenta de novo até conseguir
+    while True:
+        try:
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+def _read_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
 def save_data(data):
     """Salva os dados do site no arquivo JSON"""
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=4)
+    _write_json(_data_file(DATA_FILE), data)
 
 def get_section_data(section):
     """Obtém dados de uma seção específica"""
@@ -34,15 +101,14 @@ def update_section(section, new_data):
 def load_users():
     """Carrega os usuários do arquivo JSON"""
     try:
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
+        with open(_data_file(USERS_FILE), 'r', encoding='utf-8') as f:
             return json.load(f)
     except FileNotFoundError:
         return {'users': []}
 
 def save_users(users_data):
     """Salva os usuários no arquivo JSON"""
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users_data, f, ensure_ascii=False, indent=4)
+    _write_json(_data_file(USERS_FILE), users_data)
 
 def get_user_by_username(username):
     """Busca um usuário pelo nome de usuário"""
@@ -55,7 +121,13 @@ def get_user_by_username(username):
 def verify_user(username, password):
     """Verifica se o usuário e senha estão corretos"""
     user = get_user_by_username(username)
-    if user and user.get('password') == password:
+    # Sem hash nos arquivos JSON: toda verificação espera o tempo de um hash, como no banco,
+    # para o tempo de resposta não revelar quais usuários existem
+    pad_unverified_login()
+    if not user or not user.get('active', True):
+        return None
+    # Comparação em tempo constante
+    if hmac.compare_digest(str(user.get('password', '')).encode('utf-8'), (password or '').encode('utf-8')):
         return user
     return None
 
@@ -64,6 +136,28 @@ def get_all_users():
     users_data = load_users()
     return users_data.get('users', [])
 
+def get_users_page(after_id=None, limit=20, q='', active=None):
+    """
+    Página de usuários em ordem de ID (paginação por chave: IDs maiores que after_id)
+    q filtra pelo início do nome ou do email; retorna (usuários, after_id da próxima página)
+    """
+    prefix = (q or '').strip().lower()
+    users = sorted(load_users().get('users', []), key=lambda u: u.get('id', 0))
+    page = []
+    for user in users:
+        if after_id and user.get('id', 0) <= int(after_id):
+            continue
+        if active is not None and user.get('active', True) != active:
+            continue
+        if prefix and not (user.get('name', '').lower().startswith(prefix)
+                           or user.get('email', '').lower().startswith(prefix)):
+            continue
+        page.append(user)
+        if len(page) > limit:
+            break
+    next_after = page[limit - 1].get('id') if len(page) > limit else None
+    return page[:limit], next_after
+
 def get_user_by_id(user_id):
     """Busca um usuário pelo ID"""
     users_data = load_users()
@@ -134,3 +228,349 @@ def delete_user(user_id):
     save_users(users_data)
     return True
 
+
+# Funções para gerenciar os eventos da agenda
+def _event_to_dict(event):
+    starts_at = datetime.fromisoformat(event['starts_at'])
+    ends_at = datetime.fromisoformat(event['ends_at']) if event.get('ends_at') else None
+    return format_event(event['id'], event['title'], event.get('description'),
+                        starts_at, ends_at, event.get('archived', False))
+
+def load_events():
+    """Carrega os eventos do arquivo JSON (ordenados por data de início)"""
+    return _read_json(_data_file(EVENTS_FILE), {'events': []})
+
+def save_events(events_data):
+    """Salva os eventos no arquivo JSON, mantendo a ordem por data de início"""
+    events_data['events'].sort(key=lambda e: e['starts_at'])
+    _write_json(_data_file(EVENTS_FILE), events_data)
+
+def import_legacy_events():
+    """Move os eventos do formato antigo (agenda.events) para o arquivo de eventos; retorna quantos"""
+    if os.path.exists(_data_file(EVENTS_FILE)):
+        return 0
+    data = load_data()
+    agenda = data.get('agenda', {})
+    legacy_events = agenda.get('events') if isinstance(agenda, dict) else None
+    if not legacy_events:
+        return 0
+
+    year = datetime.now().year
+    today = datetime.now().date()
+    events = []
+    for legacy in legacy_events:
+        parsed = parse_legacy_event(legacy, year)
+        if not parsed:
+            continue
+        starts_at, ends_at = parsed
+        events.append({
+            'id': len(events) + 1,
+            'title': legacy.get('title') or 'Evento',
+            'description': legacy.get('description') or '',
+            'starts_at': starts_at.isoformat(timespec='minutes'),
+            'ends_at': ends_at.isoformat(timespec='minutes') if ends_at else None,
+            'archived': starts_at.date() < today
+        })
+
+    save_events({'events': events})
+    agenda.pop('events', None)
+    save_data(data)
+    return len(events)
+
+# Eventos lidos por arquivo, com as datas de início para a busca binária: (assinatura, eventos, datas)
+_sorted_events = {}
+
+def _upcoming_candidates():
+    """(eventos, datas de início) do arquivo, relidos só quando ele é regravado"""
+    path = _data_file(EVENTS_FILE)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return [], []
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cached = _sorted_events.get(path)
+    if cached is None or cached[0] != signature:
+        events = _read_json(path, {'events': []}).get('events', [])
+        cached = _sorted_events[path] = (signature, events, [e['starts_at'] for e in events])
+    return cached[1], cached[2]
+
+def get_upcoming_events(limit, now=None):
+    """Retorna os próximos eventos (a partir de hoje), em ordem cronológica"""
+    start_of_today = datetime.combine((now or datetime.now()).date(), time.min).isoformat(timespec='minutes')
+    events, starts = _upcoming_candidates()
+    # Os eventos ficam ordenados por starts_at (ISO 8601), então a busca é binária
+    start = bisect.bisect_left(starts, start_of_today)
+    upcoming = []
+    for event in events[start:]:
+        if len(upcoming) == limit:
+            break
+        if not event.get('archived'):
+            upcoming.append(event)
+    return [_event_to_dict(e) for e in upcoming]
+
+def get_events_page(page=1, per_page=10, archived=False):
+    """Retorna (eventos, total) de uma página da listagem do admin"""
+    events = [e for e in load_events().get('events', []) if bool(e.get('archived')) == archived]
+    if archived:
+        events.reverse()
+    offset = (page - 1) * per_page
+    return [_event_to_dict(e) for e in events[offset:offset + per_page]], len(events)
+
+def get_event(event_id):
+    """Busca um evento pelo ID"""
+    for event in load_events().get('events', []):
+        if event.get('id') == int(event_id):
+            return _event_to_dict(event)
+    return None
+
+def create_event(title, description, starts_at, ends_at=None):
+    """Cria um novo evento"""
+    events_data = load_events()
+    events = events_data.get('events', [])
+    new_event = {
+        'id': max([e.get('id', 0) for e in events], default=0) + 1,
+        'title': title,
+        'description': description or '',
+        'starts_at': starts_at.isoformat(timespec='minutes'),
+        'ends_at': ends_at.isoformat(timespec='minutes') if ends_at else None,
+        'archived': starts_at.date() < datetime.now().date()
+    }
+    events.append(new_event)
+    events_data['events'] = events
+    save_events(events_data)
+    return _event_to_dict(new_event)
+
+def update_event(event_id, title, description, starts_at, ends_at=None):
+    """Atualiza um evento existente"""
+    events_data = load_events()
+    for event in events_data.get('events', []):
+        if event.get('id') == int(event_id):
+            event['title'] = title
+            event['description'] = description or ''
+            event['starts_at'] = starts_at.isoformat(timespec='minutes')
+            event['ends_at'] = ends_at.isoformat(timespec='minutes') if ends_at else None
+            event['archived'] = starts_at.date() < datetime.now().date()
+            save_events(events_data)
+            return _event_to_dict(event)
+    return None
+
+def delete_event(event_id):
+    """Remove um evento"""
+    events_data = load_events()
+    events_data['events'] = [e for e in events_data.get('events', []) if e.get('id') != int(event_id)]
+    save_events(events_data)
+    return True
+
+def archive_past_events(now=None):
+    """Arquiva os eventos de dias anteriores; retorna quantos foram arquivados"""
+    start_of_today = datetime.combine((now or datetime.now()).date(), time.min).isoformat(timespec='minutes')
+    events_data = load_events()
+    count = 0
+    for event in events_data.get('events', []):
+        if event['starts_at'] >= start_of_today:
+            break
+        if not event.get('archived'):
+            event['archived'] = True
+            count += 1
+    if count:
+        save_events(events_data)
+    return count
+
+
+# Funções para as mensagens do formulário de contato
+def _update_messages(update):
+    """Aplica update(lista de mensagens) ao arquivo com lock e grava o resultado"""
+    path = _data_file(MESSAGES_FILE)
+    with _file_lock(path):
+        messages_data = _read_json(path, {'messages': []})
+        result = update(messages_data['messages'])
+        _write_json(path, messages_data)
+    return result
+
+def create_message(kind, name, email, phone, subject, message):
+    """Grava uma mensagem recebida pelo formulário de contato"""
+    def add(messages):
+        new_message = {
+            'id': max([m.get('id', 0) for m in messages], default=0) + 1,
+            'kind': kind,
+            'name': name,
+            'email': email,
+            'phone': phone,
+            'subject': subject,
+            'message': message,
+            'read': False,
+            'delivered_at': None,
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M')
+        }
+        messages.append(new_message)
+        return new_message
+    return _update_messages(add)
+
+def get_messages_page(page=1, per_page=20):
+    """Página de mensagens (mais recentes primeiro); retorna (mensagens, total)"""
+    messages = _read_json(_data_file(MESSAGES_FILE), {'messages': []})['messages']
+    start = (page - 1) * per_page
+    return list(reversed(messages))[start:start + per_page], len(messages)
+
+def get_message(message_id):
+    """Busca uma mensagem pelo ID"""
+    for message in _read_json(_data_file(MESSAGES_FILE), {'messages': []})['messages']:
+        if message.get('id') == int(message_id):
+            return message
+    return None
+
+def mark_message_read(message_id):
+    """Marca uma mensagem como lida"""
+    def mark(messages):
+        for message in messages:
+            if message.get('id') == int(message_id):
+                message['read'] = True
+                return True
+        return False
+    return _update_messages(mark)
+
+def delete_message(message_id):
+    """Remove uma mensagem"""
+    def delete(messages):
+        remaining = [m for m in messages if m.get('id') != int(message_id)]
+        deleted = len(remaining) != len(messages)
+        messages[:] = remaining
+        return deleted
+    return _update_messages(delete)
+
+def get_undelivered_messages(limit):
+    """Mensagens cuja notificação por email ainda não foi entregue (mais antigas primeiro)"""
+    messages = _read_json(_data_file(MESSAGES_FILE), {'messages': []})['messages']
+    return [m for m in messages if not m.get('delivered_at')][:limit]
+
+def mark_messages_delivered(message_ids):
+    """Marca as notificações das mensagens como entregues"""
+    ids = set(message_ids)
+    delivered_at = datetime.now().strftime('%Y-%m-%d %H:%M')
+    def mark(messages):
+        for message in messages:
+            if message.get('id') in ids:
+                message['delivered_at'] = delivered_at
+    if ids:
+        _update_messages(mark)
+
+
+# Funções para as estatísticas de visualizações
+def add_page_views(rows):
+    """Soma as contagens (dia, tipo, valor) no arquivo JSON, com lock entre os workers"""
+    cutoff = (date.today() - timedelta(days=ANALYTICS_RETENTION_DAYS)).isoformat()
+    path = _data_file(ANALYTICS_FILE)
+    with _file_lock(path):
+        days = _read_json(path, {})
+        for row in rows:
+            counts = days.setdefault(row['day'], {}).setdefault(row['kind'], {})
+            counts[row['value']] = counts.get(row['value'], 0) + row['count']
+        days = {day: counts for day, counts in days.items() if day >= cutoff}
+        _write_json(path, days)
+
+def get_daily_views(days=7):
+    """Contagens diárias dos últimos dias"""
+    since = (date.today() - timedelta(days=days - 1)).isoformat()
+    stored = _read_json(_data_file(ANALYTICS_FILE), {})
+    return [{'day': day, 'kind': kind, 'value': value, 'count': count}
+            for day, kinds in stored.items() if day >= since
+            for kind, counts in kinds.items()
+            for value, count in counts.items()]
+
+
+# Funções para o histórico de revisões das seções (SQLite em data/)
+_REVISION_COLUMNS = 'section, number, kind, revision, size, author, created_at'
+_revisions_ready = set()
+
+@contextmanager
+def _revisions_db():
+    path = _data_file(REVISIONS_FILE)
+    if path not in _revisions_ready:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    conn.row_factory = sqlite3.Row
+    try:
+        if path not in _revisions_ready:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS section_revisions ('
+                'section TEXT NOT NULL, number INTEGER NOT NULL, kind TEXT NOT NULL, payload BLOB NOT NULL, '
+                'revision TEXT NOT NULL, size INTEGER NOT NULL, author TEXT, created_at TEXT NOT NULL, '
+                'PRIMARY KEY (section, number))'
+            )
+            _revisions_ready.add(path)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+def get_revision_heads(sections):
+    """Última revisão de cada seção: {seção: {'number', 'revision', 'checkpoint'}}"""
+    if not sections:
+        return {}
+    placeholders = ', '.join('?' for _ in sections)
+    with _revisions_db() as conn:
+        rows = conn.execute(
+            'SELECT r.section, r.number, r.revision, latest.checkpoint FROM section_revisions r JOIN ('
+            "SELECT section, MAX(number) AS number, MAX(CASE WHEN kind = 'full' THEN number END) AS checkpoint "
+            f'FROM section_revisions WHERE section IN ({placeholders}) GROUP BY section'
+            ') latest ON r.section = latest.section AND r.number = latest.number', list(sections)
+        ).fetchall()
+    return {row['section']: {'number': row['number'], 'revision': row['revision'],
+                             'checkpoint': row['checkpoint']} for row in rows}
+
+def get_revision_chain(section, number):
+    """Revisões da última cópia completa até number (inclusive), em ordem crescente"""
+    with _revisions_db() as conn:
+        rows = conn.execute(
+            f'SELECT {_REVISION_COLUMNS}, payload FROM section_revisions WHERE section = ? AND number <= ? '
+            "AND number >= (SELECT MAX(number) FROM section_revisions WHERE section = ? AND kind = 'full' "
+            'AND number <= ?) ORDER BY number', (section, number, section, number)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def add_revisions(rows):
+    """Grava novas revisões (dicionários com section, number, kind, payload, revision, size, author)"""
+    created_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with _revisions_db() as conn:
+            conn.executemany(
+                f'INSERT INTO section_revisions ({_REVISION_COLUMNS}, payload) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(row['section'], row['number'], row['kind'], row['revision'], row['size'],
+                  row.get('author'), created_at, row['payload']) for row in rows]
+            )
+        return True
+    except sqlite3.Error:
+        return False
+
+def get_revision_index(section):
+    """(número, tipo, data) de todas as revisões da seção, em ordem crescente"""
+    with _revisions_db() as conn:
+        return [tuple(row) for row in conn.execute(
+            'SELECT number, kind, created_at FROM section_revisions WHERE section = ? ORDER BY number',
+            (section,))]
+
+def delete_revisions(section, before_number):
+    """Remove as revisões da seção anteriores a before_number"""
+    with _revisions_db() as conn:
+        return conn.execute('DELETE FROM section_revisions WHERE section = ? AND number < ?',
+                            (section, before_number)).rowcount
+
+def get_revision_sections():
+    """Seções com histórico: revisões guardadas, última revisão e bytes armazenados"""
+    with _revisions_db() as conn:
+        rows = conn.execute(
+            'SELECT section, COUNT(*) AS count, MAX(number) AS latest, MAX(created_at) AS updated_at, '
+            'SUM(LENGTH(payload)) AS stored_bytes FROM section_revisions GROUP BY section ORDER BY section'
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+def get_revisions_page(section, page=1, per_page=20):
+    """Página do histórico da seção (mais recentes primeiro); retorna (revisões, total)"""
+    with _revisions_db() as conn:
+        total = conn.execute('SELECT COUNT(*) FROM section_revisions WHERE section = ?', (section,)).fetchone()[0]
+        rows = conn.execute(
+            f'SELECT {_REVISION_COLUMNS} FROM section_revisions WHERE section = ? '
+            'ORDER BY number DESC LIMIT ? OFFSET ?', (section, per_page, (page - 1) * per_page)
+        ).fetchall()
+    return [dict(row) for row in rows], total
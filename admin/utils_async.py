@@ -0,0 +1,263 @@
+"""
+Versões assíncronas das funções de dados do site e de usuários (modo ASGI, asgi.py)
+Com o banco, usam o SQLAlchemy assíncrono sobre as mesmas tabelas (asyncpg no Postgres,
+aiosqlite no SQLite); o AsyncSession usa uma Session por baixo, então o filtro de tenant
+do database.py também se aplica. Com os arquivos JSON, as funções de admin/utils.py rodam
+em threads (asyncio.to_thread), sem bloquear o loop de eventos e com os mesmos locks de
+arquivo. Os resultados têm o mesmo formato das versões síncronas
+"""
+import asyncio
+import os
+from flask import current_app
+from admin.storage import USE_DATABASE
+from db_config import DEFAULT_POOL_RECYCLE, normalize_database_url
+from throttle import hash_slot, password_hash_seconds, ThrottledError
+
+if USE_DATABASE:
+    from sqlalchemy import select, or_, func
+    from sqlalchemy.exc import IntegrityError
+    from database import SiteData, User
+
+# Conexões do pool assíncrono (um único processo atende muitas requisições ao mesmo tempo)
+ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 10))
+ASYNC_DB_MAX_OVERFLOW = int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 20))
+
+_engine = None
+_sessions = None
+
+
+def async_database_url(url):
+    """DATABASE_URL com o driver assíncrono (postgresql+asyncpg ou sqlite+aiosqlite)"""
+    url = normalize_database_url(url)
+    scheme, rest = url.split('://', 1)
+    dialect = scheme.split('+')[0]
+    if dialect == 'postgresql':
+        # O asyncpg recebe o modo SSL como ssl=, não sslmode=
+        return 'postgresql+asyncpg://' + rest.replace('sslmode=', 'ssl=')
+    if dialect == 'sqlite':
+        return 'sqlite+aiosqlite://' + rest
+    raise ValueError(f'Banco sem driver assíncrono configurado: {dialect}')
+
+
+def _session():
+    """Nova AsyncSession; o engine é criado no primeiro uso"""
+    global _engine, _sessions
+    if _sessions is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        url = async_database_url(os.environ.get('DATABASE_URL'))
+        options = {'pool_pre_ping': True}
+        if not url.startswith('sqlite'):
+            options.update(pool_size=ASYNC_DB_POOL_SIZE, max_overflow=ASYNC_DB_MAX_OVERFLOW,
+                           pool_recycle=DEFAULT_POOL_RECYCLE)
+        _engine = create_async_engine(url, **options)
+        _sessions = async_sessionmaker(_engine, expire_on_commit=False)
+    return _sessions()
+
+
+async def dispose():
+    """Fecha as conexões do pool assíncrono (fim do processo)"""
+    global _engine, _sessions
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = _sessions = None
+
+
+async def fetch_data():
+    """Carrega os dados do site do banco de dados, propagando erros"""
+    async with _session() as session:
+        rows = (await session.execute(select(SiteData.key, SiteData.value))).all()
+    return {key: value for key, value in rows}
+
+
+async def load_data():
+    """Carrega os dados do site do banco de dados"""
+    try:
+        return await fetch_data()
+    except Exception as e:
+        current_app.logger.error(f"Erro ao carregar dados: {e}")
+        return {}
+
+
+async def get_section_data(section):
+    """Obtém dados de uma seção específica"""
+    try:
+        async with _session() as session:
+            value = (await session.execute(select(SiteData.value).filter_by(key=section))).scalar()
+        return value if value is not None else {}
+    except Exception as e:
+        current_app.logger.error(f"Erro ao obter seção {section}: {e}")
+        return {}
+
+
+async def update_section(section, new_data):
+    """Atualiza uma seção específica"""
+    async with _session() as session:
+        try:
+            site_data = (await session.execute(select(SiteData).filter_by(key=section))).scalars().first()
+            if site_data:
+                site_data.value = new_data
+            else:
+                session.add(SiteData(key=section, value=new_data))
+            await session.commit()
+            return True
+        except Exception as e:
+            current_app.logger.error(f"Erro ao atualizar seção {section}: {e}")
+            await session.rollback()
+            return False
+
+
+# Funções para gerenciar usuários
+def _check_password(user, password):
+    with hash_slot():
+        return user.check_password(password)
+
+
+async def verify_user(username, password):
+    """Verifica se o usuário e senha estão corretos"""
+    try:
+        async with _session() as session:
+            user = (await session.execute(
+                select(User).filter_by(username=username, active=True))).scalars().first()
+        # Usuário inexistente ou inativo: nenhum hash é calculado, mas a resposta demora
+        # o mesmo que uma verificação (espera no loop, sem ocupar CPU nem thread)
+        if user is None:
+            await asyncio.sleep(await asyncio.to_thread(password_hash_seconds))
+            return None
+        # O hash ocupa a CPU: calculado em uma thread, fora do loop de eventos
+        valid = await asyncio.to_thread(_check_password, user, password)
+        return user.to_dict() if valid else None
+    except ThrottledError:
+        raise
+    except Exception as e:
+        current_app.logger.error(f"Erro ao verificar usuário: {e}")
+        return None
+
+
+async def get_all_users():
+    """Retorna todos os usuários"""
+    try:
+        async with _session() as session:
+            users = (await session.execute(select(User))).scalars().all()
+        return [user.to_dict() for user in users]
+    except Exception as e:
+        current_app.logger.error(f"Erro ao listar usuários: {e}")
+        return []
+
+
+async def get_users_page(after_id=None, limit=20, q='', active=None):
+    """
+    Página de usuários em ordem de ID (paginação por chave: IDs maiores que after_id)
+    q filtra pelo início do nome ou do email; retorna (usuários, after_id da próxima página)
+    """
+    try:
+        query = select(User)
+        if after_id:
+            query = query.where(User.id > int(after_id))
+        if active is not None:
+            query = query.where(User.active == active)
+        if q:
+            prefix = q.strip().lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            query = query.where(or_(func.lower(User.name).like(prefix, escape='\\'),
+                                    func.lower(User.email).like(prefix, escape='\\')))
+        async with _session() as session:
+            users = (await session.execute(query.order_by(User.id).limit(limit + 1))).scalars().all()
+        next_after = users[limit - 1].id if len(users) > limit else None
+        return [user.to_dict() for user in users[:limit]], next_after
+    except Exception as e:
+        current_app.logger.error(f"Erro ao listar usuários: {e}")
+        return [], None
+
+
+async def get_user_by_id(user_id):
+    """Busca um usuário pelo ID"""
+    try:
+        async with _session() as session:
+            user = await session.get(User, int(user_id))
+        return user.to_dict() if user else None
+    except Exception as e:
+        current_app.logger.error(f"Erro ao buscar usuário por ID: {e}")
+        return None
+
+
+async def create_user(username, password, name, email):
+    """Cria um novo usuário"""
+    async with _session() as session:
+        try:
+            new_user = User(username=username, name=name, email=email, active=True)
+            await asyncio.to_thread(new_user.set_password, password)
+            session.add(new_user)
+            await session.commit()
+            return new_user.to_dict()
+        except IntegrityError:
+            # Nome de usuário já existe (restrição unique da tabela)
+            await session.rollback()
+            return None
+        except Exception as e:
+            current_app.logger.error(f"Erro ao criar usuário: {e}")
+            await session.rollback()
+            return None
+
+
+async def update_user(user_id, username, password, name, email, active):
+    """Atualiza um usuário existente"""
+    async with _session() as session:
+        try:
+            user = await session.get(User, int(user_id))
+            if not user:
+                return None
+            user.username = username
+            if password:  # Só atualiza senha se fornecida
+                await asyncio.to_thread(user.set_password, password)
+            user.name = name
+            user.email = email
+            user.active = active
+            await session.commit()
+            return user.to_dict()
+        except IntegrityError:
+            # Nome de usuário já usado por outro usuário
+            await session.rollback()
+            return None
+        except Exception as e:
+            current_app.logger.error(f"Erro ao atualizar usuário: {e}")
+            await session.rollback()
+            return None
+
+
+async def delete_user(user_id):
+    """Remove um usuário"""
+    async with _session() as session:
+        try:
+            user = await session.get(User, int(user_id))
+            if not user:
+                return False
+            await session.delete(user)
+            await session.commit()
+            return True
+        except Exception as e:
+            current_app.logger.error(f"Erro ao deletar usuário: {e}")
+            await session.rollback()
+            return False
+
+
+def _threaded(fn):
+    """Versão assíncrona de uma função de admin/utils.py, executada em uma thread"""
+    async def call(*args, **kwargs):
+        # to_thread copia o contexto: a thread vê o mesmo tenant e o mesmo app
+        return await asyncio.to_thread(fn, *args, **kwargs)
+    call.__name__ = fn.__name__
+    return call
+
+
+if not USE_DATABASE:
+    from admin import utils
+
+    load_data = fetch_data = _threaded(utils.load_data)
+    get_section_data = _threaded(utils.get_section_data)
+    update_section = _threaded(utils.update_section)
+    verify_user = _threaded(utils.verify_user)
+    get_all_users = _threaded(utils.get_all_users)
+    get_users_page = _threaded(utils.get_users_page)
+    get_user_by_id = _threaded(utils.get_user_by_id)
+    create_user = _threaded(utils.create_user)
+    update_user = _threaded(utils.update_user)
+    delete_user = _threaded(utils.delete_user)
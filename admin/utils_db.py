@@ -1,21 +1,52 @@
 """
 Funções utilitárias para gerenciar dados do site e usuários usando banco de dados
 """
-from database import db, SiteData, User
+from datetime import date, datetime, time, timedelta
+from database import db, SiteData, User, Event, PageView, ContactMessage, SectionRevision
 from flask import current_app
+from sqlalchemy import inspect, insert, text, or_, and_, case, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex
+from admin.agenda import parse_legacy_event
+from throttle import hash_slot, pad_unverified_login, ThrottledError
+from tenants import DEFAULT_TENANT, current_tenant
 
-def load_data():
-    """Carrega os dados do site do banco de dados"""
+# Tabelas com coluna tenant
+TENANT_MODELS = (SiteData, User, Event, PageView, ContactMessage)
+# Restrições e índices sem a coluna tenant, substituídos por versões que começam por ela
+_LEGACY_INDEXES = ('ix_users_active_id', 'ix_events_archived_starts_at',
+                   'ix_users_name_lower', 'ix_users_email_lower')
+_LEGACY_CONSTRAINTS = (('site_data', 'site_data_key_key'), ('users', 'users_username_key'),
+                       ('page_views', 'uq_page_views_day_kind_value'))
+
+def fetch_data():
+    """Carrega os dados do site do banco de dados, propagando erros"""
     try:
         data = {}
         site_data_list = SiteData.query.all()
         for item in site_data_list:
             data[item.key] = item.value
         return data
+    except Exception:
+        db.session.rollback()
+        raise
+
+def load_data():
+    """Carrega os dados do site do banco de dados"""
+    try:
+        return fetch_data()
     except Exception as e:
         current_app.logger.error(f"Erro ao carregar dados: {e}")
         return {}
 
+def ping():
+    """Verifica se o banco de dados está respondendo"""
+    try:
+        db.session.execute(text('SELECT 1'))
+        return True
+    finally:
+        db.session.rollback()
+
 def save_data(data):
     """Salva os dados do site no banco de dados"""
     try:
@@ -76,9 +107,14 @@ def verify_user(username, password):
     """Verifica se o usuário e senha estão corretos"""
     try:
         user = User.query.filter_by(username=username, active=True).first()
-        if user and user.check_password(password):
-            return user.to_dict()
-        return None
+        if user is None:
+            pad_unverified_login()
+            return None
+        with hash_slot():
+            valid = user.check_password(password)
+        return user.to_dict() if valid else None
+    except ThrottledError:
+        raise
     except Exception as e:
         current_app.logger.error(f"Erro ao verificar usuário: {e}")
         return None
@@ -92,6 +128,54 @@ def get_all_users():
         current_app.logger.error(f"Erro ao listar usuários: {e}")
         return []
 
+def get_users_page(after_id=None, limit=20, q='', active=None):
+    """
+    Página de usuários em ordem de ID (paginação por chave: IDs maiores que after_id)
+    q filtra pelo início do nome ou do email; retorna (usuários, after_id da próxima página)
+    """
+    try:
+        query = User.query
+        if after_id:
+            query = query.filter(User.id > int(after_id))
+        if active is not None:
+            query = query.filter(User.active == active)
+        if q:
+            prefix = q.strip().lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            query = query.filter(or_(func.lower(User.name).like(prefix, escape='\\'),
+                                     func.lower(User.email).like(prefix, escape='\\')))
+        users = query.order_by(User.id).limit(limit + 1).all()
+        next_after = users[limit - 1].id if len(users) > limit else None
+        return [user.to_dict() for user in users[:limit]], next_after
+    except Exception as e:
+        current_app.logger.error(f"Erro ao listar usuários: {e}")
+        db.session.rollback()
+        return [], None
+
+def upgrade_schema():
+    """
+    Atualiza bancos criados antes dos tenants: adiciona a coluna tenant (com o tenant
+    padrão), troca as restrições únicas antigas e cria os índices que faltarem
+    """
+    existing = inspect(db.engine)
+    postgres = db.engine.dialect.name == 'postgresql'
+    with db.engine.begin() as conn:
+        for model in TENANT_MODELS:
+            table = model.__tablename__
+            columns = {column['name'] for column in existing.get_columns(table)}
+            if 'tenant' not in columns:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN tenant VARCHAR(50) "
+                                  f"NOT NULL DEFAULT '{DEFAULT_TENANT}'"))
+        for name in _LEGACY_INDEXES:
+            conn.execute(text(f'DROP INDEX IF EXISTS {name}'))
+        if postgres:
+            # No SQLite (desenvolvimento) as restrições UNIQUE antigas não podem ser removidas
+            for table, constraint in _LEGACY_CONSTRAINTS:
+                conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}'))
+        # IF NOT EXISTS: índices de expressão (lower(...)) não são detectados por reflexão
+        for model in TENANT_MODELS:
+            for index in model.__table__.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+
 def get_user_by_id(user_id):
     """Busca um usuário pelo ID"""
     try:
@@ -106,10 +190,6 @@ def get_user_by_id(user_id):
 def create_user(username, password, name, email):
     """Cria um novo usuário"""
     try:
-        # Verificar se o username já existe
-        if User.query.filter_by(username=username).first():
-            return None
-        
         new_user = User(
             username=username,
             name=name,
@@ -122,6 +202,10 @@ def create_user(username, password, name, email):
         db.session.commit()
         
         return new_user.to_dict()
+    except IntegrityError:
+        # Nome de usuário já existe (restrição unique da tabela)
+        db.session.rollback()
+        return None
     except Exception as e:
         current_app.logger.error(f"Erro ao criar usuário: {e}")
         db.session.rollback()
@@ -134,11 +218,6 @@ def update_user(user_id, username, password, name, email, active):
         if not user:
             return None
         
-        # Verificar se o username já existe em outro usuário
-        existing_user = User.query.filter_by(username=username).first()
-        if existing_user and existing_user.id != int(user_id):
-            return None
-        
         user.username = username
         if password:  # Só atualiza senha se fornecida
             user.set_password(password)
@@ -148,6 +227,10 @@ def update_user(user_id, username, password, name, email, active):
         
         db.session.commit()
         return user.to_dict()
+    except IntegrityError:
+        # Nome de usuário já usado por outro usuário
+        db.session.rollback()
+        return None
     except Exception as e:
         current_app.logger.error(f"Erro ao atualizar usuário: {e}")
         db.session.rollback()
@@ -167,3 +250,350 @@ def delete_user(user_id):
         db.session.rollback()
         return False
 
+
+# Funções para gerenciar os eventos da agenda
+def get_upcoming_events(limit, now=None):
+    """Retorna os próximos eventos (a partir de hoje), em ordem cronológica"""
+    start_of_today = datetime.combine((now or datetime.now()).date(), time.min)
+    try:
+        events = (Event.query
+                  .filter(Event.archived.is_(False), Event.starts_at >= start_of_today)
+                  .order_by(Event.starts_at)
+                  .limit(limit)
+                  .all())
+        return [event.to_dict() for event in events]
+    except Exception as e:
+        current_app.logger.error(f"Erro ao listar próximos eventos: {e}")
+        db.session.rollback()
+        return []
+
+def get_events_page(page=1, per_page=10, archived=False):
+    """Retorna (eventos, total) de uma página da listagem do admin"""
+    try:
+        query = Event.query.filter(Event.archived.is_(archived))
+        # Ativos em ordem cronológica; arquivados do mais recente para o mais antigo
+        order = Event.starts_at.desc() if archived else Event.starts_at
+        total = query.count()
+        events = query.order_by(order).offset((page - 1) * per_page).limit(per_page).all()
+        return [event.to_dict() for event in events], total
+    except Exception as e:
+        current_app.logger.error(f"Erro ao listar eventos: {e}")
+        db.session.rollback()
+        return [], 0
+
+def get_event(event_id):
+    """Busca um evento pelo ID"""
+    try:
+        event = db.session.get(Event, int(event_id))
+        return event.to_dict() if event else None
+    except Exception as e:
+        current_app.logger.error(f"Erro ao buscar evento: {e}")
+        return None
+
+def create_event(title, description, starts_at, ends_at=None):
+    """Cria um novo evento"""
+    try:
+        event = Event(title=title, description=description,
+                      starts_at=starts_at, ends_at=ends_at,
+                      archived=starts_at.date() < datetime.now().date())
+        db.session.add(event)
+        db.session.commit()
+        return event.to_dict()
+    except Exception as e:
+        current_app.logger.error(f"Erro ao criar evento: {e}")
+        db.session.rollback()
+        return None
+
+def update_event(event_id, title, description, starts_at, ends_at=None):
+    """Atualiza um evento existente"""
+    try:
+        event = db.session.get(Event, int(event_id))
+        if not event:
+            return None
+        event.title = title
+        event.description = description
+        event.starts_at = starts_at
+        event.ends_at = ends_at
+        event.archived = starts_at.date() < datetime.now().date()
+        db.session.commit()
+        return event.to_dict()
+    except Exception as e:
+        current_app.logger.error(f"Erro ao atualizar evento: {e}")
+        db.session.rollback()
+        return None
+
+def delete_event(event_id):
+    """Remove um evento"""
+    try:
+        event = db.session.get(Event, int(event_id))
+        if event:
+            db.session.delete(event)
+            db.session.commit()
+            return True
+        return False
+    except Exception as e:
+        current_app.logger.error(f"Erro ao deletar evento: {e}")
+        db.session.rollback()
+        return False
+
+def archive_past_events(now=None):
+    """Arquiva os eventos de dias anteriores; retorna quantos foram arquivados"""
+    start_of_today = datetime.combine((now or datetime.now()).date(), time.min)
+    try:
+        count = (Event.query
+                 .filter(Event.archived.is_(False), Event.starts_at < start_of_today)
+                 .update({Event.archived: True}, synchronize_session=False))
+        db.session.commit()
+        return count
+    except Exception as e:
+        current_app.logger.error(f"Erro ao arquivar eventos: {e}")
+        db.session.rollback()
+        return 0
+
+def import_legacy_events():
+    """Move os eventos do formato antigo (lista em agenda.events) para a tabela de eventos"""
+    agenda = SiteData.query.filter_by(key='agenda').first()
+    if not agenda or not isinstance(agenda.value, dict) or not agenda.value.get('events'):
+        return 0
+
+    year = datetime.now().year
+    imported = 0
+    for legacy in agenda.value['events']:
+        parsed = parse_legacy_event(legacy, year)
+        if not parsed:
+            continue
+        starts_at, ends_at = parsed
+        db.session.add(Event(
+            title=legacy.get('title') or 'Evento',
+            description=legacy.get('description'),
+            starts_at=starts_at,
+            ends_at=ends_at,
+            archived=starts_at.date() < datetime.now().date()
+        ))
+        imported += 1
+
+    value = dict(agenda.value)
+    value.pop('events', None)
+    agenda.value = value
+    db.session.commit()
+    return imported
+
+
+# Funções para as mensagens do formulário de contato
+def create_message(kind, name, email, phone, subject, message):
+    """Grava uma mensagem recebida pelo formulário de contato"""
+    try:
+        new_message = ContactMessage(kind=kind, name=name, email=email, phone=phone,
+                                     subject=subject, message=message)
+        db.session.add(new_message)
+        db.session.commit()
+        return new_message.to_dict()
+    except Exception as e:
+        current_app.logger.error(f"Erro ao gravar mensagem de contato: {e}")
+        db.session.rollback()
+        return None
+
+def get_messages_page(page=1, per_page=20):
+    """Página de mensagens (mais recentes primeiro); retorna (mensagens, total)"""
+    try:
+        query = ContactMessage.query
+        total = query.count()
+        messages = (query.order_by(ContactMessage.id.desc())
+                    .offset((page - 1) * per_page).limit(per_page).all())
+        return [message.to_dict() for message in messages], total
+    except Exception as e:
+        current_app.logger.error(f"Erro ao listar mensagens: {e}")
+        return [], 0
+
+def get_message(message_id):
+    """Busca uma mensagem pelo ID"""
+    try:
+        message = db.session.get(ContactMessage, int(message_id))
+        return message.to_dict() if message else None
+    except Exception as e:
+        current_app.logger.error(f"Erro ao buscar mensagem: {e}")
+        return None
+
+def mark_message_read(message_id):
+    """Marca uma mensagem como lida"""
+    try:
+        ContactMessage.query.filter_by(id=int(message_id)).update({'read': True})
+        db.session.commit()
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Erro ao marcar mensagem como lida: {e}")
+        db.session.rollback()
+        return False
+
+def delete_message(message_id):
+    """Remove uma mensagem"""
+    try:
+        deleted = ContactMessage.query.filter_by(id=int(message_id)).delete()
+        db.session.commit()
+        return bool(deleted)
+    except Exception as e:
+        current_app.logger.error(f"Erro ao deletar mensagem: {e}")
+        db.session.rollback()
+        return False
+
+def get_undelivered_messages(limit):
+    """Mensagens cuja notificação por email ainda não foi entregue (mais antigas primeiro)"""
+    messages = (ContactMessage.query.filter(ContactMessage.delivered_at.is_(None))
+                .order_by(ContactMessage.id).limit(limit).all())
+    return [message.to_dict() for message in messages]
+
+def mark_messages_delivered(message_ids):
+    """Marca as notificações das mensagens como entregues"""
+    if not message_ids:
+        return
+    try:
+        (ContactMessage.query.filter(ContactMessage.id.in_(message_ids))
+         .update({'delivered_at': datetime.utcnow()}, synchronize_session=False))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+# Funções para as estatísticas de visualizações
+def add_page_views(rows):
+    """Soma as contagens (dia, tipo, valor) em uma única instrução de upsert"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    # Valores que ficam iguais após o corte ao tamanho da coluna são somados antes do upsert:
+    # o Postgres não aceita a mesma chave duas vezes na mesma instrução ON CONFLICT
+    counts = {}
+    for row in rows:
+        key = (row['day'], row['kind'], row['value'][:255])
+        counts[key] = counts.get(key, 0) + row['count']
+    tenant = current_tenant()
+    values = [{'tenant': tenant, 'day': date.fromisoformat(day), 'kind': kind, 'value': value, 'count': count}
+              for (day, kind, value), count in counts.items()]
+    statement = insert(PageView).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=['tenant', 'day', 'kind', 'value'],
+        set_={'count': PageView.count + statement.excluded.count}
+    )
+    try:
+        db.session.execute(statement)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def get_daily_views(days=7):
+    """Contagens diárias dos últimos dias"""
+    since = date.today() - timedelta(days=days - 1)
+    try:
+        rows = PageView.query.filter(PageView.day >= since).all()
+        return [{'day': row.day.isoformat(), 'kind': row.kind, 'value': row.value, 'count': row.count}
+                for row in rows]
+    except Exception as e:
+        current_app.logger.error(f"Erro ao carregar visualizações: {e}")
+        db.session.rollback()
+        return []
+
+
+# Funções para o histórico de revisões das seções
+_REVISION_DATE = '%Y-%m-%d %H:%M:%S'
+
+def _revision_to_dict(row, payload=False):
+    result = {'section': row.section, 'number': row.number, 'kind': row.kind, 'revision': row.revision,
+              'size': row.size, 'author': row.author,
+              'created_at': row.created_at.strftime(_REVISION_DATE) if row.created_at else None}
+    if payload:
+        result['payload'] = row.payload
+    return result
+
+def get_revision_heads(sections):
+    """Última revisão de cada seção: {seção: {'number', 'revision', 'checkpoint'}}"""
+    if not sections:
+        return {}
+    # Filtro de tenant explícito: a subconsulta agregada não passa pelo filtro do ORM
+    latest = (db.session.query(
+                  SectionRevision.section,
+                  func.max(SectionRevision.number).label('number'),
+                  func.max(case((SectionRevision.kind == 'full', SectionRevision.number))).label('checkpoint'))
+              .filter(SectionRevision.tenant == current_tenant(), SectionRevision.section.in_(list(sections)))
+              .group_by(SectionRevision.section).subquery())
+    rows = (db.session.query(SectionRevision.section, SectionRevision.number,
+                             SectionRevision.revision, latest.c.checkpoint)
+            .join(latest, and_(SectionRevision.section == latest.c.section,
+                               SectionRevision.number == latest.c.number)))
+    return {section: {'number': number, 'revision': revision, 'checkpoint': checkpoint}
+            for section, number, revision, checkpoint in rows}
+
+def get_revision_chain(section, number):
+    """Revisões da última cópia completa até number (inclusive), em ordem crescente"""
+    checkpoint = (db.session.query(func.max(SectionRevision.number))
+                  .filter(SectionRevision.section == section, SectionRevision.kind == 'full',
+                          SectionRevision.number <= number).scalar())
+    if checkpoint is None:
+        return []
+    rows = (SectionRevision.query
+            .filter(SectionRevision.section == section,
+                    SectionRevision.number.between(checkpoint, number))
+            .order_by(SectionRevision.number).all())
+    return [_revision_to_dict(row, payload=True) for row in rows]
+
+def add_revisions(rows):
+    """Grava novas revisões (dicionários com section, number, kind, payload, revision, size, author)"""
+    try:
+        db.session.execute(insert(SectionRevision), rows)
+        db.session.commit()
+        return True
+    except Exception as e:
+        current_app.logger.error(f"Erro ao gravar revisões: {e}")
+        db.session.rollback()
+        return False
+
+def get_revision_index(section):
+    """(número, tipo, data) de todas as revisões da seção, em ordem crescente"""
+    rows = (db.session.query(SectionRevision.number, SectionRevision.kind, SectionRevision.created_at)
+            .filter(SectionRevision.section == section).order_by(SectionRevision.number))
+    return [(number, kind, created_at.strftime(_REVISION_DATE) if created_at else None)
+            for number, kind, created_at in rows]
+
+def delete_revisions(section, before_number):
+    """Remove as revisões da seção anteriores a before_number"""
+    try:
+        deleted = (SectionRevision.query
+                   .filter(SectionRevision.section == section, SectionRevision.number < before_number)
+                   .delete(synchronize_session=False))
+        db.session.commit()
+        return deleted
+    except Exception as e:
+        current_app.logger.error(f"Erro ao remover revisões antigas: {e}")
+        db.session.rollback()
+        return 0
+
+def get_revision_sections():
+    """Seções com histórico: revisões guardadas, última revisão e bytes armazenados"""
+    try:
+        rows = (db.session.query(SectionRevision.section, func.count(SectionRevision.id),
+                                 func.max(SectionRevision.number), func.max(SectionRevision.created_at),
+                                 func.sum(func.length(SectionRevision.payload)))
+                .group_by(SectionRevision.section).order_by(SectionRevision.section))
+        return [{'section': section, 'count': count, 'latest': latest,
+                 'updated_at': updated_at.strftime(_REVISION_DATE) if updated_at else None,
+                 'stored_bytes': stored or 0}
+                for section, count, latest, updated_at, stored in rows]
+    except Exception as e:
+        current_app.logger.error(f"Erro ao listar o histórico: {e}")
+        db.session.rollback()
+        return []
+
+def get_revisions_page(section, page=1, per_page=20):
+    """Página do histórico da seção (mais recentes primeiro); retorna (revisões, total)"""
+    try:
+        query = SectionRevision.query.filter(SectionRevision.section == section)
+        total = query.count()
+        rows = (query.order_by(SectionRevision.number.desc())
+                .offset((page - 1) * per_page).limit(per_page).all())
+        return [_revision_to_dict(row) for row in rows], total
+    except Exception as e:
+        current_app.logger.error(f"Erro ao listar revisões: {e}")
+        db.session.rollback()
+        return [], 0
@@ -0,0 +1,161 @@
+"""
+Controle de admissão por classe de rota
+Cada worker conta as requisições em andamento de cada classe: as leituras públicas que
+podem vir do cache ('cached') nunca esperam; as demais leituras ('read': admin, busca)
+e as gravações ('write': POSTs do admin, login, contato) têm um limite de requisições
+simultâneas, para não ocuparem todas as threads do worker. Acima do limite a requisição
+espera uma vaga por pouco tempo em uma fila curta; com a fila cheia ou após a espera,
+é recusada com 503 e Retry-After
+"""
+import os
+import threading
+import time
+from flask import Response, g, request
+from db_config import gunicorn_concurrency
+
+CACHED = 'cached'
+READ = 'read'
+WRITE = 'write'
+
+
+def default_limits(threads):
+    """
+    ((limite, fila) das leituras, (limite, fila) das gravações) padrão para um worker com
+    threads threads: vagas e filas das duas classes somam menos que as threads (a partir
+    de 3), deixando ao menos um quarto delas para as páginas em cache; com 2 threads cada
+    classe tem uma vaga, sem fila, e com 1 thread não há o que limitar
+    """
+    if threads < 2:
+        return (0, 0), (0, 0)
+    budget = threads - max(1, threads // 4)
+    write = max(1, budget // 3)
+    read = max(1, budget - write)
+    return ((read + 1) // 2, read // 2), ((write + 1) // 2, write // 2)
+
+
+ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', '1') == '1'
+# Requisições simultâneas por worker (0 = sem limite) e tamanho da fila de espera; os
+# padrões vêm do número de threads do gunicorn (quem espera na fila também ocupa uma thread)
+(_READ_LIMIT, _READ_QUEUE), (_WRITE_LIMIT, _WRITE_QUEUE) = default_limits(gunicorn_concurrency()[1])
+ADMISSION_READ_LIMIT = int(os.environ.get('ADMISSION_READ_LIMIT', _READ_LIMIT))
+ADMISSION_READ_QUEUE = int(os.environ.get('ADMISSION_READ_QUEUE', _READ_QUEUE))
+ADMISSION_WRITE_LIMIT = int(os.environ.get('ADMISSION_WRITE_LIMIT', _WRITE_LIMIT))
+ADMISSION_WRITE_QUEUE = int(os.environ.get('ADMISSION_WRITE_QUEUE', _WRITE_QUEUE))
+# Espera máxima por uma vaga (segundos) e Retry-After das requisições recusadas
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 5))
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 5))
+
+_SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RouteClass:
+    """Requisições em andamento de uma classe, com limite e fila de espera"""
+
+    def __init__(self, name, limit=0, queue_max=0):
+        self.name = name
+        self.limit = limit
+        self.queue_max = queue_max
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.peak = 0
+        self.admitted = 0
+        self.shed = 0
+
+    def _full(self):
+        return self.limit and self.in_flight >= self.limit
+
+    def acquire(self, timeout):
+        """Ocupa uma vaga, esperando até timeout segundos; False se a requisição for recusada"""
+        with self._cond:
+            # Quem chega não passa à frente de quem já está na fila
+            if self._full() or self.queued:
+                if self.queued >= self.queue_max:
+                    self.shed += 1
+                    return False
+                self.queued += 1
+                deadline = time.monotonic() + timeout
+                try:
+                    while self._full():
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.shed += 1
+                            return False
+                        self._cond.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'queued': self.queued,
+                'peak': self.peak,
+                'admitted': self.admitted,
+                'shed': self.shed,
+            }
+
+
+class AdmissionController:
+    """Classifica cada requisição e aplica os limites da classe antes da view"""
+
+    def __init__(self):
+        self.classes = {
+            CACHED: RouteClass(CACHED),
+            READ: RouteClass(READ, ADMISSION_READ_LIMIT, ADMISSION_READ_QUEUE),
+            WRITE: RouteClass(WRITE, ADMISSION_WRITE_LIMIT, ADMISSION_WRITE_QUEUE),
+        }
+        self._endpoints = {}
+
+    def init_app(self, app):
+        if not ADMISSION_ENABLED:
+            return
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def set_route_class(self, endpoint, name):
+        """Classe das leituras (GET) de um endpoint, no lugar da classificação padrão"""
+        self._endpoints[endpoint] = name
+
+    def classify(self, endpoint, method):
+        if method not in _SAFE_METHODS:
+            return WRITE
+        if endpoint in self._endpoints:
+            return self._endpoints[endpoint]
+        if endpoint and endpoint.startswith('admin'):
+            return READ
+        return CACHED
+
+    def stats(self):
+        """Requisições em andamento, na fila, admitidas e recusadas por classe (neste worker)"""
+        return {name: route_class.stats() for name, route_class in self.classes.items()}
+
+    def _before_request(self):
+        route_class = self.classes[self.classify(request.endpoint, request.method)]
+        if not route_class.acquire(ADMISSION_QUEUE_TIMEOUT):
+            response = Response('Servidor sobrecarregado. Tente novamente em instantes.',
+                                503, mimetype='text/plain')
+            response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER)
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+        g._admission_class = route_class
+        return None
+
+    def _teardown_request(self, exc=None):
+        # Respostas em partes terminam aqui só depois do último bloco
+        route_class = g.pop('_admission_class', None)
+        if route_class is not None:
+            route_class.release()
+
+
+admission = AdmissionController()
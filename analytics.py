@@ -0,0 +1,192 @@
+"""
+Contagem de visualizações de páginas e de referrers
+Os contadores ficam na memória de cada worker (divididos em faixas com locks próprios,
+para que as requisições quase nunca disputem o mesmo lock) e são gravados em lote
+periodicamente e no encerramento do processo, separados por tenant
+"""
+import atexit
+import os
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+from flask import request
+from tenants import current_tenant, tenant_context
+
+FLUSH_INTERVAL = float(os.environ.get('ANALYTICS_FLUSH_INTERVAL', 60))
+ENABLED = os.environ.get('ANALYTICS_ENABLED', '1') == '1'
+# Referrers distintos contados por dia em cada worker; os demais são somados em OTHER_REFERRERS
+MAX_REFERRERS = int(os.environ.get('ANALYTICS_MAX_REFERRERS', 500))
+# Tamanho máximo dos valores gravados (o mesmo da coluna do banco)
+MAX_VALUE_LENGTH = 255
+
+# Rotas contadas (páginas públicas)
+TRACKED_ENDPOINTS = {'index', 'sobre', 'atividades', 'contato', 'consultas', 'busca'}
+
+# Agentes de robôs de busca e monitoramento não são contados
+_BOT_MARKERS = ('bot', 'crawl', 'spider', 'slurp', 'monitor', 'preview', 'curl', 'wget')
+
+PAGE = 'page'
+REFERRER = 'referrer'
+OTHER_REFERRERS = '(outros)'
+
+
+class StripedCounter:
+    """Contadores divididos em faixas; cada thread usa a faixa do seu identificador"""
+
+    def __init__(self, stripes=16):
+        self._stripes = [(threading.Lock(), {}) for _ in range(stripes)]
+
+    def add(self, key, amount=1):
+        lock, counts = self._stripes[threading.get_ident() % len(self._stripes)]
+        with lock:
+            counts[key] = counts.get(key, 0) + amount
+
+    def drain(self):
+        """Retorna e zera os contadores acumulados"""
+        merged = {}
+        for lock, counts in self._stripes:
+            with lock:
+                drained = dict(counts)
+                counts.clear()
+            for key, amount in drained.items():
+                merged[key] = merged.get(key, 0) + amount
+        return merged
+
+
+class PageViewBuffer:
+    """
+    Acumula as visualizações e as grava em lote com a função flush_fn(linhas),
+    chamada uma vez para cada tenant
+    """
+
+    def __init__(self, interval=60.0):
+        self.interval = interval
+        self.counter = StripedCounter()
+        self.app = None
+        self._flush_fn = None
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._started_pid = None
+        # Referrers já contados por (tenant, dia), para limitar quantos valores distintos são gravados
+        self._referrers = {}
+        self._referrers_lock = threading.Lock()
+
+    def init_app(self, app, flush_fn):
+        """Conta as páginas públicas da aplicação e grava os totais com flush_fn"""
+        if not ENABLED:
+            return
+        self.app = app
+        self._flush_fn = flush_fn
+        app.after_request(self._after_request)
+        atexit.register(self.flush)
+
+    def record(self, path, referrer=None, day=None):
+        tenant = current_tenant()
+        day = (day or date.today()).isoformat()
+        self.counter.add((tenant, day, PAGE, path[:MAX_VALUE_LENGTH]))
+        if referrer:
+            self.counter.add((tenant, day, REFERRER, self._referrer_value(tenant, day, referrer[:MAX_VALUE_LENGTH])))
+
+    def _referrer_value(self, tenant, day, referrer):
+        """O próprio referrer ou, passado o limite de valores distintos do dia, OTHER_REFERRERS"""
+        seen = self._referrers.get((tenant, day))
+        if seen is not None and referrer in seen:
+            return referrer
+        with self._referrers_lock:
+            seen = self._referrers.setdefault((tenant, day), set())
+            if len(seen) < MAX_REFERRERS:
+                seen.add(referrer)
+            return referrer if referrer in seen else OTHER_REFERRERS
+
+    def flush(self):
+        """Grava os contadores acumulados; em caso de erro eles voltam para o buffer"""
+        if self._flush_fn is None:
+            return 0
+        with self._flush_lock:
+            # Os referrers dos dias anteriores não recebem mais visualizações
+            today = date.today().isoformat()
+            with self._referrers_lock:
+                for key in [key for key in self._referrers if key[1] != today]:
+                    del self._referrers[key]
+            per_tenant = {}
+            for key, count in self.counter.drain().items():
+                per_tenant.setdefault(key[0], {})[key] = count
+            written = 0
+            for tenant, counts in per_tenant.items():
+                rows = [{'day': day, 'kind': kind, 'value': value, 'count': count}
+                        for (_, day, kind, value), count in counts.items()]
+                try:
+                    with tenant_context(tenant), self.app.app_context():
+                        self._flush_fn(rows)
+                except Exception as e:
+                    for key, count in counts.items():
+                        self.counter.add(key, count)
+                    self.app.logger.error(f"Erro ao gravar visualizações de páginas ({tenant}): {e}")
+                    continue
+                written += len(rows)
+            return written
+
+    def _after_request(self, response):
+        if (request.method == 'GET' and response.status_code == 200
+                and request.endpoint in TRACKED_ENDPOINTS):
+            agent = request.headers.get('User-Agent', '').lower()
+            if not any(marker in agent for marker in _BOT_MARKERS):
+                self.record(request.path, external_referrer(request.referrer, request.host))
+                self._ensure_started()
+        return response
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._start_lock:
+            if self._started_pid == pid:
+                return
+            threading.Thread(target=self._flush_loop, name='analytics-flush', daemon=True).start()
+            self._started_pid = pid
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+def external_referrer(referrer, host):
+    """Domínio do referrer, ignorando links internos do próprio site"""
+    if not referrer:
+        return None
+    netloc = urlsplit(referrer).netloc.lower()
+    if not netloc or netloc == host.lower():
+        return None
+    return netloc[4:] if netloc.startswith('www.') else netloc
+
+
+def summarize(rows, days=7, top=10, today=None):
+    """Totais por dia, páginas e referrers mais acessados a partir das linhas diárias"""
+    today = today or date.today()
+    per_day = {(today - timedelta(days=i)).isoformat(): 0 for i in range(days)}
+    pages = {}
+    referrers = {}
+    for row in rows:
+        day = str(row['day'])
+        if row['kind'] == PAGE:
+            if day in per_day:
+                per_day[day] += row['count']
+            pages[row['value']] = pages.get(row['value'], 0) + row['count']
+        elif row['kind'] == REFERRER:
+            referrers[row['value']] = referrers.get(row['value'], 0) + row['count']
+
+    def ranked(counts):
+        return sorted(counts.items(), key=lambda item: item[1], reverse=True)[:top]
+
+    return {
+        'days': [{'day': date.fromisoformat(day).strftime('%d/%m'), 'count': count}
+                 for day, count in sorted(per_day.items())],
+        'total': sum(per_day.values()),
+        'pages': ranked(pages),
+        'referrers': ranked(referrers),
+    }
+
+
+page_views = PageViewBuffer(FLUSH_INTERVAL)
@@ -1,39 +1,116 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, g
 from functools import wraps
+import json
 import os
+import threading
+import click
 
-# Tentar usar banco de dados se DATABASE_URL estiver configurado, senão usar JSON
-if os.environ.get('DATABASE_URL'):
-    from database import db
-    from admin.utils_db import (
-        load_data, save_data, get_section_data, update_section,
-        verify_user, get_all_users, get_user_by_id,
-        create_user, update_user, delete_user
-    )
-    USE_DATABASE = True
-else:
-    from admin.utils import (
-        load_data, save_data, get_section_data, update_section,
-        verify_user, get_all_users, get_user_by_id,
-        create_user, update_user, delete_user
-    )
-    USE_DATABASE = False
+# O backend (banco de dados ou JSON) é escolhido em admin/storage.py
+from admin.storage import (
+    USE_DATABASE,
+    load_data, save_data, get_section_data, update_section,
+    verify_user, get_users_page, get_user_by_id,
+    add_page_views, get_daily_views,
+    get_messages_page, get_message, mark_message_read, delete_message,
+    create_user, update_user, delete_user,
+    get_upcoming_events, get_events_page, get_event,
+    create_event, update_event, delete_event,
+    get_cached_section, get_section_revisions, section_revision, search_site,
+    get_revision_sections, get_revisions_page, get_revision_value, restore_revision,
+    add_change_listener, db_breaker
+)
+from admin.agenda import parse_event_form
+from cdn import (
+    CDN_MAX_AGE, ALL_CONTENT_TAG,
+    track_sections, add_surrogate_keys, apply_cache_headers, purge_sections
+)
+from jobs import job_queue
+from throttle import login_throttle, check_contact, password_hash_seconds, ThrottledError
+from analytics import page_views, summarize
+from contact import validate_submission, submit as submit_contact
+import assets
+import fragments
+import minify
+import tenants
+from preload import preload_hints
+from streaming import add_stream_listener, render_page
+from tenants import DEFAULT_TENANT, current_tenant, tenant_host, tenant_path
+from startup import startup
+from admission import admission, READ
 
 app = Flask(__name__)
+
+# Vários sites no mesmo processo: o tenant é escolhido pelo host da requisição
+# (registrado antes dos demais before_request)
+tenants.init_app(app)
+
+# Limites de requisições simultâneas por classe de rota: leituras públicas em cache
+# nunca esperam; admin, busca e gravações esperam uma vaga ou recebem 503
+admission.init_app(app)
+# A busca não vem do cache das páginas
+admission.set_route_class('busca', READ)
+
+# Atrás de proxy reverso (ex.: Render), usar o IP do cliente do X-Forwarded-For
+# informando quantos proxies confiáveis existem na frente da aplicação
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+if TRUSTED_PROXIES:
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+
+# Eventos por página na listagem da agenda no admin
+EVENTS_PER_PAGE = 20
+# Usuários por página na administração de usuários
+USERS_PER_PAGE = 20
+# Mensagens por página na caixa de entrada do admin
+MESSAGES_PER_PAGE = 20
+# Revisões por página no histórico de uma seção
+REVISIONS_PER_PAGE = 20
+
+# API de leitura: JSON compacto, sem escapar acentos
+app.json.compact = True
+app.json.ensure_ascii = False
+API_MAX_AGE = int(os.environ.get('API_MAX_AGE', 60))
+API_STALE_WHILE_REVALIDATE = int(os.environ.get('API_STALE_WHILE_REVALIDATE', 600))
+API_BATCH_LIMIT = 20
+# Páginas renderizadas após cada gravação para aquecer o cache do worker
+PRERENDER_PATHS = ['/', '/sobre', '/atividades', '/consultas', '/contato']
+# Espera antes do backup dos arquivos JSON, agrupando gravações seguidas
+BACKUP_DELAY = float(os.environ.get('JOBS_BACKUP_DELAY', 60))
 # Usar variável de ambiente para secret_key em produção, ou gerar uma nova
 app.secret_key = os.environ.get('SECRET_KEY', os.urandom(24).hex())
 
 # Configurar banco de dados se disponível
 if USE_DATABASE:
     # Configurar SQLAlchemy
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
+    from db_config import (
+        normalize_database_url, build_engine_options,
+        pool_monitor, log_high_utilization
+    )
+    database_url = normalize_database_url(os.environ.get('DATABASE_URL'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options(database_url)
+    
+    def setup_database():
+        """Registra o SQLAlchemy na aplicação (importado aqui, fora do import do app)"""
+        if 'sqlalchemy' in app.extensions:
+            return
+        from database import db
+        db.init_app(app)
+        
+        # Instrumentar o pool de conexões
+        with app.app_context():
+            pool_monitor.attach(db.engine)
+        pool_monitor.add_hook(log_high_utilization(app.logger))
     
-    # Inicializar banco de dados (será chamado na primeira requisição)
-    db.init_app(app)
+    # Executado antes da primeira requisição (ou do primeiro acesso ao backend)
+    startup.add_setup(setup_database)
     
     # Flag para garantir inicialização única
     _db_initialized = False
+    # O aquecimento (em segundo plano) e as primeiras requisições inicializam ao mesmo tempo:
+    # o lock evita que duas threads criem tabelas, migrem dados ou criem o admin em dobro
+    _init_lock = threading.RLock()
     
     def init_database():
         """Inicializa o banco de dados e migra dados se necessário"""
@@ -41,20 +118,59 @@ if USE_DATABASE:
         if _db_initialized:
             return
         
-        with app.app_context():
+        with _init_lock:
+            # Outra thread (aquecimento ou requisição) pode ter terminado enquanto esta esperava
+            if _db_initialized:
+                return
+            from database import db
+            with app.app_context():
+                try:
+                    db.create_all()
+                    
+                    # Colunas de tenant e índices em bancos criados antes deles
+                    from admin.utils_db import upgrade_schema
+                    upgrade_schema()
+                    
+                    # Tentar migrar dados dos arquivos JSON primeiro (preserva dados existentes)
+                    # Os arquivos de data/ pertencem ao tenant padrão; o código da migração
+                    # só é carregado se o banco ainda não tiver os dados
+                    from database import SiteData, User
+                    with tenants.tenant_context(DEFAULT_TENANT):
+                        if SiteData.query.count() == 0 or User.query.count() == 0:
+                            from migrate_data import migrate_json_to_database
+                            migrate_json_to_database(app)
+                    
+                    _db_initialized = True
+                except Exception as e:
+                    app.logger.error(f"Erro ao inicializar banco de dados: {e}")
+                    import traceback
+                    app.logger.error(traceback.format_exc())
+    
+    # Tenants já inicializados neste worker
+    _initialized_tenants = set()
+    
+    def init_tenant():
+        """Inicializa os dados padrão e o usuário admin do tenant atual, se estiver vazio"""
+        tenant = current_tenant()
+        if tenant in _initialized_tenants:
+            return
+        
+        with _init_lock:
+            if tenant in _initialized_tenants:
+                return
+            from database import db, SiteData, User
             try:
-                db.create_all()
-                
-                # Tentar migrar dados dos arquivos JSON primeiro (preserva dados existentes)
-                from migrate_data import migrate_json_to_database
-                migration_result = migrate_json_to_database(app)
-                
                 # Se não houve migração e o banco está vazio, inicializar com dados padrão
-                from database import SiteData, User
                 if SiteData.query.count() == 0:
                     from database import init_default_data
                     init_default_data()
-                    app.logger.info("Dados padrão inicializados no banco de dados")
+                    app.logger.info(f"Dados padrão inicializados no banco de dados ({tenant})")
+                
+                # Converter eventos do formato antigo (lista em agenda.events) em linhas
+                from admin.utils_db import import_legacy_events
+                imported_events = import_legacy_events()
+                if imported_events:
+                    app.logger.info(f"{imported_events} evento(s) da agenda convertidos para a tabela de eventos")
                 
                 # Verificar se já existe usuário admin (apenas se não houver usuários)
                 if User.query.count() == 0:
@@ -67,31 +183,153 @@ if USE_DATABASE:
                     admin_user.set_password('admin123')
                     db.session.add(admin_user)
                     db.session.commit()
-                    app.logger.info("Usuário admin padrão criado")
+                    app.logger.info(f"Usuário admin padrão criado ({tenant})")
                 
-                _db_initialized = True
+                _initialized_tenants.add(tenant)
             except Exception as e:
-                app.logger.error(f"Erro ao inicializar banco de dados: {e}")
-                import traceback
-                app.logger.error(traceback.format_exc())
+                db.session.rollback()
+                app.logger.error(f"Erro ao inicializar tenant {tenant}: {e}")
     
     # Inicializar banco na primeira requisição
     @app.before_request
     def ensure_database_initialized():
         if USE_DATABASE and not _db_initialized:
             init_database()
+        if USE_DATABASE and _db_initialized:
+            init_tenant()
+else:
+    def import_json_events():
+        """Converte os eventos do formato antigo (agenda.events) de cada tenant, uma vez na inicialização"""
+        from admin.utils import import_legacy_events
+        for tenant in tenants.tenant_names():
+            with tenants.tenant_context(tenant):
+                try:
+                    imported_events = import_legacy_events()
+                    if imported_events:
+                        app.logger.info(f"{imported_events} evento(s) da agenda convertidos para o arquivo de eventos ({tenant})")
+                except Exception as e:
+                    app.logger.error(f"Erro ao converter eventos da agenda ({tenant}): {e}")
+
+    startup.add_setup(import_json_events)
+
+# Tarefas executadas em segundo plano após as gravações do admin
+job_queue.init_app(app)
+
+def warm_cache(payload):
+    """Recarrega os dados em cache e pré-renderiza as páginas públicas"""
+    load_data(fresh=True)
+    search_site('')
+    # As páginas são pedidas pelo host do tenant da tarefa
+    base_url = f"http://{tenant_host() or 'localhost'}"
+    with app.test_client() as client:
+        for path in PRERENDER_PATHS:
+            # get_data() consome as páginas enviadas em partes (STREAM_TEMPLATES)
+            # User-Agent de robô: o aquecimento não entra nas estatísticas de visualizações
+            client.get(path, base_url=base_url, headers={'User-Agent': 'warmup-bot'}).get_data()
+
+def backup_json(payload):
+    """Copia os arquivos JSON de dados do tenant para <pasta de dados>/backups"""
+    from migrate_data import backup_json_files
+    backup_json_files(tenant_path('data'))
+
+job_queue.register('warm_cache', warm_cache)
+job_queue.register('backup_json', backup_json)
+
+def warm_up_database():
+    """Cria/atualiza as tabelas e inicializa cada tenant antes do primeiro acesso"""
+    with app.app_context():
+        for tenant in tenants.tenant_names():
+            with tenants.tenant_context(tenant):
+                ensure_database_initialized()
+        if not _db_initialized:
+            raise RuntimeError('banco de dados não inicializado')
+
+def warm_up_pages():
+    """Carrega os dados e pré-renderiza as páginas públicas de cada tenant"""
+    with app.app_context():
+        for tenant in tenants.tenant_names():
+            with tenants.tenant_context(tenant):
+                warm_cache({})
+
+# O worker fica pronto (/healthz) depois de aquecer os caches, em segundo plano
+startup.init_app(app)
+if USE_DATABASE:
+    startup.add_warmup('database', warm_up_database)
+startup.add_warmup('pages', warm_up_pages)
+# Tempo de um hash de senha, usado nos logins de usuários inexistentes
+startup.add_warmup('password_hash', password_hash_seconds)
+startup.add_status('admission', admission.stats)
+
+def schedule_post_save_jobs(keys):
+    """Enfileira o purge no CDN, o aquecimento do cache e o backup após uma gravação"""
+    purge_sections(keys)
+    job_queue.enqueue('warm_cache', key='warm_cache')
+    if not USE_DATABASE:
+        job_queue.enqueue('backup_json', key='backup_json', delay=BACKUP_DELAY)
+
+add_change_listener(schedule_post_save_jobs)
+
+# Visualizações de páginas: contadas na memória e gravadas em lote
+page_views.init_app(app, add_page_views)
 
 @app.context_processor
 def inject_data():
     """Injeta dados globais em todos os templates"""
     data = load_data()
+    if 'surrogate_keys' in g:
+        data = track_sections(data)
     return dict(data=data)
 
+def sections_revisions(sections):
+    """Revisões atuais das seções (chave dos fragmentos {% cache %} e dos preloads)"""
+    revisions = get_section_revisions()
+    return tuple(revisions.get(section) for section in sections)
+
+def rendered_revisions(sections, data):
+    """
+    Revisões das seções nos dados renderizados pelo fragmento {% cache %}: o cache de dados
+    pode ter sido recarregado depois de o template receber os dados
+    """
+    data = data if isinstance(data, dict) else {}
+    # dict.get: as seções do fragmento já são registradas em fragment_sections_used
+    pages = dict.get(data, 'pages') or {}
+    return tuple(section_revision(pages.get(section[len('pages.'):]) if section.startswith('pages.')
+                                  else dict.get(data, section))
+                 for section in sections)
+
+def fragment_sections_used(sections):
+    """Fragmentos servidos do cache não leem os dados: registra as seções para o Surrogate-Key"""
+    if 'surrogate_keys' in g:
+        add_surrogate_keys(*sections)
+
+# Cabeçalho e rodapé renderizados uma vez por revisão das seções que usam
+fragments.init_app(app, rendered_revisions, fragment_sections_used)
+# URLs versionadas dos arquivos estáticos e HTML minificado
+assets.init_app(app)
+minify.init_app(app)
+# Cabeçalho Link (e 103 Early Hints) com os recursos críticos de cada rota
+preload_hints.init_app(app, sections_revisions)
+add_stream_listener(preload_hints.page_streamed)
+
+def page_data():
+    """Dados do site para páginas públicas, registrando as seções usadas (Surrogate-Key)"""
+    return track_sections(load_data())
+
+@app.after_request
+def add_cache_headers(response):
+    """Marca as respostas públicas com as seções usadas para o purge no CDN"""
+    # Com o banco indisponível as páginas vêm do snapshot local; não deixar o CDN guardá-las
+    if USE_DATABASE and db_breaker.is_open:
+        return response
+    return apply_cache_headers(response)
+
 def login_required(f):
     """Decorator para proteger rotas administrativas"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if 'admin_logged_in' not in session:
+        # A sessão vale apenas para o tenant (site) em que o login foi feito
+        if ('admin_logged_in' not in session
+                or session.get('admin_tenant', DEFAULT_TENANT) != current_tenant()):
             return redirect(url_for('admin_login'))
         return f(*args, **kwargs)
     return decorated_function
@@ -99,13 +337,14 @@ def login_required(f):
 # Rotas públicas
 @app.route('/')
 def index():
-    data = load_data()
-    return render_template('index.html', data=data)
+    data = page_data()
+    add_surrogate_keys('events')
+    return render_page('index.html', data=data, upcoming_events=get_upcoming_events())
 
 @app.route('/sobre')
 def sobre():
     try:
-        data = load_data()
+        data = page_data()
         sobre_data = data.get('pages', {}).get('sobre', {})
         
         # Garantir que a estrutura está correta
@@ -122,28 +361,140 @@ def sobre():
         if 'visao' not in sobre_data:
             sobre_data['visao'] = {'title': 'Nossa Visão', 'content': ''}
         
-        return render_template('sobre.html', data=data, sobre=sobre_data)
+        return render_page('sobre.html', data=data, sobre=sobre_data)
     except Exception as e:
         app.logger.error(f"Erro ao carregar página Sobre: {e}")
         import traceback
         app.logger.error(traceback.format_exc())
-        # Retornar página com dados vazios em caso de erro
-        return render_template('sobre.html', data={}, sobre={})
+        # Retornar página sem o conteúdo da seção; cabeçalho e rodapé continuam
+        # usando os dados injetados pelo context processor. A página parcial não vai para o CDN
+        g.pop('surrogate_keys', None)
+        return render_page('sobre.html', sobre={})
 
 @app.route('/atividades')
 def atividades():
-    data = load_data()
-    return render_template('atividades.html', data=data)
+    data = page_data()
+    return render_page('atividades.html', data=data)
 
 @app.route('/contato')
 def contato():
-    data = load_data()
-    return render_template('contato.html', data=data)
+    data = page_data()
+    return render_page('contato.html', data=data, form={},
+                       tipo=request.args.get('tipo', 'contato'),
+                       enviado=request.args.get('enviado') == '1')
+
+@app.route('/contato', methods=['POST'])
+def contato_enviar():
+    """Recebe o formulário de contato; a notificação por email é enviada em segundo plano"""
+    wants_json = request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+    
+    def error_response(errors, status, retry_after=None):
+        if wants_json:
+            response = jsonify({'ok': False, 'errors': errors})
+            response.status_code = status
+        else:
+            response = app.make_response((render_template(
+                'contato.html', form=request.form, form_errors=errors,
+                tipo=request.form.get('tipo', 'contato'), enviado=False), status))
+        if retry_after:
+            response.headers['Retry-After'] = str(retry_after)
+        return response
+    
+    # Campo oculto preenchido apenas por robôs: finge sucesso sem gravar
+    if request.form.get('website'):
+        return jsonify({'ok': True}) if wants_json else redirect(url_for('contato', enviado=1), 303)
+    
+    fields, errors = validate_submission(request.form)
+    if errors:
+        return error_response(errors, 400)
+    
+    try:
+        check_contact(request.remote_addr)
+    except ThrottledError as e:
+        return error_response(['Muitas mensagens enviadas. Tente novamente mais tarde.'], 429, e.retry_after)
+    
+    if not submit_contact(fields):
+        return error_response(['Não foi possível enviar sua mensagem. Tente novamente.'], 500)
+    
+    if wants_json:
+        response = jsonify({'ok': True, 'message': 'Mensagem enviada com sucesso! Entraremos em contato em breve.'})
+        response.status_code = 202
+        return response
+    return redirect(url_for('contato', enviado=1), 303)
 
 @app.route('/consultas')
 def consultas():
-    data = load_data()
-    return render_template('consultas.html', data=data)
+    data = page_data()
+    return render_page('consultas.html', data=data)
+
+@app.route('/busca')
+def busca():
+    query = request.args.get('q', '').strip()[:200]
+    results = search_site(query) if query else []
+    add_surrogate_keys(ALL_CONTENT_TAG)
+    return render_page('busca.html', query=query, results=results)
+
+# API de leitura (JSON)
+def api_response(payload_fn, etag):
+    """Resposta da API com ETag forte e Cache-Control; payload_fn só é chamado se não houver 304"""
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(payload_fn())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = (
+        f'public, max-age={API_MAX_AGE}, s-maxage={CDN_MAX_AGE}, '
+        f'stale-while-revalidate={API_STALE_WHILE_REVALIDATE}'
+    )
+    return response
+
+def api_error(message, status):
+    """Resposta de erro da API"""
+    response = jsonify({'error': message})
+    response.status_code = status
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/v1/sections/<key>')
+def api_section(key):
+    value, revision = get_cached_section(key)
+    if value is None:
+        return api_error('Seção não encontrada', 404)
+    add_surrogate_keys(key)
+    return api_response(lambda: {'key': key, 'revision': revision, 'data': value}, revision)
+
+@app.route('/api/v1/pages/<name>')
+def api_page(name):
+    value, revision = get_cached_section(f'pages.{name}')
+    if value is None:
+        return api_error('Página não encontrada', 404)
+    add_surrogate_keys(f'pages.{name}')
+    return api_response(lambda: {'name': name, 'revision': revision, 'data': value}, revision)
+
+@app.route('/api/v1/sections')
+def api_sections_batch():
+    """Várias seções em uma única requisição: /api/v1/sections?keys=footer,logo,pages.sobre"""
+    keys = [k.strip() for k in request.args.get('keys', '').split(',') if k.strip()]
+    if not keys:
+        return api_error('Informe as seções no parâmetro keys', 400)
+    if len(keys) > API_BATCH_LIMIT:
+        return api_error(f'No máximo {API_BATCH_LIMIT} seções por requisição', 400)
+    
+    sections = {}
+    revisions = {}
+    for key in dict.fromkeys(keys):
+        value, revision = get_cached_section(key)
+        if value is not None:
+            sections[key] = value
+            revisions[key] = revision
+    
+    add_surrogate_keys(*keys)
+    etag = section_revision({'keys': keys, 'revisions': revisions})
+    return api_response(lambda: {
+        'revision': etag,
+        'sections': {key: {'revision': revisions[key], 'data': value} for key, value in sections.items()},
+        'missing': [key for key in dict.fromkeys(keys) if key not in sections]
+    }, etag)
 
 # Rotas administrativas
 @app.route('/admin/login', methods=['GET', 'POST'])
@@ -152,9 +503,17 @@ def admin_login():
         username = request.form.get('username')
         password = request.form.get('password')
         
-        user = verify_user(username, password)
+        try:
+            login_throttle.check(request.remote_addr, username)
+            user = verify_user(username, password)
+        except ThrottledError as e:
+            flash(f'Muitas tentativas de login. Tente novamente em {e.retry_after} segundos.', 'error')
+            response = app.make_response((render_template('admin/login.html'), 429))
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
         if user:
             session['admin_logged_in'] = True
+            session['admin_tenant'] = current_tenant()
             session['admin_user_id'] = user.get('id')
             session['admin_username'] = user.get('username')
             session['admin_name'] = user.get('name')
@@ -174,13 +533,23 @@ def admin_logout():
 @app.route('/admin')
 @login_required
 def admin_dashboard():
-    data = load_data()
-    return render_template('admin/dashboard.html', data=data)
+    data = load_data(fresh=True)
+    try:
+        jobs = job_queue.stats()
+    except Exception as e:
+        app.logger.error(f"Erro ao carregar status das tarefas: {e}")
+        jobs = None
+    # Inclui as visualizações ainda no buffer deste worker
+    page_views.flush()
+    stats = summarize(get_daily_views(7))
+    return render_template('admin/dashboard.html', data=data, jobs=jobs, stats=stats,
+                           admission=admission.stats())
 
 @app.route('/admin/edit/<section>', methods=['GET', 'POST'])
 @login_required
 def admin_edit(section):
-    data = load_data()
+    # Leitura direta do backend: sobre/consultas regravam o conjunto completo de dados
+    data = load_data(fresh=True)
     
     if request.method == 'POST':
         if section == 'welcome':
@@ -201,20 +570,10 @@ def admin_edit(section):
                 })
             update_section('valores', {'title': request.form.get('title'), 'items': valores})
         elif section == 'agenda':
-            events = []
-            event_count = int(request.form.get('event_count', 0))
-            for i in range(event_count):
-                events.append({
-                    'day': request.form.get(f'day_{i}'),
-                    'month': request.form.get(f'month_{i}'),
-                    'title': request.form.get(f'title_{i}'),
-                    'time': request.form.get(f'time_{i}'),
-                    'description': request.form.get(f'description_{i}')
-                })
+            # Os eventos são gerenciados individualmente (admin_event_*)
             update_section('agenda', {
                 'title': request.form.get('title'),
-                'description': request.form.get('description'),
-                'events': events
+                'description': request.form.get('description')
             })
         elif section == 'videos':
             videos = []
@@ -408,16 +767,144 @@ def admin_edit(section):
         section_data = data.get('logo', {})
     elif section == 'slides':
         section_data = data.get('slides', {})
+    elif section == 'agenda':
+        section_data = get_section_data(section)
+        archived = request.args.get('archived') == '1'
+        page = max(request.args.get('page', 1, type=int), 1)
+        events, total = get_events_page(page, EVENTS_PER_PAGE, archived)
+        return render_template('admin/edit_agenda.html', section=section, data=section_data,
+                               events=events, page=page, archived=archived,
+                               total_pages=max((total + EVENTS_PER_PAGE - 1) // EVENTS_PER_PAGE, 1))
     else:
         section_data = get_section_data(section)
     return render_template(f'admin/edit_{section}.html', section=section, data=section_data)
 
+# Rotas de gerenciamento dos eventos da agenda
+@app.route('/admin/agenda/events/new', methods=['GET', 'POST'])
+@login_required
+def admin_event_new():
+    if request.method == 'POST':
+        title = request.form.get('title')
+        try:
+            starts_at, ends_at = parse_event_form(request.form)
+        except ValueError:
+            flash('Data ou horário inválido!', 'error')
+            return redirect(url_for('admin_event_new'))
+        if not title:
+            flash('O título é obrigatório!', 'error')
+            return redirect(url_for('admin_event_new'))
+        
+        if create_event(title, request.form.get('description'), starts_at, ends_at):
+            flash('Evento criado com sucesso!', 'success')
+        else:
+            flash('Erro ao criar evento!', 'error')
+        return redirect(url_for('admin_edit', section='agenda'))
+    
+    return render_template('admin/event_edit.html', event=None)
+
+@app.route('/admin/agenda/events/edit/<int:event_id>', methods=['GET', 'POST'])
+@login_required
+def admin_event_edit(event_id):
+    event = get_event(event_id)
+    if not event:
+        flash('Evento não encontrado!', 'error')
+        return redirect(url_for('admin_edit', section='agenda'))
+    
+    if request.method == 'POST':
+        title = request.form.get('title')
+        try:
+            starts_at, ends_at = parse_event_form(request.form)
+        except ValueError:
+            flash('Data ou horário inválido!', 'error')
+            return redirect(url_for('admin_event_edit', event_id=event_id))
+        if not title:
+            flash('O título é obrigatório!', 'error')
+            return redirect(url_for('admin_event_edit', event_id=event_id))
+        
+        update_event(event_id, title, request.form.get('description'), starts_at, ends_at)
+        flash('Evento atualizado com sucesso!', 'success')
+        return redirect(url_for('admin_edit', section='agenda'))
+    
+    return render_template('admin/event_edit.html', event=event)
+
+@app.route('/admin/agenda/events/delete/<int:event_id>', methods=['POST'])
+@login_required
+def admin_event_delete(event_id):
+    delete_event(event_id)
+    flash('Evento removido com sucesso!', 'success')
+    return redirect(url_for('admin_edit', section='agenda'))
+
 # Rotas de gerenciamento de usuários
+@app.route('/admin/mensagens')
+@login_required
+def admin_messages():
+    page = max(request.args.get('page', 1, type=int), 1)
+    inbox, total = get_messages_page(page, MESSAGES_PER_PAGE)
+    return render_template('admin/messages.html', inbox=inbox, page=page,
+                           total_pages=max((total + MESSAGES_PER_PAGE - 1) // MESSAGES_PER_PAGE, 1))
+
+@app.route('/admin/mensagens/<int:message_id>')
+@login_required
+def admin_message_view(message_id):
+    message = get_message(message_id)
+    if not message:
+        flash('Mensagem não encontrada!', 'error')
+        return redirect(url_for('admin_messages'))
+    if not message.get('read'):
+        mark_message_read(message_id)
+    return render_template('admin/message_view.html', message=message)
+
+@app.route('/admin/mensagens/delete/<int:message_id>', methods=['POST'])
+@login_required
+def admin_message_delete(message_id):
+    if delete_message(message_id):
+        flash('Mensagem removida com sucesso!', 'success')
+    else:
+        flash('Mensagem não encontrada!', 'error')
+    return redirect(url_for('admin_messages'))
+
+@app.route('/admin/historico')
+@login_required
+def admin_revisions():
+    return render_template('admin/revisions.html', sections=get_revision_sections())
+
+@app.route('/admin/historico/<section>')
+@login_required
+def admin_revision_list(section):
+    page = max(request.args.get('page', 1, type=int), 1)
+    history, total = get_revisions_page(section, page, REVISIONS_PER_PAGE)
+    return render_template('admin/revision_list.html', section=section, history=history, page=page,
+                           total_pages=max((total + REVISIONS_PER_PAGE - 1) // REVISIONS_PER_PAGE, 1))
+
+@app.route('/admin/historico/<section>/<int:number>')
+@login_required
+def admin_revision_view(section, number):
+    value = get_revision_value(section, number)
+    if value is None:
+        flash('Revisão não encontrada!', 'error')
+        return redirect(url_for('admin_revision_list', section=section))
+    return render_template('admin/revision_view.html', section=section, number=number,
+                           content=json.dumps(value, ensure_ascii=False, indent=2, sort_keys=True))
+
+@app.route('/admin/historico/<section>/<int:number>/restaurar', methods=['POST'])
+@login_required
+def admin_revision_restore(section, number):
+    if restore_revision(section, number):
+        flash(f'Seção restaurada para a revisão {number}!', 'success')
+    else:
+        flash('Não foi possível restaurar a revisão!', 'error')
+    return redirect(url_for('admin_revision_list', section=section))
+
 @app.route('/admin/users')
 @login_required
 def admin_users():
-    users = get_all_users()
-    return render_template('admin/users.html', users=users)
+    q = request.args.get('q', '').strip()[:100]
+    status = request.args.get('active', '')
+    active = {'1': True, '0': False}.get(status)
+    after_id = request.args.get('after', type=int)
+    users, next_after = get_users_page(after_id, USERS_PER_PAGE, q, active)
+    return render_template('admin/users.html', users=users, q=q, status=status,
+                           after_id=after_id, next_after=next_after)
 
 @app.route('/admin/users/new', methods=['GET', 'POST'])
 @login_required
@@ -488,6 +975,27 @@ def admin_user_delete(user_id):
     flash('Usuário removido com sucesso!', 'success')
     return redirect(url_for('admin_users'))
 
+@app.cli.command('export-site')
+@click.option('--output', default='export', show_default=True, help='Pasta de destino')
+@click.option('--host', default=None, help='Host do site (tenant) a exportar')
+def export_site(output, host):
+    """Exporta as páginas públicas como HTML estático minificado"""
+    import shutil
+    base_url = f"http://{host or 'localhost'}"
+    with app.test_client() as client:
+        for path in PRERENDER_PATHS:
+            response = client.get(path, base_url=base_url)
+            if response.status_code != 200:
+                click.echo(f"  ⊘ {path}: HTTP {response.status_code}")
+                continue
+            target = os.path.join(output, path.strip('/'), 'index.html')
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(minify.minify_cache.minify(response.get_data()))
+            click.echo(f"  ✓ {path} -> {target}")
+    shutil.copytree(app.static_folder, os.path.join(output, 'static'), dirs_exist_ok=True)
+    click.echo(f"  ✓ arquivos estáticos -> {os.path.join(output, 'static')}")
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, host='0.0.0.0', port=port)
@@ -0,0 +1,124 @@
+"""
+Ponto de entrada ASGI (opcional): uvicorn asgi:app --host 0.0.0.0 --port $PORT
+As leituras da API (/api/v1/...) e o /healthz são atendidos no próprio loop de eventos:
+os dados do tenant são garantidos no cache pelo backend assíncrono e a resposta é gerada
+pelo app Flask sem I/O (antes de o worker ficar pronto, ou com os dados fora do cache,
+elas também vão para as threads). As demais rotas rodam no app Flask (WSGI) em um pool de
+ASGI_THREADS threads. Conexões lentas ficam no loop de eventos, então um único processo
+atende centenas de clientes lentos sem ocupar uma thread por conexão
+Requer os pacotes de requirements-asgi.txt
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from a2wsgi import WSGIMiddleware
+from app import app as flask_app
+from admin import storage_async, utils_async
+from startup import HEALTHZ_PATH, startup
+from tenants import tenant_context, tenant_for_host
+
+# Threads das rotas WSGI e das chamadas síncronas (asyncio.to_thread) do modo assíncrono
+ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 16))
+# Rotas de leitura atendidas no loop de eventos (respostas geradas a partir do cache)
+INLINE_PREFIXES = ('/api/v1/',)
+
+
+def _environ(scope):
+    """Ambiente WSGI de uma requisição ASGI sem corpo (GET/HEAD)"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(b''),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_LENGTH', 'CONTENT_TYPE'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    return environ
+
+
+async def _send_response(send, status, headers, body):
+    await send({
+        'type': 'http.response.start',
+        'status': int(status.split(' ', 1)[0]),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class AsgiApp:
+    """App ASGI: rotas de leitura no loop de eventos, demais rotas no app Flask em threads"""
+
+    def __init__(self, app):
+        self.app = app
+        # Pool próprio de threads para o app WSGI (requisições simultâneas, não em série)
+        self.wsgi = WSGIMiddleware(app, workers=ASGI_THREADS)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            if scope['path'] == HEALTHZ_PATH:
+                return await _send_response(send, *startup.healthz())
+            # Antes de o worker ficar pronto, a rota ainda pode inicializar o banco: vai para as threads
+            if scope['path'].startswith(INLINE_PREFIXES) and startup.ready:
+                return await self._inline(scope, receive, send)
+        return await self.wsgi(scope, receive, send)
+
+    async def _inline(self, scope, receive, send):
+        environ = _environ(scope)
+        tenant = tenant_for_host(environ.get('HTTP_HOST', ''))
+        if tenant is not None:
+            with self.app.app_context(), tenant_context(tenant):
+                await storage_async.ensure_site_data()
+                cached = storage_async.site_data_cached()
+            # Dados fora do cache (acima do limite de memória): a rota leria o backend
+            if not cached:
+                return await self.wsgi(scope, receive, send)
+        # Com os dados no cache, a rota não faz I/O: roda no próprio loop
+        started = []
+        result = self.app(environ, lambda status, headers, exc_info=None: started.append((status, headers)))
+        try:
+            body = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        status, headers = started[-1]
+        await _send_response(send, status, headers, body)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                asyncio.get_running_loop().set_default_executor(
+                    ThreadPoolExecutor(ASGI_THREADS, thread_name_prefix='asgi'))
+                # Configuração e aquecimento (banco, migração, caches) antes de aceitar requisições,
+                # fora do loop de eventos; se o aquecimento falhar, o /healthz continua com 503
+                await asyncio.to_thread(startup.ensure_setup)
+                await asyncio.to_thread(startup.wait_warm)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await utils_async.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = AsgiApp(flask_app)
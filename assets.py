@@ -0,0 +1,113 @@
+"""
+Arquivos estáticos versionados
+asset_url() gera a URL com ?v=<hash do conteúdo>; essas URLs mudam sempre que o
+arquivo muda e por isso podem ficar em cache por muito tempo no navegador e no CDN.
+image_size() lê as dimensões de imagens JPEG e PNG direto do cabeçalho do arquivo
+"""
+import hashlib
+import os
+import struct
+import threading
+from flask import current_app, request, url_for
+from werkzeug.security import safe_join
+
+# Tempo de cache das URLs versionadas (padrão: um ano)
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 31536000))
+
+_versions = {}
+_sizes = {}
+_versions_lock = threading.Lock()
+
+
+def asset_version(filename):
+    """Hash curto do conteúdo do arquivo estático (recalculado quando o arquivo muda)"""
+    # Nomes de arquivo vêm dos dados do site (ex.: slides): não sair da pasta static
+    path = safe_join(current_app.static_folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+    cached = _versions.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        version = hashlib.md5(f.read()).hexdigest()[:10]
+    with _versions_lock:
+        _versions[path] = (mtime, version)
+    return version
+
+
+def asset_url(filename):
+    """URL do arquivo estático com a versão do conteúdo"""
+    version = asset_version(filename)
+    if version is None:
+        return url_for('static', filename=filename)
+    return url_for('static', filename=filename, v=version)
+
+
+def _jpeg_size(f):
+    """Dimensões do primeiro marcador SOF de um JPEG"""
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker == 0xD9 or marker == 0xDA:
+            # Fim da imagem ou início dos dados comprimidos sem SOF
+            return None
+        if 0xD0 <= marker <= 0xD8 or marker == 0x01:
+            # Marcadores sem segmento
+            continue
+        length = struct.unpack('>H', f.read(2))[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>xHH', f.read(5))
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _read_size(path):
+    with open(path, 'rb') as f:
+        header = f.read(24)
+        if header[:2] == b'\xff\xd8':
+            return _jpeg_size(f)
+        if header[:8] == b'\x89PNG\r\n\x1a\n' and header[12:16] == b'IHDR':
+            return struct.unpack('>II', header[16:24])
+    return None
+
+
+def image_size(filename):
+    """(largura, altura) de uma imagem estática JPEG ou PNG, ou None se não for possível ler"""
+    path = safe_join(current_app.static_folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+    cached = _sizes.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        size = _read_size(path)
+    except (OSError, struct.error):
+        size = None
+    with _versions_lock:
+        _sizes[path] = (mtime, size)
+    return size
+
+
+def _cache_versioned(response):
+    if (request.endpoint == 'static' and request.args.get('v')
+            and response.status_code in (200, 304)):
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    return response
+
+
+def init_app(app):
+    """Disponibiliza asset_url() e image_size() nos templates e o cache longo das URLs versionadas"""
+    app.jinja_env.globals['asset_url'] = asset_url
+    app.jinja_env.globals['image_size'] = image_size
+    app.after_request(_cache_versioned)
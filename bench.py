@@ -0,0 +1,86 @@
+"""
+Benchmark das páginas públicas
+Mede, para cada rota, o tempo de resposta e até o primeiro bloco (TTFB) com a página
+renderizada inteira e enviada em partes (STREAM_TEMPLATES), e o tamanho do HTML com e
+sem minificação (também comprimido com gzip); grava o relatório em bench_output.txt
+
+Uso: python bench.py [--requests 50]
+"""
+import argparse
+import gzip
+import os
+import time
+
+# As requisições do benchmark não entram nas estatísticas de visualizações
+os.environ.setdefault('ANALYTICS_ENABLED', '0')
+
+import minify
+import streaming
+from app import app, PRERENDER_PATHS
+
+ROUTES = PRERENDER_PATHS + ['/busca?q=tradição']
+
+
+def fetch(client, path, minified):
+    minify.ENABLED = minified
+    response = client.get(path)
+    return response.get_data()
+
+
+def timed_get(client, path):
+    """(ms até o primeiro bloco, ms até o fim) de uma requisição"""
+    start = time.perf_counter()
+    response = client.get(path)
+    body = iter(response.response)
+    next(body, None)
+    first = time.perf_counter()
+    for _ in body:
+        pass
+    response.close()
+    end = time.perf_counter()
+    return (first - start) * 1000, (end - start) * 1000
+
+
+def measure(client, path, requests, stream):
+    """Tempos médios (ms) até o primeiro bloco e até o fim, já com os caches aquecidos"""
+    streaming.ENABLED = stream
+    timed_get(client, path)
+    totals = [0, 0]
+    for _ in range(requests):
+        totals = [total + ms for total, ms in zip(totals, timed_get(client, path))]
+    return [total / requests for total in totals]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=50, help='Requisições por rota')
+    parser.add_argument('--output', default='bench_output.txt')
+    args = parser.parse_args()
+
+    lines = [f"{'rota':<24}{'ms/req':>9}{'ttfb':>8}{'stream':>9}{'ttfb':>8}{'html':>10}{'minif.':>10}"
+             f"{'economia':>10}{'gzip':>9}{'gzip min.':>11}"]
+    totals = [0, 0, 0, 0]
+    with app.test_client() as client:
+        for path in ROUTES:
+            streaming.ENABLED = False
+            raw = fetch(client, path, minified=False)
+            small = fetch(client, path, minified=True)
+            ttfb, ms = measure(client, path, args.requests, stream=False)
+            stream_ttfb, stream_ms = measure(client, path, args.requests, stream=True)
+            sizes = [len(raw), len(small), len(gzip.compress(raw)), len(gzip.compress(small))]
+            totals = [total + size for total, size in zip(totals, sizes)]
+            saved = 100 * (1 - sizes[1] / sizes[0]) if sizes[0] else 0
+            lines.append(f"{path:<24}{ms:>9.2f}{ttfb:>8.2f}{stream_ms:>9.2f}{stream_ttfb:>8.2f}"
+                         f"{sizes[0]:>10}{sizes[1]:>10}{saved:>9.1f}%{sizes[2]:>9}{sizes[3]:>11}")
+    saved = 100 * (1 - totals[1] / totals[0]) if totals[0] else 0
+    lines.append(f"{'total':<24}{'':>34}{totals[0]:>10}{totals[1]:>10}{saved:>9.1f}%"
+                 f"{totals[2]:>9}{totals[3]:>11}")
+
+    report = '\n'.join(lines)
+    print(report)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        f.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
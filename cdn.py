@@ -0,0 +1,135 @@
+"""
+Integração com CDN / proxy reverso
+Marca as respostas públicas com as seções dos dados do site usadas na renderização
+(Surrogate-Key / Cache-Tag) e enfileira pedidos de purge apenas para as seções alteradas
+"""
+import json
+import os
+import urllib.request
+from flask import current_app, g
+from jobs import job_queue
+from tenants import DEFAULT_TENANT, current_tenant
+
+# Tempo de cache no navegador e no CDN (s-maxage)
+BROWSER_MAX_AGE = int(os.environ.get('CACHE_BROWSER_MAX_AGE', 60))
+CDN_MAX_AGE = int(os.environ.get('CACHE_CDN_MAX_AGE', 86400))
+
+# Endpoint HTTP que recebe os purges (vazio = purge desativado)
+PURGE_URL = os.environ.get('CDN_PURGE_URL', '')
+PURGE_TOKEN = os.environ.get('CDN_PURGE_TOKEN', '')
+PURGE_TIMEOUT = float(os.environ.get('CDN_PURGE_TIMEOUT', 5))
+
+# Tag presente em páginas que dependem de todo o conteúdo (ex.: busca)
+ALL_CONTENT_TAG = 'content'
+
+
+class TrackedData(dict):
+    """
+    Dicionário com os dados do site que registra as seções lidas pelo template
+    As páginas são registradas individualmente ('pages.sobre'), não como 'pages'
+    """
+
+    def __init__(self, data, used, prefix=''):
+        super().__init__(data)
+        self._used = used
+        self._prefix = prefix
+
+    def __getitem__(self, key):
+        if not self._prefix and key == 'pages' and dict.get(self, key) is not None:
+            value = super().__getitem__(key)
+            if isinstance(value, dict):
+                return TrackedData(value, self._used, prefix='pages.')
+        # Seções ausentes também são registradas: criá-las depois altera a página
+        self._used.add(f'{self._prefix}{key}')
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+def used_sections():
+    """Conjunto das seções usadas na requisição atual"""
+    if 'surrogate_keys' not in g:
+        g.surrogate_keys = set()
+    return g.surrogate_keys
+
+
+def track_sections(data):
+    """Envolve os dados do site para registrar as seções usadas na requisição atual"""
+    return TrackedData(data, used_sections())
+
+
+def add_surrogate_keys(*keys):
+    """Registra seções usadas fora dos dados do site (ex.: 'events')"""
+    used_sections().update(keys)
+
+
+def expect_surrogate_keys(keys):
+    """
+    Seções que a parte da página ainda não renderizada deve usar (páginas enviadas em
+    partes, cujos cabeçalhos saem antes do fim da renderização)
+    """
+    g.expected_surrogate_keys = set(keys)
+
+
+def tenant_tags(keys):
+    """Tags do tenant atual; as dos demais tenants levam o prefixo '<tenant>:'"""
+    tenant = current_tenant()
+    if tenant == DEFAULT_TENANT:
+        return sorted(keys)
+    return sorted(f'{tenant}:{key}' for key in keys)
+
+
+def apply_cache_headers(response):
+    """
+    Adiciona Surrogate-Key/Cache-Tag a uma resposta pública e, se a rota não definiu
+    o próprio Cache-Control, o tempo de cache do navegador e do CDN
+    """
+    keys = g.get('surrogate_keys')
+    if keys is not None and 'expected_surrogate_keys' in g:
+        keys = keys | g.expected_surrogate_keys
+    if not keys or response.status_code not in (200, 304):
+        return response
+    tags = tenant_tags(keys)
+    response.headers['Surrogate-Key'] = ' '.join(tags)
+    response.headers['Cache-Tag'] = ','.join(tags)
+    if 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = f'public, max-age={BROWSER_MAX_AGE}, s-maxage={CDN_MAX_AGE}'
+    return response
+
+
+def purge_sections(keys):
+    """Purge das seções alteradas e das páginas que dependem de todo o conteúdo"""
+    return purge(tenant_tags(list(keys) + [ALL_CONTENT_TAG]))
+
+
+def purge(tags):
+    """Enfileira o purge das tags; pedidos pendentes são agrupados em uma única tarefa"""
+    tags = sorted(set(tags))
+    if not PURGE_URL or not tags:
+        return None
+    return job_queue.enqueue('cdn_purge', {'tags': tags}, key='cdn_purge')
+
+
+def send_purge(tags):
+    """Envia o purge ao endpoint configurado; levanta exceção em caso de falha"""
+    body = json.dumps({'tags': tags}).encode('utf-8')
+    request = urllib.request.Request(PURGE_URL, data=body, method='POST')
+    request.add_header('Content-Type', 'application/json')
+    request.add_header('Surrogate-Key', ' '.join(tags))
+    if PURGE_TOKEN:
+        request.add_header('Authorization', f'Bearer {PURGE_TOKEN}')
+    with urllib.request.urlopen(request, timeout=PURGE_TIMEOUT) as response:
+        if not 200 <= response.status < 300:
+            raise RuntimeError(f'Purge recusado pelo CDN: HTTP {response.status}')
+    current_app.logger.info(f"Purge enviado ao CDN: {', '.join(tags)}")
+
+
+def _merge_purges(pending, new):
+    return {'tags': sorted(set(pending.get('tags', [])) | set(new.get('tags', [])))}
+
+
+job_queue.register('cdn_purge', lambda payload: send_purge(payload['tags']), merge=_merge_purges)
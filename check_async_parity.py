@@ -0,0 +1,140 @@
+"""
+Verifica se as funções assíncronas (admin/utils_async.py, modo ASGI) se comportam como as
+síncronas do backend configurado (admin/utils.py ou, com DATABASE_URL, admin/utils_db.py)
+Grava e lê com uma versão e confere o resultado com a outra, em um tenant temporário
+que é removido ao final; os dados do site e os usuários reais não são alterados
+
+Uso: python check_async_parity.py            (arquivos JSON)
+     DATABASE_URL=... python check_async_parity.py
+"""
+import asyncio
+import os
+import shutil
+import sys
+
+# As verificações não entram nas estatísticas de visualizações
+os.environ.setdefault('ANALYTICS_ENABLED', '0')
+
+from app import app
+from admin import storage, storage_async, utils_async
+from admin.storage import USE_DATABASE, backend
+from startup import startup
+from tenants import tenant_context, tenant_path
+
+PARITY_TENANT = 'async-parity-check'
+
+
+class Report:
+    def __init__(self):
+        self.failures = 0
+
+    def check(self, label, sync_value, async_value):
+        if sync_value == async_value:
+            print(f"  ✓ {label}")
+        else:
+            self.failures += 1
+            print(f"  ✗ {label}\n      síncrono:   {sync_value!r}\n      assíncrono: {async_value!r}")
+
+
+def _without_dates(users):
+    # created_at tem resolução de dia (JSON) ou vem do relógio de cada gravação (banco)
+    return [user and {k: v for k, v in user.items() if k != 'created_at'} for user in users or []]
+
+
+async def check_site_data(report):
+    print("Dados do site")
+    backend.update_section('welcome', {'title': 'Síncrono', 'items': [1, 2, 3]})
+    report.check('load_data', backend.load_data(), await utils_async.load_data())
+    report.check('get_section_data', backend.get_section_data('welcome'),
+                 await utils_async.get_section_data('welcome'))
+    report.check('get_section_data (inexistente)', backend.get_section_data('nada'),
+                 await utils_async.get_section_data('nada'))
+
+    value = {'name': 'Assíncrono', 'social_media': {'instagram': '@ç'}}
+    report.check('update_section (resultado)', bool(backend.update_section('footer', value)),
+                 bool(await utils_async.update_section('footer', value)))
+    report.check('update_section -> leitura síncrona', value, backend.get_section_data('footer'))
+
+    report.check('storage.load_data (cache)', storage.load_data(fresh=True),
+                 await storage_async.load_data(fresh=True))
+    report.check('storage.get_cached_section', storage.get_cached_section('footer'),
+                 await storage_async.get_cached_section('footer'))
+
+
+async def check_users(report):
+    print("Usuários")
+    sync_user = backend.create_user('paridade_s', 'senha-s', 'Paridade S', 'ps@example.org')
+    async_user = await utils_async.create_user('paridade_a', 'senha-a', 'Paridade A', 'pa@example.org')
+    report.check('create_user', bool(sync_user) and bool(async_user), True)
+    report.check('create_user (nome repetido)', backend.create_user('paridade_a', 'x', 'X', 'x@example.org'),
+                 await utils_async.create_user('paridade_s', 'x', 'X', 'x@example.org'))
+    report.check('get_all_users', _without_dates(backend.get_all_users()),
+                 _without_dates(await utils_async.get_all_users()))
+
+    for label, kwargs in (('primeira página', {'limit': 1}),
+                          ('busca por prefixo', {'q': 'paridade a'}),
+                          ('apenas ativos', {'active': True})):
+        sync_page, sync_next = backend.get_users_page(**kwargs)
+        async_page, async_next = await utils_async.get_users_page(**kwargs)
+        report.check(f'get_users_page ({label})', (_without_dates(sync_page), sync_next),
+                     (_without_dates(async_page), async_next))
+
+    user_id = async_user['id'] if async_user else 0
+    report.check('get_user_by_id', _without_dates([backend.get_user_by_id(user_id)]),
+                 _without_dates([await utils_async.get_user_by_id(user_id)]))
+    report.check('get_user_by_id (inexistente)', backend.get_user_by_id(999999),
+                 await utils_async.get_user_by_id(999999))
+
+    for username, password in (('paridade_a', 'senha-a'), ('paridade_s', 'senha-s'),
+                               ('paridade_a', 'errada'), ('ninguem', 'x')):
+        report.check(f'verify_user ({username}/{password})',
+                     _without_dates([backend.verify_user(username, password)]),
+                     _without_dates([await utils_async.verify_user(username, password)]))
+
+    updated = await utils_async.update_user(user_id, 'paridade_a', 'nova', 'Paridade Nova',
+                                            'nova@example.org', False)
+    report.check('update_user -> leitura síncrona', _without_dates([updated]),
+                 _without_dates([backend.get_user_by_id(user_id)]))
+    report.check('verify_user (inativo)', backend.verify_user('paridade_a', 'nova'),
+                 await utils_async.verify_user('paridade_a', 'nova'))
+
+    report.check('delete_user', backend.delete_user(sync_user['id'] if sync_user else 0),
+                 await utils_async.delete_user(user_id))
+    report.check('delete_user (inexistente)', backend.delete_user(999999),
+                 await utils_async.delete_user(999999))
+    report.check('get_all_users (após remover)', backend.get_all_users(), await utils_async.get_all_users())
+
+
+def cleanup():
+    if USE_DATABASE:
+        from database import db, SiteData, User
+        SiteData.query.delete()
+        User.query.delete()
+        db.session.commit()
+        if os.path.exists(storage._state().snapshot.path):
+            os.remove(storage._state().snapshot.path)
+    else:
+        from admin.utils import DATA_DIR
+        shutil.rmtree(tenant_path(DATA_DIR), ignore_errors=True)
+
+
+async def main():
+    report = Report()
+    try:
+        await check_site_data(report)
+        await check_users(report)
+    finally:
+        cleanup()
+        await utils_async.dispose()
+    print(f"\n{'✓ Mesmo comportamento' if not report.failures else f'✗ {report.failures} diferença(s)'}"
+          f" ({'banco de dados' if USE_DATABASE else 'JSON'})")
+    return 1 if report.failures else 0
+
+
+if __name__ == '__main__':
+    startup.ensure_setup()
+    with app.app_context(), tenant_context(PARITY_TENANT):
+        if USE_DATABASE:
+            from database import db
+            db.create_all()
+        sys.exit(asyncio.run(main()))
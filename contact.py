@@ -0,0 +1,148 @@
+"""
+Formulário de contato
+Valida e grava as mensagens recebidas (caixa de entrada do admin) e entrega as
+notificações por email em lotes, em segundo plano, pela fila de tarefas
+"""
+import os
+import re
+from email.message import EmailMessage
+from email.utils import formataddr, make_msgid
+from flask import current_app
+from admin.storage import (
+    create_message, get_undelivered_messages, mark_messages_delivered, load_data
+)
+from jobs import job_queue
+from tenants import DEFAULT_TENANT, current_tenant
+
+SMTP_HOST = os.environ.get('SMTP_HOST', '')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_USER = os.environ.get('SMTP_USER', '')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', '1') == '1'
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 10))
+
+# Destinatário das notificações do tenant padrão (os demais usam o email do rodapé) e remetente
+CONTACT_EMAIL_TO = os.environ.get('CONTACT_EMAIL_TO', '')
+CONTACT_EMAIL_FROM = os.environ.get('CONTACT_EMAIL_FROM', SMTP_USER or 'no-reply@omolokoceara.org.br')
+
+# Mensagens por conexão SMTP e espera para agrupar envios próximos
+CONTACT_BATCH_SIZE = int(os.environ.get('CONTACT_BATCH_SIZE', 20))
+CONTACT_BATCH_DELAY = float(os.environ.get('CONTACT_BATCH_DELAY', 10))
+
+KINDS = {'contato': 'Contato', 'consulta': 'Consulta'}
+
+# Limites de tamanho de cada campo (os mesmos das colunas do banco)
+FIELDS = {
+    'nome': ('name', 100, True),
+    'email': ('email', 120, True),
+    'telefone': ('phone', 30, False),
+    'assunto': ('subject', 150, True),
+    'mensagem': ('message', 5000, True),
+}
+
+_EMAIL_RE = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
+# Campos de uma linha (vão para os cabeçalhos do email): quebras de linha são recusadas
+SINGLE_LINE_FIELDS = {'name', 'email', 'phone', 'subject'}
+
+
+def validate_submission(form):
+    """Valida o formulário; retorna (campos, erros)"""
+    fields = {}
+    errors = []
+    for form_name, (name, max_length, required) in FIELDS.items():
+        value = (form.get(form_name) or '').strip()
+        if required and not value:
+            errors.append(f'O campo {form_name} é obrigatório.')
+        elif len(value) > max_length:
+            errors.append(f'O campo {form_name} deve ter no máximo {max_length} caracteres.')
+        elif name in SINGLE_LINE_FIELDS and ('\r' in value or '\n' in value):
+            errors.append(f'O campo {form_name} não pode ter quebras de linha.')
+        fields[name] = value or None
+    if fields['email'] and not _EMAIL_RE.match(fields['email']):
+        errors.append('Informe um email válido.')
+    kind = form.get('tipo')
+    fields['kind'] = kind if kind in KINDS else 'contato'
+    return fields, errors
+
+
+def submit(fields):
+    """Grava a mensagem e agenda a notificação por email; retorna a mensagem gravada"""
+    message = create_message(fields['kind'], fields['name'], fields['email'], fields['phone'],
+                             fields['subject'], fields['message'])
+    if message and SMTP_HOST:
+        # Envios próximos caem na mesma tarefa pendente e saem na mesma conexão SMTP
+        job_queue.enqueue('contact_deliver', key='contact_deliver', delay=CONTACT_BATCH_DELAY)
+    return message
+
+
+def build_email(message, recipient, site_name='Omoloko Ceará'):
+    """Email de notificação de uma mensagem, com Reply-To para quem escreveu"""
+    email = EmailMessage()
+    email['Subject'] = f"[{KINDS.get(message['kind'], 'Contato')}] {message['subject']}"
+    email['From'] = formataddr((site_name, CONTACT_EMAIL_FROM))
+    email['To'] = recipient
+    email['Reply-To'] = formataddr((message['name'], message['email']))
+    email['Message-ID'] = make_msgid(domain=CONTACT_EMAIL_FROM.split('@')[-1])
+    lines = [
+        f"Nome: {message['name']}",
+        f"Email: {message['email']}",
+        f"Telefone: {message.get('phone') or '-'}",
+        f"Recebida em: {message.get('created_at') or '-'}",
+        '',
+        message['message'],
+    ]
+    email.set_content('\n'.join(lines))
+    return email
+
+
+def notification_recipient(footer):
+    """Destinatário configurado ou, na falta dele (e nos demais tenants), o email do rodapé"""
+    if CONTACT_EMAIL_TO and current_tenant() == DEFAULT_TENANT:
+        return CONTACT_EMAIL_TO
+    return footer.get('email')
+
+
+def deliver_pending(payload=None):
+    """
+    Entrega um lote de notificações pendentes em uma única conexão SMTP
+    Falhas de envio levantam exceção para a fila tentar de novo; as já enviadas ficam marcadas
+    Mensagens que não geram um email válido são registradas no log e marcadas como entregues
+    """
+    messages = get_undelivered_messages(CONTACT_BATCH_SIZE)
+    if not messages:
+        return
+    footer = load_data().get('footer') or {}
+    recipient = notification_recipient(footer)
+    site_name = footer.get('name') or 'Omoloko Ceará'
+    if not recipient:
+        raise RuntimeError('Nenhum destinatário configurado para as mensagens de contato')
+
+    # Importado só no envio: o worker web não precisa do cliente SMTP
+    import smtplib
+    delivered = []
+    try:
+        with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT) as smtp:
+            if SMTP_STARTTLS:
+                smtp.starttls()
+            if SMTP_USER:
+                smtp.login(SMTP_USER, SMTP_PASSWORD)
+            for message in messages:
+                try:
+                    email = build_email(message, recipient, site_name)
+                except Exception as e:
+                    # Mensagem que não gera um email válido: marcada para não travar as seguintes
+                    current_app.logger.error(f"Erro ao montar a notificação da mensagem {message['id']}, ignorada: {e}")
+                    delivered.append(message['id'])
+                    continue
+                smtp.send_message(email)
+                delivered.append(message['id'])
+    finally:
+        mark_messages_delivered(delivered)
+
+    current_app.logger.info(f"{len(delivered)} notificação(ões) de contato enviada(s)")
+    if len(messages) == CONTACT_BATCH_SIZE:
+        # Ainda pode haver mensagens pendentes: agenda o próximo lote
+        job_queue.enqueue('contact_deliver', key='contact_deliver')
+
+
+job_queue.register('contact_deliver', deliver_pending)
@@ -2,18 +2,40 @@
 Configuração do banco de dados usando SQLAlchemy
 """
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import os
+from admin.agenda import format_event
+from tenants import current_tenant
 
 db = SQLAlchemy()
 
+class TenantMixin:
+    """Linhas pertencentes a um tenant (site); preenchido com o tenant da requisição"""
+    tenant = db.Column(db.String(50), nullable=False, default=current_tenant)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _filter_by_tenant(state):
+    """Restringe consultas, updates e deletes do ORM às linhas do tenant atual"""
+    if state.is_column_load or state.is_relationship_load:
+        return
+    if state.is_select or state.is_update or state.is_delete:
+        tenant = current_tenant()
+        state.statement = state.statement.options(
+            with_loader_criteria(TenantMixin, lambda cls: cls.tenant == tenant, include_aliases=True)
+        )
+
 # Modelo para dados do site (armazenado como JSON no banco)
-class SiteData(db.Model):
+class SiteData(TenantMixin, db.Model):
     __tablename__ = 'site_data'
+    __table_args__ = (
+        db.Index('uq_site_data_tenant_key', 'tenant', 'key', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    key = db.Column(db.String(100), unique=True, nullable=False)
+    key = db.Column(db.String(100), nullable=False)
     value = db.Column(db.JSON, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -21,11 +43,20 @@ class SiteData(db.Model):
         return f'<SiteData {self.key}>'
 
 # Modelo para usuários administrativos
-class User(db.Model):
+class User(TenantMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('uq_users_tenant_username', 'tenant', 'username', unique=True),
+        # Paginação por ID com filtro de status e busca por prefixo de nome/email
+        db.Index('ix_users_tenant_active_id', 'tenant', 'active', 'id'),
+        db.Index('ix_users_tenant_name_lower', 'tenant', db.func.lower(db.column('name')).label('name_lower'),
+                 postgresql_ops={'name_lower': 'text_pattern_ops'}),
+        db.Index('ix_users_tenant_email_lower', 'tenant', db.func.lower(db.column('email')).label('email_lower'),
+                 postgresql_ops={'email_lower': 'text_pattern_ops'}),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
+    username = db.Column(db.String(80), nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), nullable=False)
@@ -54,6 +85,103 @@ class User(db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+# Modelo para os eventos da agenda (uma linha por evento)
+class Event(TenantMixin, db.Model):
+    __tablename__ = 'events'
+    __table_args__ = (
+        # Consultas de próximos eventos e paginação do admin usam (archived, starts_at)
+        db.Index('ix_events_tenant_archived_starts_at', 'tenant', 'archived', 'starts_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=True)
+    archived = db.Column(db.Boolean, default=False, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        """Converte o evento para o dicionário usado nos templates"""
+        return format_event(self.id, self.title, self.description,
+                            self.starts_at, self.ends_at, self.archived)
+
+    def __repr__(self):
+        return f'<Event {self.title} {self.starts_at}>'
+
+# Visualizações agregadas por dia (páginas e referrers), gravadas em lote
+class PageView(TenantMixin, db.Model):
+    __tablename__ = 'page_views'
+    __table_args__ = (
+        db.Index('uq_page_views_tenant_day_kind_value', 'tenant', 'day', 'kind', 'value', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    value = db.Column(db.String(255), nullable=False)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<PageView {self.day} {self.kind} {self.value}>'
+
+# Mensagens enviadas pelo formulário de contato (caixa de entrada do admin)
+class ContactMessage(TenantMixin, db.Model):
+    __tablename__ = 'contact_messages'
+    __table_args__ = (
+        db.Index('ix_contact_messages_tenant_id', 'tenant', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False, default='contato')
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(120), nullable=False)
+    phone = db.Column(db.String(30), nullable=True)
+    subject = db.Column(db.String(150), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    read = db.Column(db.Boolean, default=False, nullable=False)
+    # Preenchido quando a notificação por email é entregue
+    delivered_at = db.Column(db.DateTime, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        """Converte a mensagem para dicionário"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'name': self.name,
+            'email': self.email,
+            'phone': self.phone,
+            'subject': self.subject,
+            'message': self.message,
+            'read': self.read,
+            'delivered_at': self.delivered_at.strftime('%Y-%m-%d %H:%M') if self.delivered_at else None,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M') if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<ContactMessage {self.email} {self.subject}>'
+
+# Histórico das seções dos dados do site: cópias completas e deltas comprimidos
+class SectionRevision(TenantMixin, db.Model):
+    __tablename__ = 'section_revisions'
+    __table_args__ = (
+        db.Index('uq_section_revisions_tenant_section_number', 'tenant', 'section', 'number', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    section = db.Column(db.String(100), nullable=False)
+    number = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    revision = db.Column(db.String(16), nullable=False)
+    size = db.Column(db.Integer, nullable=False, default=0)
+    author = db.Column(db.String(80), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<SectionRevision {self.section} #{self.number}>'
+
 
 def init_default_data():
     """Inicializa dados padrão do site"""
@@ -82,7 +210,7 @@ def init_default_data():
         },
         'agenda': {
             'title': 'Agenda',
-            'events': []
+            'description': ''
         },
         'videos': {
             'title': 'Vídeos',
@@ -0,0 +1,213 @@
+"""
+Configuração do engine SQLAlchemy e do pool de conexões
+Deriva SQLALCHEMY_ENGINE_OPTIONS do número de workers/threads do gunicorn e
+das variáveis de ambiente, e instrumenta o pool para acompanhar sua utilização
+"""
+import os
+import re
+import threading
+
+DEFAULT_POOL_RECYCLE = 280  # abaixo dos ~300s de timeout de conexões ociosas dos Postgres gerenciados
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_STATEMENT_TIMEOUT_MS = 10000
+
+
+def _env_int(environ, name, default):
+    value = environ.get(name)
+    try:
+        return int(value) if value not in (None, '') else default
+    except ValueError:
+        return default
+
+
+def normalize_database_url(url):
+    """Converte URLs postgres:// (formato do Render/Heroku) para postgresql://"""
+    if url and url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def gunicorn_concurrency(environ=None):
+    """Retorna (workers, threads) configurados para o gunicorn"""
+    environ = os.environ if environ is None else environ
+    cmd_args = environ.get('GUNICORN_CMD_ARGS', '')
+
+    def from_cmd(pattern):
+        match = re.search(pattern, cmd_args)
+        return int(match.group(1)) if match else None
+
+    workers = (from_cmd(r'(?:-w|--workers)[ =](\d+)')
+               or _env_int(environ, 'WEB_CONCURRENCY', 0)
+               or _env_int(environ, 'GUNICORN_WORKERS', 1))
+    threads = (from_cmd(r'--threads[ =](\d+)')
+               or _env_int(environ, 'GUNICORN_THREADS', 1))
+    return max(workers, 1), max(threads, 1)
+
+
+def build_engine_options(url, environ=None):
+    """
+    Monta SQLALCHEMY_ENGINE_OPTIONS para a URL informada
+
+    - DB_POOL_MODE=pgbouncer: modo compatível com pgbouncer em transaction pooling
+      (sem pool local, sem parâmetros de sessão na conexão, sem prepared statements)
+    - DB_MAX_CONNECTIONS: limite de conexões do servidor, dividido entre os workers
+    - DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT / DB_POOL_RECYCLE: ajustes manuais
+    - DB_CONNECT_TIMEOUT / DB_STATEMENT_TIMEOUT_MS: timeouts de conexão e de consulta
+    """
+    environ = os.environ if environ is None else environ
+    url = normalize_database_url(url) or ''
+
+    if not url.startswith('postgresql'):
+        # SQLite e outros bancos locais: apenas o pre-ping
+        return {'pool_pre_ping': True}
+
+    workers, threads = gunicorn_concurrency(environ)
+    pgbouncer = environ.get('DB_POOL_MODE', '').lower() == 'pgbouncer'
+    statement_timeout = _env_int(environ, 'DB_STATEMENT_TIMEOUT_MS', DEFAULT_STATEMENT_TIMEOUT_MS)
+    psycopg3 = url.startswith('postgresql+psycopg:')
+
+    connect_args = {
+        'connect_timeout': _env_int(environ, 'DB_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+        'application_name': environ.get('DB_APPLICATION_NAME', 'omolokoceara'),
+        'keepalives': 1,
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 3,
+    }
+
+    if pgbouncer:
+        from sqlalchemy.pool import NullPool
+
+        # O pgbouncer já faz o pool; parâmetros de sessão (options) são rejeitados
+        # e prepared statements no servidor não sobrevivem à troca de conexão
+        if psycopg3:
+            connect_args['prepare_threshold'] = None
+        return {
+            'poolclass': NullPool,
+            'connect_args': connect_args,
+            'execution_options': {'statement_timeout_ms': statement_timeout},
+        }
+
+    if statement_timeout:
+        connect_args['options'] = f'-c statement_timeout={statement_timeout}'
+    if psycopg3:
+        connect_args['prepare_threshold'] = _env_int(environ, 'DB_PREPARE_THRESHOLD', 5)
+
+    # Cada thread do worker usa no máximo uma conexão por vez
+    pool_size = _env_int(environ, 'DB_POOL_SIZE', threads)
+    max_overflow = _env_int(environ, 'DB_MAX_OVERFLOW', max(1, threads // 2))
+
+    max_connections = _env_int(environ, 'DB_MAX_CONNECTIONS', 0)
+    if max_connections:
+        per_worker = max(1, max_connections // workers)
+        pool_size = min(pool_size, per_worker)
+        max_overflow = min(max_overflow, per_worker - pool_size)
+
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': _env_int(environ, 'DB_POOL_TIMEOUT', 10),
+        'pool_recycle': _env_int(environ, 'DB_POOL_RECYCLE', DEFAULT_POOL_RECYCLE),
+        'pool_pre_ping': True,
+        'pool_use_lifo': True,
+        'connect_args': connect_args,
+    }
+
+
+class PoolMonitor:
+    """Acompanha a utilização do pool e repassa cada mudança aos hooks registrados"""
+
+    def __init__(self, high_water=0.9):
+        self.high_water = high_water
+        self._lock = threading.Lock()
+        self._hooks = []
+        self._engine = None
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def add_hook(self, hook):
+        """Registra hook(event, stats), chamado a cada checkout/checkin/conexão"""
+        self._hooks.append(hook)
+
+    def attach(self, engine):
+        """Escuta os eventos do pool do engine"""
+        from sqlalchemy import event
+
+        self._engine = engine
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+
+        timeout = engine.get_execution_options().get('statement_timeout_ms')
+        if timeout:
+            # Modo pgbouncer: o timeout vale só para a transação corrente
+            def set_local_timeout(conn):
+                conn.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+            event.listen(engine, 'begin', set_local_timeout)
+
+    def stats(self):
+        """Utilização atual do pool"""
+        pool = self._engine.pool if self._engine is not None else None
+        size = pool.size() if pool is not None and hasattr(pool, 'size') else None
+        overflow = getattr(pool, '_max_overflow', 0) if pool is not None else 0
+        capacity = size + max(overflow, 0) if size is not None else None
+        with self._lock:
+            return {
+                'checked_out': self.checked_out,
+                'peak_checked_out': self.peak_checked_out,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'pool_size': size,
+                'capacity': capacity,
+                'utilization': self.checked_out / capacity if capacity else None,
+            }
+
+    def _emit(self, event_name):
+        if not self._hooks:
+            return
+        stats = self.stats()
+        for hook in self._hooks:
+            try:
+                hook(event_name, stats)
+            except Exception:
+                pass
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+        self._emit('connect')
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+        self._emit('checkout')
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+        self._emit('checkin')
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+        self._emit('invalidate')
+
+
+pool_monitor = PoolMonitor()
+
+
+def log_high_utilization(logger):
+    """Hook padrão: registra um aviso quando o pool se aproxima da capacidade"""
+    def hook(event_name, stats):
+        utilization = stats.get('utilization')
+        if event_name == 'checkout' and utilization is not None and utilization >= pool_monitor.high_water:
+            logger.warning(
+                f"Pool de conexões em {utilization:.0%} "
+                f"({stats['checked_out']}/{stats['capacity']} conexões em uso)"
+            )
+    return hook
@@ -0,0 +1,101 @@
+"""
+Cache de fragmentos de template
+A tag {% cache "nome", "secao1", "secao2" %}...{% endcache %} guarda o HTML renderizado
+do bloco, identificado pelas revisões das seções usadas nele, calculadas a partir da
+variável data do template (os dados efetivamente renderizados); o bloco só é renderizado
+de novo quando alguma dessas seções muda
+"""
+import os
+import threading
+from collections import OrderedDict
+from flask import has_request_context, request
+from jinja2 import nodes
+from jinja2.ext import Extension
+from tenants import current_tenant
+
+# Fragmentos renderizados mantidos em cada worker (os menos usados são descartados)
+FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 256))
+
+
+class FragmentCache:
+    """Cache LRU de fragmentos renderizados"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key, render):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return html
+            self.misses += 1
+
+        # Renderiza fora do lock; renderizações concorrentes geram o mesmo HTML
+        html = render()
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class FragmentCacheExtension(Extension):
+    """Extensão Jinja com a tag {% cache %}"""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(
+            fragment_cache=FragmentCache(FRAGMENT_CACHE_SIZE),
+            # revisions(seções, data) -> revisões das seções em data; used(seções) a cada uso do fragmento
+            fragment_revisions=None,
+            fragment_used=None,
+        )
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        # Os dados renderizados pelo bloco (variável data do template) identificam o fragmento
+        args = [nodes.Const(parser.name), nodes.Const(lineno), nodes.Name('data', 'load'),
+                parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render_fragment', args), [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, template, lineno, data, name, *sections, caller):
+        environment = self.environment
+        if environment.fragment_used is not None:
+            environment.fragment_used(sections)
+        revisions = environment.fragment_revisions(sections, data) if environment.fragment_revisions else ()
+        # O HTML depende também do site (tenant) e do prefixo das URLs geradas
+        script_root = request.script_root if has_request_context() else ''
+        key = (current_tenant(), script_root, template, lineno, name, revisions)
+        return environment.fragment_cache.get_or_render(key, caller)
+
+
+def init_app(app, revisions, used=None):
+    """
+    Ativa a tag {% cache %} nos templates da aplicação
+    revisions(seções, data) retorna as revisões das seções usadas no fragmento nos dados
+    renderizados (data pode ser Undefined se o template não recebeu dados)
+    """
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_revisions = revisions
+    app.jinja_env.fragment_used = used
+
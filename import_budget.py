@@ -0,0 +1,110 @@
+"""
+Orçamento de tempo de inicialização do worker
+Importa o app em um processo novo com python -X importtime e compara o tempo total de
+import com IMPORT_BUDGET_MS; também falha se algum módulo que deve ser carregado sob
+demanda (SQLAlchemy, driver do banco, migração, SMTP) já vier no import. Em seguida mede
+a configuração e a primeira requisição (/) em outro processo novo
+Usa o backend do ambiente atual (com DATABASE_URL, o banco)
+
+Uso: python import_budget.py [--budget-ms 300] [--first-request-budget-ms 0] [--runs 3] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+IMPORT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 300))
+FIRST_REQUEST_BUDGET_MS = float(os.environ.get('FIRST_REQUEST_BUDGET_MS', 0))
+# Carregados apenas quando usados; não podem aparecer no import do app
+LAZY_MODULES = ['sqlalchemy', 'flask_sqlalchemy', 'psycopg2', 'database', 'admin.utils_db',
+                'migrate_data', 'smtplib']
+
+FIRST_REQUEST_SCRIPT = """
+import time
+start = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+response = app.test_client().get('/', headers={'User-Agent': 'import-budget-bot'})
+response.get_data()
+done = time.perf_counter()
+print(response.status_code, (imported - start) * 1000, (done - imported) * 1000)
+"""
+
+
+def _environ():
+    env = dict(os.environ)
+    env.setdefault('ANALYTICS_ENABLED', '0')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                      env.get('PYTHONPATH')]))
+    # Sem o cache de bytecode o tempo medido seria o de compilação
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    return env
+
+
+def import_times():
+    """{módulo: (próprio, acumulado) em ms} do import do app em um processo novo"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            capture_output=True, text=True, env=_environ())
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else 'falha no import')
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = (int(own) / 1000, int(cumulative) / 1000)
+    return times
+
+
+def first_request():
+    """(status, ms do import, ms da primeira requisição) em um processo novo"""
+    result = subprocess.run([sys.executable, '-c', FIRST_REQUEST_SCRIPT],
+                            capture_output=True, text=True, env=_environ())
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else 'falha na requisição')
+    status, imported, request = result.stdout.split()[-3:]
+    return int(status), float(imported), float(request)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Verifica o tempo de import e de inicialização do app')
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS, help='Limite do import (ms)')
+    parser.add_argument('--first-request-budget-ms', type=float, default=FIRST_REQUEST_BUDGET_MS,
+                        help='Limite da primeira requisição (ms, 0 = apenas mostrar)')
+    parser.add_argument('--runs', type=int, default=3, help='Execuções (vale a mais rápida)')
+    parser.add_argument('--top', type=int, default=15, help='Módulos mais lentos listados')
+    args = parser.parse_args()
+
+    backend = 'banco de dados' if os.environ.get('DATABASE_URL') else 'JSON'
+    runs = [import_times() for _ in range(max(args.runs, 1))]
+    times = min(runs, key=lambda t: sum(own for own, _ in t.values()))
+    total = sum(own for own, _ in times.values())
+    failed = False
+
+    print(f"Backend: {backend}")
+    print(f"Import do app: {total:.1f} ms (limite {args.budget_ms:.0f} ms, {len(times)} módulos)")
+    if total > args.budget_ms:
+        print("  ✗ acima do limite")
+        failed = True
+
+    print(f"\n{'módulo':<40} {'próprio':>9} {'acumulado':>10}")
+    for name, (own, cumulative) in sorted(times.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"{name:<40} {own:>7.1f}ms {cumulative:>8.1f}ms")
+
+    loaded = [name for name in LAZY_MODULES if name in times]
+    if loaded:
+        print(f"\n✗ Módulos carregados no import (deveriam ser sob demanda): {', '.join(loaded)}")
+        failed = True
+
+    status, imported, request = first_request()
+    print(f"\nPrimeira requisição (/): HTTP {status}, {request:.1f} ms após {imported:.1f} ms de import")
+    if status != 200 or (args.first_request_budget_ms and request > args.first_request_budget_ms):
+        print("  ✗ acima do limite" if status == 200 else "  ✗ resposta inesperada")
+        failed = True
+
+    print("\n✗ Orçamento de inicialização excedido" if failed else "\n✓ Dentro do orçamento")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
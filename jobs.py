@@ -0,0 +1,279 @@
+"""
+Execução de tarefas em segundo plano
+Fila persistente em SQLite (sobrevive a reinícios e é compartilhada entre os workers)
+processada por um pool de threads, com deduplicação por chave e novas tentativas
+com backoff exponencial; cada tarefa roda como o tenant que a enfileirou
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from tenants import DEFAULT_TENANT, current_tenant, tenant_context
+
+JOBS_DB = os.environ.get(
+    'JOBS_DB',
+    os.path.join(os.path.dirname(__file__), 'data', 'cache', 'jobs.sqlite3')
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tenant TEXT NOT NULL,
+    name TEXT NOT NULL,
+    key TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    locked_until REAL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at);
+DROP INDEX IF EXISTS ix_jobs_key;
+CREATE INDEX IF NOT EXISTS ix_jobs_tenant_key ON jobs (tenant, key, status);
+CREATE INDEX IF NOT EXISTS ix_jobs_tenant_updated_at ON jobs (tenant, updated_at);
+"""
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueue:
+    """
+    Fila de tarefas persistente
+    As tarefas são registradas por nome com register() e enfileiradas com enqueue();
+    uma tarefa pendente com a mesma chave é reaproveitada em vez de duplicada
+    """
+
+    def __init__(self, path, workers=2, max_attempts=5, backoff=2.0, max_backoff=300.0,
+                 lease=300.0, poll_interval=1.0, keep_finished=86400.0):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.keep_finished = keep_finished
+        self.app = None
+        self._handlers = {}
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._started_pid = None
+        self._schema_ready = False
+
+    def init_app(self, app):
+        """Associa a aplicação (as tarefas rodam dentro do seu app context)"""
+        self.app = app
+        # Inicia as threads no próprio worker (depois do fork do gunicorn)
+        app.before_request(self._ensure_started)
+
+    def register(self, name, handler, merge=None):
+        """
+        Registra o handler de uma tarefa; merge(payload_antigo, payload_novo) combina
+        o payload de uma tarefa pendente com a mesma chave (padrão: substitui)
+        """
+        self._handlers[name] = (handler, merge)
+
+    def enqueue(self, name, payload=None, key=None, delay=0.0):
+        """
+        Enfileira uma tarefa do tenant atual e retorna o ID (o da tarefa pendente,
+        se deduplicada; a chave vale apenas dentro do tenant)
+        """
+        payload = payload or {}
+        tenant = current_tenant()
+        now = time.time()
+        merge = self._handlers.get(name, (None, None))[1]
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            existing = None
+            if key is not None:
+                existing = conn.execute(
+                    'SELECT id, payload FROM jobs WHERE tenant = ? AND key = ? AND status = ? '
+                    'ORDER BY id LIMIT 1',
+                    (tenant, key, PENDING)
+                ).fetchone()
+            if existing:
+                job_id, old_payload = existing
+                if merge:
+                    payload = merge(json.loads(old_payload), payload)
+                conn.execute(
+                    'UPDATE jobs SET payload = ?, run_at = MAX(run_at, ?), updated_at = ? WHERE id = ?',
+                    (json.dumps(payload), now + delay, now, job_id)
+                )
+            else:
+                cursor = conn.execute(
+                    'INSERT INTO jobs (tenant, name, key, payload, status, run_at, created_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (tenant, name, key, json.dumps(payload), PENDING, now + delay, now, now)
+                )
+                job_id = cursor.lastrowid
+            conn.execute('COMMIT')
+        self._ensure_started()
+        self._wakeup.set()
+        return job_id
+
+    def stats(self, limit=10):
+        """Contagem por status e as tarefas mais recentes do tenant atual (para o dashboard)"""
+        tenant = current_tenant()
+        with self._connect() as conn:
+            counts = dict(conn.execute(
+                'SELECT status, COUNT(*) FROM jobs WHERE tenant = ? GROUP BY status', (tenant,)
+            ).fetchall())
+            rows = conn.execute(
+                'SELECT id, name, status, attempts, last_error, updated_at '
+                'FROM jobs WHERE tenant = ? ORDER BY updated_at DESC LIMIT ?', (tenant, limit)
+            ).fetchall()
+        recent = [{
+            'id': job_id,
+            'name': name,
+            'status': status,
+            'attempts': attempts,
+            'last_error': last_error,
+            'updated_at': time.strftime('%d/%m/%Y %H:%M:%S', time.localtime(updated_at)),
+        } for job_id, name, status, attempts, last_error, updated_at in rows]
+        return {
+            'counts': {status: counts.get(status, 0) for status in (PENDING, RUNNING, DONE, FAILED)},
+            'recent': recent,
+        }
+
+    def run_pending(self):
+        """Executa no thread atual as tarefas prontas; retorna quantas foram executadas"""
+        executed = 0
+        while True:
+            job = self._claim()
+            if job is None:
+                return executed
+            self._run(job)
+            executed += 1
+
+    @contextmanager
+    def _connect(self):
+        if not self._schema_ready:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            if not self._schema_ready:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.executescript(_SCHEMA)
+                columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+                if 'tenant' not in columns:
+                    # Filas criadas antes dos tenants: as tarefas existentes são do padrão
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN tenant TEXT NOT NULL DEFAULT '{DEFAULT_TENANT}'")
+                conn.executescript(_INDEXES)
+                self._schema_ready = True
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _ensure_started(self):
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._start_lock:
+            if self._started_pid == pid:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'jobs-{i}', daemon=True)
+                thread.start()
+            self._started_pid = pid
+
+    def _worker_loop(self):
+        while True:
+            try:
+                if not self.run_pending():
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+            except Exception as e:
+                self._log_error(f"Erro no executor de tarefas: {e}")
+                time.sleep(self.poll_interval)
+
+    def _claim(self):
+        """Reserva a próxima tarefa pronta (ou com a reserva expirada após uma queda)"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT id, tenant, name, payload, attempts FROM jobs '
+                'WHERE (status = ? AND run_at <= ?) OR (status = ? AND locked_until < ?) '
+                'ORDER BY run_at LIMIT 1',
+                (PENDING, now, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                'UPDATE jobs SET status = ?, attempts = attempts + 1, locked_until = ?, updated_at = ? '
+                'WHERE id = ?',
+                (RUNNING, now + self.lease, now, row[0])
+            )
+            conn.execute('COMMIT')
+        job_id, tenant, name, payload, attempts = row
+        return {'id': job_id, 'tenant': tenant, 'name': name, 'payload': json.loads(payload),
+                'attempts': attempts + 1}
+
+    def _run(self, job):
+        handler = self._handlers.get(job['name'], (None, None))[0]
+        try:
+            if handler is None:
+                raise LookupError(f"Tarefa desconhecida: {job['name']}")
+            with tenant_context(job['tenant']):
+                if self.app is not None:
+                    with self.app.app_context():
+                        handler(job['payload'])
+                else:
+                    handler(job['payload'])
+        except Exception as e:
+            self._finish_failed(job, e)
+        else:
+            self._finish(job['id'], DONE)
+
+    def _finish(self, job_id, status, error=None, run_at=None):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, last_error = ?, locked_until = NULL, '
+                'run_at = COALESCE(?, run_at), updated_at = ? WHERE id = ?',
+                (status, error, run_at, now, job_id)
+            )
+            # Remove tarefas concluídas antigas
+            conn.execute(
+                'DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?',
+                (DONE, FAILED, now - self.keep_finished)
+            )
+
+    def _finish_failed(self, job, error):
+        message = f'{type(error).__name__}: {error}'
+        if job['attempts'] >= self.max_attempts:
+            self._log_error(f"Tarefa {job['name']} #{job['id']} falhou definitivamente: {message}\n"
+                            f"{traceback.format_exc()}")
+            self._finish(job['id'], FAILED, message)
+            return
+        delay = min(self.max_backoff, self.backoff * 2 ** (job['attempts'] - 1))
+        self._finish(job['id'], PENDING, message, run_at=time.time() + delay)
+
+    def _log_error(self, message):
+        if self.app is not None:
+            self.app.logger.error(message)
+
+
+job_queue = JobQueue(
+    JOBS_DB,
+    workers=int(os.environ.get('JOBS_WORKERS', 2)),
+    max_attempts=int(os.environ.get('JOBS_MAX_ATTEMPTS', 5)),
+    backoff=float(os.environ.get('JOBS_BACKOFF', 2)),
+)
@@ -1,36 +1,404 @@
 """
 Script de migração automática de dados JSON para PostgreSQL
 Preserva todos os dados existentes sem perda de informação
+
+A importação (JsonMigration) lê os arquivos JSON em fluxo, sem carregá-los inteiros,
+grava em lotes (uma transação por lote), gera os hashes das senhas em paralelo em
+processos separados e registra um checkpoint após cada lote para retomar do ponto em
+que parou; no modo dry_run apenas lista as diferenças em relação ao banco
 """
+import hashlib
 import json
+import multiprocessing
 import os
 import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from sqlalchemy import insert
 from database import db, SiteData, User
+from tenants import current_tenant
 from werkzeug.security import generate_password_hash
 
-def backup_json_files():
-    """Cria backup dos arquivos JSON antes da migração"""
-    backup_dir = os.path.join('data', 'backups')
+# Registros gravados por transação
+MIGRATION_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', 500))
+# Processos que geram os hashes das senhas (0 = número de CPUs)
+MIGRATION_WORKERS = int(os.environ.get('MIGRATION_WORKERS', 0))
+CHECKPOINT_FILE = os.path.join('data', 'cache', 'migration_checkpoint.json')
+# Backups mantidos de cada arquivo; os mais antigos são removidos (0 = sem limite)
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 10))
+# Prefixos dos hashes do werkzeug (senhas já convertidas não são refeitas)
+HASH_PREFIXES = ('scrypt:', 'pbkdf2:')
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def backup_json_files(data_dir='data'):
+    """Cria backup dos arquivos JSON (de data_dir) antes da migração"""
+    backup_dir = os.path.join(data_dir, 'backups')
     os.makedirs(backup_dir, exist_ok=True)
-    
+
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    
-    files_to_backup = ['site_data.json', 'users.json']
+
+    files_to_backup = ['site_data.json', 'users.json', 'events.json']
     backed_up = []
-    
+
     for filename in files_to_backup:
-        source = os.path.join('data', filename)
+        source = os.path.join(data_dir, filename)
         if os.path.exists(source):
+            # Não repetir o backup se o arquivo não mudou desde o último
+            previous = sorted(name for name in os.listdir(backup_dir) if name.startswith(f"{filename}.backup_"))
+            if previous and _file_digest(os.path.join(backup_dir, previous[-1])) == _file_digest(source):
+                continue
             backup_filename = f"{filename}.backup_{timestamp}"
             backup_path = os.path.join(backup_dir, backup_filename)
             shutil.copy2(source, backup_path)
             backed_up.append(backup_path)
             print(f"  💾 Backup criado: {backup_filename}")
-    
+            if BACKUP_KEEP:
+                for old in (previous + [backup_filename])[:-BACKUP_KEEP]:
+                    os.remove(os.path.join(backup_dir, old))
+
     return backed_up
 
-def migrate_json_to_database(app):
+
+class JsonStream:
+    """
+    Leitor de JSON em fluxo: percorre os membros do objeto (ou os itens da lista) do
+    nível mais alto decodificando um valor por vez
+    """
+
+    def __init__(self, f, chunk_size=65536):
+        self._f = f
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self._eof:
+            return False
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        # Descarta o que já foi lido para manter na memória apenas o valor atual
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """Próximo caractere fora de espaços (sem consumi-lo), ou '' no fim do arquivo"""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"JSON inválido: esperado '{char}' na posição {self._pos}")
+        self._pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # Um número no fim do buffer pode continuar no próximo bloco
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+    def _items(self, close):
+        """Itens separados por vírgula até o caractere de fechamento"""
+        if self._peek() == close:
+            self._pos += 1
+            return
+        while True:
+            yield
+            char = self._peek()
+            self._pos += 1
+            if char == close:
+                return
+            if char != ',':
+                raise ValueError(f"JSON inválido: esperado ',' ou '{close}' na posição {self._pos}")
+
+    def members(self):
+        """(chave, valor) de cada membro do objeto do nível mais alto"""
+        self._expect('{')
+        for _ in self._items('}'):
+            key = self._value()
+            self._expect(':')
+            yield key, self._value()
+
+    def records(self, key):
+        """Itens da lista do nível mais alto, ou da lista em {key: [...]}"""
+        if self._peek() == '[':
+            self._pos += 1
+            for _ in self._items(']'):
+                yield self._value()
+            return
+        self._expect('{')
+        for _ in self._items('}'):
+            name = self._value()
+            self._expect(':')
+            if name == key and self._peek() == '[':
+                self._pos += 1
+                for _ in self._items(']'):
+                    yield self._value()
+            else:
+                self._value()
+
+
+def _is_hash(value):
+    return isinstance(value, str) and value.startswith(HASH_PREFIXES)
+
+
+def _hash_password(password):
+    return generate_password_hash(password)
+
+
+def _parse_created_at(value):
+    if not value:
+        return None
+    for parse in (datetime.fromisoformat, lambda v: datetime.strptime(v, '%Y-%m-%d')):
+        try:
+            return parse(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class Checkpoint:
+    """Registros já gravados de cada arquivo importado (por tenant e pelo conteúdo do arquivo)"""
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def _key(kind, source):
+        return f"{current_tenant()}:{kind}:{os.path.abspath(source)}"
+
+    @staticmethod
+    def _signature(source):
+        stat = os.stat(source)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def done(self, kind, source):
+        """Registros já gravados; zero se o arquivo mudou desde o checkpoint"""
+        entry = self._entries.get(self._key(kind, source))
+        if not entry or entry.get('signature') != self._signature(source):
+            return 0
+        return entry.get('done', 0)
+
+    def update(self, kind, source, done):
+        self._entries[self._key(kind, source)] = {'signature': self._signature(source), 'done': done}
+        self._save()
+
+    def clear(self, kind, source):
+        if self._entries.pop(self._key(kind, source), None) is not None:
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f, indent=4)
+        os.replace(tmp_path, self.path)
+
+
+class MigrationStats:
+    """Contadores e vazão de uma importação"""
+
+    def __init__(self, label):
+        self.label = label
+        self.read = 0
+        self.added = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.resumed = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed > 0 else 0
+
+    def summary(self):
+        text = (f"{self.label}: {self.read} lidos, {self.added} adicionados, {self.updated} atualizados, "
+                f"{self.unchanged} iguais, {self.skipped} mantidos/ignorados "
+                f"em {self.elapsed:.1f}s ({self.rate:.0f}/s)")
+        if self.resumed:
+            text += f"; {self.resumed} já importados antes (checkpoint)"
+        return text
+
+
+class JsonMigration:
+    """
+    Importa site_data.json e listas de usuários para o banco do tenant atual
+    overwrite: atualiza seções que já existem no banco (por padrão são mantidas)
+    dry_run: apenas lista as diferenças (+ novo, ~ alterado, ! mantido ou ignorado)
+    checkpoint/resume: registra o progresso e retoma a importação interrompida do mesmo arquivo
+    """
+
+    def __init__(self, batch_size=MIGRATION_BATCH_SIZE, workers=MIGRATION_WORKERS, overwrite=False,
+                 dry_run=False, checkpoint=None, resume=True, log=print):
+        self.batch_size = max(batch_size, 1)
+        self.workers = workers or os.cpu_count() or 1
+        self.overwrite = overwrite
+        self.dry_run = dry_run
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.log = log
+        self._pool = None
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _hash_passwords(self, passwords):
+        if self.workers <= 1 or len(passwords) < 2:
+            return [_hash_password(password) for password in passwords]
+        if self._pool is None:
+            # spawn: o processo do worker web/CLI tem threads (tarefas, analytics) que não sobrevivem a um fork
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        chunksize = max(len(passwords) // (self.workers * 4), 1)
+        return list(self._pool.map(_hash_password, passwords, chunksize=chunksize))
+
+    def _run(self, kind, source, records, write_batch):
+        """Percorre os registros em lotes, gravando cada lote e o checkpoint"""
+        stats = MigrationStats(kind)
+        done = self.checkpoint.done(kind, source) if self.checkpoint and self.resume and not self.dry_run else 0
+        batch = []
+        for record in records:
+            if stats.resumed < done:
+                stats.resumed += 1
+                continue
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self._write(kind, source, batch, write_batch, stats)
+                batch = []
+        if batch:
+            self._write(kind, source, batch, write_batch, stats)
+        if self.checkpoint and not self.dry_run:
+            self.checkpoint.clear(kind, source)
+        return stats
+
+    def _write(self, kind, source, batch, write_batch, stats):
+        try:
+            write_batch(batch, stats)
+            if self.dry_run:
+                db.session.rollback()
+            else:
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        stats.read += len(batch)
+        if self.checkpoint and not self.dry_run:
+            self.checkpoint.update(kind, source, stats.resumed + stats.read)
+        self.log(f"  … {kind}: {stats.resumed + stats.read} registros ({stats.rate:.0f}/s)")
+
+    def migrate_site_data(self, source):
+        """Importa as seções de um site_data.json"""
+        def write_batch(batch, stats):
+            keys = [key for key, _ in batch]
+            existing = {row.key: row for row in SiteData.query.filter(SiteData.key.in_(keys))}
+            for key, value in batch:
+                row = existing.get(key)
+                if row is None:
+                    existing[key] = SiteData(key=key, value=value)
+                    db.session.add(existing[key])
+                    stats.added += 1
+                    self._diff('+', key)
+                elif row.value == value:
+                    stats.unchanged += 1
+                elif self.overwrite:
+                    row.value = value
+                    stats.updated += 1
+                    self._diff('~', key)
+                else:
+                    stats.skipped += 1
+                    self._diff('!', key, 'diferente no banco, mantida')
+
+        with open(source, 'r', encoding='utf-8') as f:
+            return self._run('site_data', source, JsonStream(f).members(), write_batch)
+
+    def migrate_users(self, source):
+        """Importa usuários de um users.json ({"users": [...]} ou lista); os existentes são mantidos"""
+        seen = set()
+
+        def write_batch(batch, stats):
+            names = {user.get('username') for user in batch if isinstance(user, dict) and user.get('username')}
+            existing = {name for (name,) in db.session.query(User.username).filter(User.username.in_(names))}
+            new_users = []
+            for user in batch:
+                username = user.get('username') if isinstance(user, dict) else None
+                if not username:
+                    stats.skipped += 1
+                    self._diff('!', '(sem username)', 'ignorado')
+                elif username in existing or username in seen:
+                    stats.skipped += 1
+                elif not user.get('password') and not _is_hash(user.get('password_hash')):
+                    stats.skipped += 1
+                    self._diff('!', username, 'sem senha, ignorado')
+                else:
+                    seen.add(username)
+                    new_users.append(user)
+                    self._diff('+', username)
+            stats.added += len(new_users)
+            if self.dry_run or not new_users:
+                return
+
+            # Senhas em texto puro viram hash; hashes já prontos são mantidos
+            plain = [user for user in new_users if not _is_hash(user.get('password_hash'))]
+            hashes = dict(zip((id(user) for user in plain),
+                              self._hash_passwords([str(user.get('password')) for user in plain])))
+            db.session.execute(insert(User), [{
+                'username': user['username'],
+                'password_hash': hashes.get(id(user)) or user['password_hash'],
+                'name': user.get('name') or '',
+                'email': user.get('email') or '',
+                'active': bool(user.get('active', True)),
+                'created_at': _parse_created_at(user.get('created_at')) or datetime.utcnow(),
+            } for user in new_users])
+
+        with open(source, 'r', encoding='utf-8') as f:
+            return self._run('users', source, JsonStream(f).records('users'), write_batch)
+
+    def _diff(self, mark, name, note=''):
+        if self.dry_run:
+            self.log(f"  {mark} {name}" + (f" ({note})" if note else ''))
+
+
+def migrate_json_to_database(app, data_dir='data'):
     """
     Migra todos os dados dos arquivos JSON para o banco de dados
     Preserva todas as informações existentes
@@ -40,109 +408,44 @@ def migrate_json_to_database(app):
             # Verificar se já existe dados no banco
             existing_data_count = SiteData.query.count()
             existing_users_count = User.query.count()
-            
+
             if existing_data_count > 0 and existing_users_count > 0:
                 print("✓ Dados já existem no banco. Pulando migração.")
                 return False
-            
+
+            data_file = os.path.join(data_dir, 'site_data.json')
+            users_file = os.path.join(data_dir, 'users.json')
+            if not os.path.exists(data_file) and not os.path.exists(users_file):
+                print("⚠️  Arquivos site_data.json e users.json não encontrados.")
+                return False
+
             # Criar backup antes de migrar
             print("💾 Criando backup dos arquivos JSON...")
-            backup_json_files()
+            backup_json_files(data_dir)
             print()
-            
+
             migrated = False
-            
-            # 1. Migrar dados do site (site_data.json)
-            data_file = os.path.join('data', 'site_data.json')
-            if os.path.exists(data_file):
-                print("📦 Migrando dados do site...")
-                with open(data_file, 'r', encoding='utf-8') as f:
-                    site_data = json.load(f)
-                
-                for key, value in site_data.items():
-                    # Verificar se a chave já existe no banco
-                    existing = SiteData.query.filter_by(key=key).first()
-                    if existing:
-                        # Atualizar apenas se o banco estiver vazio (primeira migração)
-                        if existing_data_count == 0:
-                            existing.value = value
-                            print(f"  ✓ Atualizado: {key}")
-                            migrated = True
-                        else:
-                            print(f"  ⊘ Mantido (já existe): {key}")
-                    else:
-                        # Criar novo registro
-                        new_data = SiteData(key=key, value=value)
-                        db.session.add(new_data)
-                        print(f"  ✓ Adicionado: {key}")
-                        migrated = True
-                
-                if migrated:
-                    db.session.commit()
-                    print("✅ Dados do site migrados com sucesso!")
-                else:
-                    print("ℹ️  Dados do site já estão no banco.")
-            else:
-                print("⚠️  Arquivo site_data.json não encontrado.")
-            
-            # 2. Migrar usuários (users.json)
-            users_file = os.path.join('data', 'users.json')
-            if os.path.exists(users_file):
-                print("\n👥 Migrando usuários...")
-                with open(users_file, 'r', encoding='utf-8') as f:
-                    users_data = json.load(f)
-                
-                users_migrated = False
-                for user_data in users_data.get('users', []):
-                    username = user_data.get('username')
-                    if not username:
-                        continue
-                    
-                    # Verificar se o usuário já existe
-                    existing_user = User.query.filter_by(username=username).first()
-                    if existing_user:
-                        print(f"  ⊘ Usuário '{username}' já existe, mantendo...")
-                        continue
-                    
-                    # Criar novo usuário
-                    new_user = User(
-                        username=username,
-                        name=user_data.get('name', ''),
-                        email=user_data.get('email', ''),
-                        active=user_data.get('active', True)
-                    )
-                    
-                    # Converter senha para hash (se ainda não estiver em hash)
-                    password = user_data.get('password', '')
-                    if password:
-                        new_user.set_password(password)
-                    
-                    # Definir data de criação se disponível
-                    if 'created_at' in user_data:
-                        try:
-                            from datetime import datetime
-                            new_user.created_at = datetime.strptime(user_data['created_at'], '%Y-%m-%d')
-                        except:
-                            pass
-                    
-                    db.session.add(new_user)
-                    print(f"  ✓ Migrado: {username}")
-                    users_migrated = True
-                
-                if users_migrated:
-                    db.session.commit()
-                    print("✅ Usuários migrados com sucesso!")
-                else:
-                    print("ℹ️  Usuários já estão no banco.")
-            else:
-                print("⚠️  Arquivo users.json não encontrado.")
-            
-            return migrated or users_migrated
-            
+            # Poucos registros: hashes no próprio processo, sem checkpoint
+            with JsonMigration(workers=1, overwrite=existing_data_count == 0) as migration:
+                # 1. Migrar dados do site (site_data.json)
+                if os.path.exists(data_file):
+                    print("📦 Migrando dados do site...")
+                    stats = migration.migrate_site_data(data_file)
+                    print(f"✅ {stats.summary()}")
+                    migrated = stats.added + stats.updated > 0
+
+                # 2. Migrar usuários (users.json)
+                if os.path.exists(users_file):
+                    print("\n👥 Migrando usuários...")
+                    stats = migration.migrate_users(users_file)
+                    print(f"✅ {stats.summary()}")
+                    migrated = migrated or stats.added > 0
+
+            return migrated
+
         except Exception as e:
             print(f"❌ Erro durante migração: {e}")
             import traceback
             traceback.print_exc()
             db.session.rollback()
             return False
-
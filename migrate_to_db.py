@@ -1,85 +1,68 @@
 """
 Script para migrar dados dos arquivos JSON para o banco de dados PostgreSQL
 Execute este script uma vez após configurar o banco de dados no Render
+
+Uso:
+    python migrate_to_db.py                       # data/site_data.json e data/users.json
+    python migrate_to_db.py --users usuarios.json --workers 8
+    python migrate_to_db.py --dry-run             # apenas mostra as diferenças
 """
-import json
+import argparse
 import os
-from database import db, SiteData, User
-from app import app
+from migrate_data import (
+    MIGRATION_BATCH_SIZE, MIGRATION_WORKERS, CHECKPOINT_FILE, Checkpoint, JsonMigration
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migra os arquivos JSON para o banco de dados')
+    parser.add_argument('--site', default=os.path.join('data', 'site_data.json'),
+                        help='Arquivo com os dados do site ("" para não importar)')
+    parser.add_argument('--users', default=os.path.join('data', 'users.json'),
+                        help='Arquivo com os usuários ("" para não importar)')
+    parser.add_argument('--tenant', default=None, help='Site (tenant) de destino')
+    parser.add_argument('--batch-size', type=int, default=MIGRATION_BATCH_SIZE, help='Registros por transação')
+    parser.add_argument('--workers', type=int, default=MIGRATION_WORKERS,
+                        help='Processos para gerar os hashes das senhas (0 = número de CPUs)')
+    parser.add_argument('--overwrite', action='store_true', help='Atualiza as seções que já existem no banco')
+    parser.add_argument('--dry-run', action='store_true', help='Apenas lista as diferenças, sem gravar')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help='Arquivo de checkpoint')
+    parser.add_argument('--restart', action='store_true', help='Ignora o checkpoint e começa do início')
+    args = parser.parse_args()
+
+    # Importado aqui: os processos de hash (spawn) importam este módulo sem carregar a aplicação
+    from app import app
+    from startup import startup
+    from tenants import DEFAULT_TENANT, tenant_context
+
+    # O SQLAlchemy é registrado na aplicação sob demanda (antes da primeira requisição)
+    startup.ensure_setup()
 
-def migrate_json_to_db():
-    """Migra dados dos arquivos JSON para o banco de dados"""
-    
-    with app.app_context():
-        # Migrar dados do site
-        data_file = os.path.join('data', 'site_data.json')
-        if os.path.exists(data_file):
-            print("Migrando dados do site...")
-            with open(data_file, 'r', encoding='utf-8') as f:
-                site_data = json.load(f)
-            
-            for key, value in site_data.items():
-                existing = SiteData.query.filter_by(key=key).first()
-                if existing:
-                    existing.value = value
-                    print(f"  Atualizado: {key}")
-                else:
-                    new_data = SiteData(key=key, value=value)
-                    db.session.add(new_data)
-                    print(f"  Adicionado: {key}")
-            
-            db.session.commit()
-            print("✓ Dados do site migrados com sucesso!")
-        else:
-            print("⚠ Arquivo site_data.json não encontrado. Usando dados padrão.")
-        
-        # Migrar usuários
-        users_file = os.path.join('data', 'users.json')
-        if os.path.exists(users_file):
-            print("\nMigrando usuários...")
-            with open(users_file, 'r', encoding='utf-8') as f:
-                users_data = json.load(f)
-            
-            from werkzeug.security import generate_password_hash
-            
-            for user_data in users_data.get('users', []):
-                # Verificar se o usuário já existe
-                existing = User.query.filter_by(username=user_data['username']).first()
-                if existing:
-                    print(f"  Usuário {user_data['username']} já existe, pulando...")
+    with app.app_context(), tenant_context(args.tenant or DEFAULT_TENANT):
+        if not args.dry_run:
+            from database import db
+            from admin.utils_db import upgrade_schema
+            db.create_all()
+            upgrade_schema()
+
+        with JsonMigration(batch_size=args.batch_size, workers=args.workers, overwrite=args.overwrite,
+                           dry_run=args.dry_run, checkpoint=Checkpoint(args.checkpoint),
+                           resume=not args.restart) as migration:
+            if args.dry_run:
+                print("🔎 Modo dry-run: nada será gravado\n")
+            for label, source, migrate in (('dados do site', args.site, migration.migrate_site_data),
+                                           ('usuários', args.users, migration.migrate_users)):
+                if not source:
+                    continue
+                if not os.path.exists(source):
+                    print(f"⚠ Arquivo {source} não encontrado.")
                     continue
-                
-                # Criar novo usuário
-                new_user = User(
-                    username=user_data['username'],
-                    name=user_data.get('name', ''),
-                    email=user_data.get('email', ''),
-                    active=user_data.get('active', True)
-                )
-                
-                # Se a senha não está em hash, criar hash
-                password = user_data.get('password', '')
-                if password:
-                    new_user.set_password(password)
-                
-                # Definir data de criação se disponível
-                if 'created_at' in user_data:
-                    try:
-                        from datetime import datetime
-                        new_user.created_at = datetime.strptime(user_data['created_at'], '%Y-%m-%d')
-                    except:
-                        pass
-                
-                db.session.add(new_user)
-                print(f"  Migrado: {user_data['username']}")
-            
-            db.session.commit()
-            print("✓ Usuários migrados com sucesso!")
-        else:
-            print("⚠ Arquivo users.json não encontrado.")
-        
-        print("\n✅ Migração concluída!")
+                print(f"📦 Migrando {label} ({source})...")
+                stats = migrate(source)
+                print(f"✓ {stats.summary()}\n")
 
-if __name__ == '__main__':
-    migrate_json_to_db()
+        print("✅ Dry-run concluído!" if args.dry_run else "✅ Migração concluída!")
 
+
+if __name__ == '__main__':
+    main()
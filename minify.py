@@ -0,0 +1,109 @@
+"""
+Minificação do HTML renderizado
+Remove comentários e espaços sem efeito na página (preservando <pre>, <textarea>,
+<script> e <style>); o resultado de cada HTML é guardado em um cache LRU, já que as
+páginas públicas se repetem entre as requisições
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from flask import request
+
+ENABLED = os.environ.get('HTML_MINIFY', '1') == '1'
+MINIFY_CACHE_SIZE = int(os.environ.get('HTML_MINIFY_CACHE_SIZE', 128))
+
+# Blocos copiados sem alteração
+_PRESERVED_RE = re.compile(r'(<(pre|textarea|script|style)\b.*?</\2\s*>)', re.S | re.I)
+# Comentários, exceto os condicionais (<!--[if ...]>)
+_COMMENT_RE = re.compile(r'<!--(?!\[if).*?-->', re.S)
+_SPACE_RE = re.compile(r'\s+')
+# Abertura de bloco preservado ou de comentário (para saber onde uma página pode ser dividida)
+_OPEN_RE = re.compile(r'<(?:pre|textarea|script|style)\b|<!--', re.I)
+# Em volta de tags de bloco os espaços não aparecem na página e podem ser removidos
+_BLOCK_TAGS = (
+    'html|head|body|title|meta|link|base|header|footer|main|nav|section|article|aside|'
+    'div|p|ul|ol|li|dl|dt|dd|h[1-6]|table|thead|tbody|tr|th|td|form|fieldset|legend|'
+    'select|option|hr|br|svg|path|symbol|use|noscript|figure|figcaption|!doctype'
+)
+_BLOCK_SPACE_RE = re.compile(r'\s*(</?(?:%s)\b[^>]*>)\s*' % _BLOCK_TAGS, re.I)
+
+
+def minify_html(html, strip=True):
+    """Retorna o HTML minificado; com strip=False mantém um espaço nas pontas (trechos de uma página)"""
+    parts = _PRESERVED_RE.split(html)
+    output = []
+    # split com dois grupos: [texto, bloco preservado, nome da tag, texto, ...]
+    for i in range(0, len(parts), 3):
+        text = _COMMENT_RE.sub('', parts[i])
+        text = _SPACE_RE.sub(' ', text)
+        output.append(_BLOCK_SPACE_RE.sub(r'\1', text))
+        if i + 1 < len(parts):
+            output.append(parts[i + 1])
+    html = ''.join(output)
+    return html.strip() if strip else html
+
+
+def can_split(html):
+    """
+    Indica se a página pode ser dividida no fim deste trecho sem mudar a minificação:
+    o trecho não pode terminar dentro de uma tag, de um comentário ou de um bloco preservado
+    """
+    tail = _PRESERVED_RE.split(html)[-1]
+    if tail.rfind('<') > tail.rfind('>'):
+        return False
+    opened = None
+    for opened in _OPEN_RE.finditer(tail):
+        pass
+    if opened is None:
+        return True
+    if opened.group().startswith('<!--'):
+        return '-->' in tail[opened.end():]
+    return False
+
+
+class MinifyCache:
+    """Cache LRU do HTML minificado, identificado pelo hash do HTML original"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def minify(self, html, strip=True):
+        key = (strip, hashlib.sha1(html).digest())
+        with self._lock:
+            minified = self._entries.get(key)
+            if minified is not None:
+                self._entries.move_to_end(key)
+                return minified
+        minified = minify_html(html.decode('utf-8'), strip).encode('utf-8')
+        with self._lock:
+            self._entries[key] = minified
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return minified
+
+
+minify_cache = MinifyCache(MINIFY_CACHE_SIZE)
+
+
+def minify_response(response):
+    """Minifica respostas HTML completas das páginas públicas (o admin fica como está)"""
+    if (not ENABLED or response.status_code != 200 or response.mimetype != 'text/html'
+            or response.is_streamed or response.direct_passthrough
+            or (request.endpoint or '').startswith('admin')):
+        return response
+    response.set_data(minify_cache.minify(response.get_data()))
+    return response
+
+
+def minify_part(html):
+    """Trecho de uma página enviada em partes, minificado se a minificação estiver ativa"""
+    data = html.encode('utf-8')
+    return minify_cache.minify(data, strip=False) if ENABLED else data
+
+
+def init_app(app):
+    app.after_request(minify_response)
@@ -0,0 +1,159 @@
+"""
+Cabeçalhos Link: rel=preload e 103 Early Hints
+Os recursos críticos de cada rota (CSS, scripts, logo e imagens com fetchpriority=high)
+são extraídos do próprio HTML renderizado e memorizados por rota e pela revisão das
+seções usadas na página; nas requisições seguintes eles saem no cabeçalho Link e,
+se o servidor oferecer wsgi.early_hints, em uma resposta 103 antes da renderização
+"""
+import os
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+from flask import g, request
+from tenants import current_tenant
+
+ENABLED = os.environ.get('PRELOAD_HEADERS', '1') == '1'
+PRELOAD_MAX_LINKS = int(os.environ.get('PRELOAD_MAX_LINKS', 8))
+PRELOAD_CACHE_SIZE = int(os.environ.get('PRELOAD_CACHE_SIZE', 256))
+
+
+class CriticalAssetParser(HTMLParser):
+    """Coleta (url, tipo, prioridade) dos recursos necessários para a primeira renderização"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.assets = []
+        self._seen = set()
+        self._in_main = False
+
+    def _add(self, url, kind, priority=None):
+        if url and url not in self._seen and not url.startswith('data:'):
+            self._seen.add(url)
+            self.assets.append((url, kind, priority))
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'main':
+            self._in_main = True
+        elif tag == 'link':
+            rel = (attrs.get('rel') or '').lower().split()
+            if 'stylesheet' in rel:
+                self._add(attrs.get('href'), 'style')
+            elif 'preload' in rel and attrs.get('as'):
+                self._add(attrs.get('href'), attrs['as'], attrs.get('fetchpriority'))
+        elif tag == 'script':
+            self._add(attrs.get('src'), 'script')
+        elif tag == 'img':
+            # Imagens do cabeçalho (logo) e as marcadas como prioritárias no conteúdo
+            priority = attrs.get('fetchpriority')
+            if priority == 'high' or (not self._in_main and attrs.get('loading') != 'lazy'):
+                self._add(attrs.get('src'), 'image', priority)
+
+    handle_startendtag = handle_starttag
+
+
+def critical_assets(html):
+    """Recursos críticos de uma página, na ordem em que aparecem"""
+    parser = CriticalAssetParser()
+    parser.feed(html)
+    parser.close()
+    return parser.assets
+
+
+def link_header(assets):
+    """Valor do cabeçalho Link com um preload para cada recurso"""
+    links = []
+    for url, kind, priority in assets:
+        link = f'<{url}>; rel=preload; as={kind}'
+        if priority:
+            link += f'; fetchpriority={priority}'
+        links.append(link)
+    return ', '.join(links)
+
+
+class PreloadHints:
+    """
+    Memoriza o cabeçalho Link de cada rota junto com as revisões das seções usadas
+    na página; a entrada deixa de valer quando alguma dessas seções muda
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._revisions = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def init_app(self, app, revisions):
+        """revisions(seções) retorna as revisões atuais das seções (ex.: 'footer', 'pages.sobre')"""
+        if not ENABLED:
+            return
+        self._revisions = revisions
+        app.before_request(self._send_early_hints)
+        app.after_request(self._add_link_header)
+
+    def _key(self):
+        return (current_tenant(), request.endpoint, tuple(sorted((request.view_args or {}).items())))
+
+    def lookup(self, key):
+        """Cabeçalho Link memorizado para a rota, se ainda corresponder às revisões atuais"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            return None
+        sections, revisions, header = entry
+        if self._revisions(sections) != revisions:
+            return None
+        return header
+
+    def store(self, key, sections, header):
+        sections = tuple(sorted(sections))
+        with self._lock:
+            self._entries[key] = (sections, self._revisions(sections), header)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _tracked(self):
+        # Apenas páginas públicas (que registram as seções usadas) recebem os preloads
+        return request.method == 'GET' and 'surrogate_keys' in g
+
+    def _send_early_hints(self):
+        if request.method != 'GET' or (request.endpoint or '').startswith(('admin', 'static', 'api')):
+            return
+        header = self.lookup(self._key())
+        g.preload_header = header
+        early_hints = request.environ.get('wsgi.early_hints')
+        if header and early_hints is not None:
+            try:
+                early_hints([('Link', header)])
+            except Exception:
+                # Early Hints é apenas uma otimização; a resposta normal segue
+                pass
+
+    def _store_page(self, html):
+        header = link_header(critical_assets(html)[:PRELOAD_MAX_LINKS])
+        self.store(self._key(), g.surrogate_keys, header)
+        return header
+
+    def page_streamed(self, html):
+        """Registra os recursos de uma página enviada em partes (o corpo não passa pelo after_request)"""
+        if self._tracked() and g.get('preload_header') is None:
+            self._store_page(html)
+
+    def _add_link_header(self, response):
+        if not self._tracked() or response.status_code != 200 or response.mimetype != 'text/html':
+            return response
+        header = g.get('preload_header')
+        if header is None:
+            if response.is_streamed or response.direct_passthrough:
+                # Corpo ainda não gerado: os recursos são registrados em page_streamed
+                return response
+            header = self._store_page(response.get_data(as_text=True))
+        if header:
+            response.headers['Link'] = header
+        return response
+
+
+preload_hints = PreloadHints(PRELOAD_CACHE_SIZE)
@@ -0,0 +1,265 @@
+"""
+Busca em texto completo sobre o conteúdo do site
+Índice invertido em memória com normalização de acentos, stemming leve para o
+português e ranking BM25, atualizado por seção sem reconstruir o índice inteiro
+"""
+import math
+import re
+import threading
+import unicodedata
+
+# Página onde o conteúdo de cada seção é exibido; seções fora desta lista não são indexadas
+SECTION_URLS = {
+    'welcome': '/',
+    'valores': '/',
+    'agenda': '/',
+    'events': '/',
+    'videos': '/',
+    'slides': '/',
+    'pages.sobre': '/sobre',
+    'pages.atividades': '/atividades',
+    'pages.consultas': '/consultas',
+    'pages.contato': '/contato',
+}
+
+# Campos que não contêm texto para busca
+SKIPPED_FIELDS = {'id', 'icon', 'image', 'filename', 'url', 'button_url', 'button_text',
+                  'starts_at', 'ends_at', 'date', 'start_time', 'end_time', 'day', 'month', 'archived'}
+
+STOPWORDS = {
+    'a', 'ao', 'aos', 'as', 'com', 'como', 'da', 'das', 'de', 'do', 'dos', 'e', 'ela', 'ele',
+    'em', 'entre', 'era', 'essa', 'esse', 'esta', 'este', 'eu', 'foi', 'ha', 'isso', 'isto',
+    'ja', 'mais', 'mas', 'me', 'mesmo', 'na', 'nas', 'nao', 'no', 'nos', 'nossa', 'nossas',
+    'nosso', 'nossos', 'num', 'numa', 'o', 'os', 'ou', 'para', 'pela', 'pelas', 'pelo',
+    'pelos', 'por', 'qual', 'quando', 'que', 'se', 'sem', 'ser', 'seu', 'seus', 'so', 'sua',
+    'suas', 'tambem', 'te', 'tem', 'um', 'uma', 'umas', 'uns', 'voce', 'voces',
+}
+
+# Regras do stemmer (palavras já sem acentos), aplicadas em três etapas como no RSLP:
+# plural, sufixos derivacionais e vogal temática
+_PLURAL_SUFFIXES = (
+    ('oes', 'ao'), ('aes', 'ao'), ('ais', 'al'), ('eis', 'el'), ('ois', 'ol'),
+    ('ns', 'm'), ('res', 'r'), ('ses', 's'), ('s', ''),
+)
+_DERIVATIONAL_SUFFIXES = (
+    'amentos', 'imentos', 'amento', 'imento', 'idades', 'idade', 'mente',
+    'ancia', 'encia', 'acao', 'icao', 'ismo', 'ista', 'avel', 'ivel',
+    'oso', 'osa', 'ico', 'ica', 'al',
+)
+_MIN_STEM = 3
+
+_TOKEN_RE = re.compile(r'\w+')
+
+K1 = 1.2
+B = 0.75
+
+
+def fold(text):
+    """Converte para minúsculas e remove acentos"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def stem(word):
+    """Stemmer leve para o português: remove plural, sufixos comuns e a vogal final"""
+    for suffix, replacement in _PLURAL_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            word = word[:-len(suffix)] + replacement
+            break
+    for suffix in _DERIVATIONAL_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            word = word[:-len(suffix)]
+            break
+    if word[-1:] in ('a', 'e', 'o') and len(word) - 1 >= _MIN_STEM:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Lista de termos (normalizados e reduzidos) de um texto"""
+    return [stem(token) for token in _TOKEN_RE.findall(fold(text))
+            if len(token) > 1 and token not in STOPWORDS]
+
+
+def _collect_strings(value, out):
+    if isinstance(value, str):
+        if value.strip():
+            out.append(value.strip())
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if key not in SKIPPED_FIELDS:
+                _collect_strings(item, out)
+    elif isinstance(value, list):
+        for item in value:
+            _collect_strings(item, out)
+
+
+def build_documents(section, value):
+    """
+    Divide uma seção em documentos: cada elemento de uma lista vira um documento
+    próprio e o restante do texto da seção forma um documento com o título da seção
+    """
+    url = SECTION_URLS.get(section)
+    if url is None or value is None:
+        return []
+
+    documents = []
+    section_title = value.get('title') if isinstance(value, dict) else None
+
+    def walk(node, path, title):
+        if isinstance(node, list):
+            for i, item in enumerate(node):
+                texts = []
+                _collect_strings(item, texts)
+                if texts:
+                    item_title = item.get('title') if isinstance(item, dict) else None
+                    documents.append({
+                        'id': f'{path}.{i}',
+                        'section': section,
+                        'title': item_title or title or '',
+                        'text': ' '.join(texts),
+                        'url': url,
+                    })
+            return []
+        if isinstance(node, dict):
+            rest = []
+            node_title = node.get('title') if isinstance(node.get('title'), str) else title
+            for key, item in node.items():
+                if key in SKIPPED_FIELDS:
+                    continue
+                rest.extend(walk(item, f'{path}.{key}', node_title))
+            return rest
+        if isinstance(node, str) and node.strip():
+            return [node.strip()]
+        return []
+
+    rest = walk(value, section, section_title)
+    if rest:
+        documents.append({
+            'id': section,
+            'section': section,
+            'title': section_title or '',
+            'text': ' '.join(rest),
+            'url': url,
+        })
+    return documents
+
+
+def expand_sections(data):
+    """Divide os dados do site em seções indexáveis (cada página vira 'pages.<nome>')"""
+    sections = {}
+    for key, value in data.items():
+        if key == 'pages' and isinstance(value, dict):
+            for name, page in value.items():
+                sections[f'pages.{name}'] = page
+        elif key in SECTION_URLS:
+            sections[key] = value
+    return sections
+
+
+class SearchIndex:
+    """Índice invertido com ranking BM25"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}        # termo -> {doc_id: frequência}
+        self._documents = {}       # doc_id -> documento
+        self._lengths = {}         # doc_id -> número de termos
+        self._doc_terms = {}       # doc_id -> termos distintos (para remoção)
+        self._word_terms = {}      # doc_id -> termos de cada palavra do texto
+        self._section_docs = {}    # seção -> [doc_id]
+        self._section_revisions = {}
+        self._total_length = 0
+
+    def update_section(self, section, value, revision=None):
+        """Reindexa apenas os documentos de uma seção"""
+        documents = build_documents(section, value)
+        tokenized = [(doc, tokenize(f"{doc['title']} {doc['text']}")) for doc in documents]
+        # Termos de cada palavra do texto, usados para montar o trecho exibido nos resultados
+        word_terms = {doc['id']: [tuple(tokenize(word)) for word in doc['text'].split()]
+                      for doc in documents}
+        with self._lock:
+            self._remove_section(section)
+            doc_ids = []
+            for doc, terms in tokenized:
+                doc_id = doc['id']
+                doc_ids.append(doc_id)
+                self._documents[doc_id] = doc
+                self._lengths[doc_id] = len(terms)
+                self._doc_terms[doc_id] = set(terms)
+                self._word_terms[doc_id] = word_terms[doc_id]
+                self._total_length += len(terms)
+                for term in terms:
+                    postings = self._postings.setdefault(term, {})
+                    postings[doc_id] = postings.get(doc_id, 0) + 1
+            self._section_docs[section] = doc_ids
+            self._section_revisions[section] = revision
+
+    def remove_section(self, section):
+        """Remove os documentos de uma seção do índice"""
+        with self._lock:
+            self._remove_section(section)
+            self._section_revisions.pop(section, None)
+
+    def sync(self, sections, revisions):
+        """Reindexa as seções cuja revisão mudou e remove as que deixaram de existir"""
+        for section, value in sections.items():
+            revision = revisions.get(section)
+            if revision is None or self._section_revisions.get(section) != revision:
+                self.update_section(section, value, revision)
+        for section in list(self._section_revisions):
+            if section not in sections:
+                self.remove_section(section)
+
+    def search(self, query, limit=10):
+        """Retorna os documentos mais relevantes para a consulta, ordenados por BM25"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            n_docs = len(self._documents)
+            if not n_docs:
+                return []
+            avg_length = self._total_length / n_docs
+            scores = {}
+            for term in dict.fromkeys(terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, freq in postings.items():
+                    norm = K1 * (1 - B + B * self._lengths[doc_id] / avg_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (K1 + 1) / (freq + norm)
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+            documents = [(self._documents[doc_id], self._word_terms[doc_id], score)
+                         for doc_id, score in ranked]
+
+        wanted = set(terms)
+        return [dict(doc, score=round(score, 4), snippet=snippet(doc['text'], word_terms, wanted))
+                for doc, word_terms, score in documents]
+
+    def _remove_section(self, section):
+        # Percorre apenas os termos dos documentos da seção, não o vocabulário inteiro
+        for doc_id in self._section_docs.pop(section, []):
+            self._documents.pop(doc_id, None)
+            self._total_length -= self._lengths.pop(doc_id, 0)
+            self._word_terms.pop(doc_id, None)
+            for term in self._doc_terms.pop(doc_id, ()):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+
+def snippet(text, word_terms, wanted, width=180):
+    """Trecho do texto em torno da primeira palavra que corresponde à consulta"""
+    words = text.split()
+    start = next((i for i, terms in enumerate(word_terms) if wanted.intersection(terms)), 0)
+    start = max(0, start - 12)
+    excerpt = ' '.join(words[start:])
+    if len(excerpt) > width:
+        excerpt = excerpt[:width].rsplit(' ', 1)[0] + '…'
+    return ('…' if start else '') + excerpt
@@ -0,0 +1,180 @@
+"""
+Inicialização sob demanda e prontidão do worker (/healthz)
+Dependências pesadas (SQLAlchemy, driver do banco, migração) não são importadas junto
+com o app: a configuração do banco roda uma vez, antes da primeira requisição, e o
+aquecimento dos caches (dados do site, páginas pré-renderizadas) roda em segundo plano,
+a partir da primeira verificação do /healthz.
+O /healthz responde 503 até os caches estarem quentes e 200 depois, para o balanceador
+só mandar tráfego a instâncias prontas
+"""
+import importlib
+import json
+import os
+import threading
+import time
+
+HEALTHZ_PATH = os.environ.get('HEALTHZ_PATH', '/healthz')
+# Espera antes de tentar de novo um aquecimento que falhou
+WARMUP_RETRY_INTERVAL = float(os.environ.get('WARMUP_RETRY_INTERVAL', 30))
+
+
+class LazyModule:
+    """Módulo importado no primeiro acesso a um atributo; on_load roda logo após o import"""
+
+    def __init__(self, name, on_load=None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self._name)
+            if self._on_load:
+                self._on_load()
+            self._module = module
+        return getattr(module, attr)
+
+
+class Startup:
+    """Etapas de configuração (uma vez por worker) e de aquecimento dos caches"""
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.RLock()
+        self._setup_steps = []
+        self._warmup_steps = []
+        self._status = []
+        self._in_setup = False
+        self._thread = None
+        self._failed_at = None
+        self.started_at = time.monotonic()
+        self.setup_done = False
+        self.setup_seconds = None
+        self.warm = False
+        self.warmup_seconds = {}
+        self.error = None
+
+    def init_app(self, app):
+        self.app = app
+        app.wsgi_app = StartupMiddleware(app.wsgi_app, self)
+
+    def add_setup(self, fn):
+        """fn() roda uma vez, antes da primeira requisição (ou do primeiro uso do backend)"""
+        self._setup_steps.append(fn)
+
+    def add_warmup(self, name, fn):
+        """fn() roda em segundo plano, após a configuração, antes de o worker ficar pronto"""
+        self._warmup_steps.append((name, fn))
+
+    def add_status(self, name, fn):
+        """Inclui fn() no corpo do /healthz (métricas para o monitoramento)"""
+        self._status.append((name, fn))
+
+    def ensure_setup(self):
+        if self.setup_done:
+            return
+        with self._lock:
+            # Chamada de dentro de uma etapa (ex.: primeiro acesso ao backend): já em andamento
+            if self.setup_done or self._in_setup:
+                return
+            self._in_setup = True
+            start = time.perf_counter()
+            try:
+                for fn in self._setup_steps:
+                    fn()
+            finally:
+                self._in_setup = False
+            self.setup_seconds = round(time.perf_counter() - start, 3)
+            self.setup_done = True
+
+    def start_warmup(self):
+        """Inicia o aquecimento em segundo plano (uma vez; de novo após uma falha)"""
+        if self.warm or not self._warmup_steps:
+            return
+        with self._lock:
+            if self.warm or (self._thread and self._thread.is_alive()):
+                return
+            if self._failed_at and time.monotonic() - self._failed_at < WARMUP_RETRY_INTERVAL:
+                return
+            self._thread = threading.Thread(target=self._warm_up, name='startup-warmup', daemon=True)
+            self._thread.start()
+
+    def wait_warm(self):
+        """Inicia o aquecimento e espera ele terminar (bloqueante); True se o worker ficou pronto"""
+        self.start_warmup()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        return self.ready
+
+    def _warm_up(self):
+        try:
+            self.ensure_setup()
+            for name, fn in self._warmup_steps:
+                start = time.perf_counter()
+                fn()
+                self.warmup_seconds[name] = round(time.perf_counter() - start, 3)
+        except Exception as e:
+            self.error = str(e)
+            self._failed_at = time.monotonic()
+            self.app.logger.error(f"Erro ao aquecer os caches do worker: {e}")
+            return
+        self.error = None
+        self.warm = True
+
+    @property
+    def ready(self):
+        return self.warm or (self.setup_done and not self._warmup_steps)
+
+    def status(self):
+        """Estado de prontidão do worker (corpo do /healthz)"""
+        status = {
+            'status': 'ready' if self.ready else 'starting',
+            'uptime': round(time.monotonic() - self.started_at, 3),
+            'setup_seconds': self.setup_seconds,
+            'warmup_seconds': self.warmup_seconds,
+            'error': self.error,
+        }
+        for name, fn in self._status:
+            status[name] = fn()
+        return status
+
+    def healthz(self):
+        """(status HTTP, cabeçalhos, corpo) da verificação de prontidão"""
+        if not self._warmup_steps:
+            self.ensure_setup()
+        self.start_warmup()
+        ready = self.ready
+        body = json.dumps(self.status()).encode('utf-8')
+        headers = [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+            ('Cache-Control', 'no-store'),
+        ]
+        if not ready:
+            headers.append(('Retry-After', '1'))
+        return ('200 OK' if ready else '503 Service Unavailable'), headers, body
+
+
+class StartupMiddleware:
+    """
+    Responde o /healthz sem passar pelo Flask (sem tenant, banco ou sessão) e roda a
+    configuração antes de a primeira requisição chegar à aplicação
+    O aquecimento começa na primeira consulta ao /healthz (verificação do balanceador)
+    """
+
+    def __init__(self, wsgi_app, startup):
+        self.wsgi_app = wsgi_app
+        self.startup = startup
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') == HEALTHZ_PATH:
+            status, headers, body = self.startup.healthz()
+            start_response(status, headers)
+            return [body]
+        self.startup.ensure_setup()
+        return self.wsgi_app(environ, start_response)
+
+
+startup = Startup()
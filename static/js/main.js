@@ -1,4 +1,7 @@
 // Carousel Functionality
+const SLIDE_INTERVAL = 5000; // Change slide every 5 seconds
+const SLIDE_PRELOAD_AHEAD = 1500; // Load the next image this long before it rotates in
+
 function initCarousel() {
     const slides = document.querySelectorAll('.carousel-slide');
     const dots = document.querySelectorAll('.dot');
@@ -7,8 +10,27 @@ function initCarousel() {
     
     let currentSlide = 0;
     let autoSlideInterval;
+    let preloadTimeout;
+    
+    // Images after the first one only have data-src until they are needed
+    function loadSlide(index) {
+        const image = slides[index] && slides[index].querySelector('img[data-src]');
+        if (image) {
+            image.src = image.dataset.src;
+            image.removeAttribute('data-src');
+        }
+    }
+    
+    function scheduleNextLoad(index) {
+        clearTimeout(preloadTimeout);
+        preloadTimeout = setTimeout(() => loadSlide((index + 1) % slides.length),
+                                    SLIDE_INTERVAL - SLIDE_PRELOAD_AHEAD);
+    }
     
     function showSlide(index) {
+        loadSlide(index);
+        scheduleNextLoad(index);
+        
         // Remove active class from all slides and dots
         slides.forEach(slide => slide.classList.remove('active'));
         dots.forEach(dot => dot.classList.remove('active'));
@@ -36,7 +58,7 @@ function initCarousel() {
     }
     
     function startAutoSlide() {
-        autoSlideInterval = setInterval(nextSlide, 5000); // Change slide every 5 seconds
+        autoSlideInterval = setInterval(nextSlide, SLIDE_INTERVAL);
     }
     
     function stopAutoSlide() {
@@ -62,6 +84,7 @@ function initCarousel() {
     }
     
     // Start auto-slide
+    scheduleNextLoad(0);
     startAutoSlide();
 }
 
@@ -97,6 +120,19 @@ document.addEventListener('DOMContentLoaded', function() {
     // Form validation
     const contactForm = document.querySelector('.contact-form');
     if (contactForm) {
+        const formMessage = document.querySelector('.form-message');
+        const submitButton = contactForm.querySelector('button[type="submit"]');
+
+        function showFormMessage(lines, success) {
+            formMessage.hidden = false;
+            formMessage.className = 'form-message ' + (success ? 'form-message-success' : 'form-message-error');
+            formMessage.replaceChildren(...lines.map(function(line) {
+                const p = document.createElement('p');
+                p.textContent = line;
+                return p;
+            }));
+        }
+
         contactForm.addEventListener('submit', function(e) {
             e.preventDefault();
             
@@ -106,20 +142,39 @@ document.addEventListener('DOMContentLoaded', function() {
             const mensagem = document.getElementById('mensagem').value.trim();
             
             if (!nome || !email || !mensagem) {
-                alert('Por favor, preencha todos os campos obrigatórios.');
+                showFormMessage(['Por favor, preencha todos os campos obrigatórios.'], false);
                 return;
             }
             
             // Email validation
             const emailRegex = /^[^\s@]+@[^\s@]+\.[^\s@]+$/;
             if (!emailRegex.test(email)) {
-                alert('Por favor, insira um email válido.');
+                showFormMessage(['Por favor, insira um email válido.'], false);
                 return;
             }
             
-            // Here you would normally send the form data to the server
-            alert('Mensagem enviada com sucesso! Entraremos em contato em breve.');
-            contactForm.reset();
+            // Envio para o servidor; a notificação por email sai em segundo plano
+            submitButton.disabled = true;
+            fetch(contactForm.action, {
+                method: 'POST',
+                body: new FormData(contactForm),
+                headers: { 'Accept': 'application/json' }
+            })
+                .then(function(response) { return response.json(); })
+                .then(function(result) {
+                    if (result.ok) {
+                        showFormMessage([result.message || 'Mensagem enviada com sucesso! Entraremos em contato em breve.'], true);
+                        contactForm.reset();
+                    } else {
+                        showFormMessage(result.errors || ['Não foi possível enviar sua mensagem. Tente novamente.'], false);
+                    }
+                })
+                .catch(function() {
+                    showFormMessage(['Não foi possível enviar sua mensagem. Verifique sua conexão e tente novamente.'], false);
+                })
+                .finally(function() {
+                    submitButton.disabled = false;
+                });
         });
     }
 });
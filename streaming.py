@@ -0,0 +1,126 @@
+"""
+Renderização das páginas públicas em partes (opcional, STREAM_TEMPLATES=1)
+As páginas são geradas com stream_template: o <head> e o cabeçalho são enviados assim
+que ficam prontos, antes do conteúdo (agenda, vídeos...), e o restante sai em blocos de
+pelo menos STREAM_BUFFER_SIZE caracteres, já minificados.
+Como os cabeçalhos HTTP saem antes do fim da renderização, o Surrogate-Key de cada rota
+vem da renderização anterior dela (na primeira, a tag de todo o conteúdo)
+"""
+import os
+import threading
+from collections import OrderedDict
+from flask import Response, current_app, g, render_template, request, stream_template, stream_with_context
+import minify
+from cdn import ALL_CONTENT_TAG, expect_surrogate_keys
+from tenants import current_tenant
+
+ENABLED = os.environ.get('STREAM_TEMPLATES', '0') == '1'
+STREAM_BUFFER_SIZE = int(os.environ.get('STREAM_BUFFER_SIZE', 4096))
+STREAM_CACHE_SIZE = int(os.environ.get('STREAM_CACHE_SIZE', 256))
+# O primeiro bloco vai até o início do conteúdo da página (head e cabeçalho)
+FIRST_FLUSH_MARKER = '<main'
+
+_listeners = []
+
+
+class RouteSections:
+    """Seções usadas na última renderização de cada rota (cache LRU)"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            sections = self._entries.get(key)
+            if sections is not None:
+                self._entries.move_to_end(key)
+            return sections
+
+    def set(self, key, sections):
+        with self._lock:
+            self._entries[key] = frozenset(sections)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+route_sections = RouteSections(STREAM_CACHE_SIZE)
+
+
+def add_stream_listener(fn):
+    """fn(html) é chamada com a página completa ao fim de cada envio em partes"""
+    _listeners.append(fn)
+
+
+def _route_key():
+    return (current_tenant(), request.endpoint, tuple(sorted((request.view_args or {}).items())))
+
+
+def _chunks(template_name, context):
+    """Texto da página em blocos: o primeiro até o <main>, os demais por tamanho"""
+    stream = stream_template(template_name, **context)
+    parts, size, due, first = [], 0, False, True
+    try:
+        for text in stream:
+            parts.append(text)
+            size += len(text)
+            due = due or size >= STREAM_BUFFER_SIZE or (first and FIRST_FLUSH_MARKER in text)
+            if not due:
+                continue
+            html = ''.join(parts)
+            # Não dividir dentro de uma tag ou de um <script>/<pre> (a minificação é por bloco)
+            if not minify.can_split(html):
+                continue
+            yield html
+            parts, size, due, first = [], 0, False, False
+        if parts:
+            yield ''.join(parts)
+    finally:
+        # Cliente desconectado: libera o contexto da requisição mantido pelo stream_template
+        stream.close()
+
+
+def _body(chunks, first, key):
+    sent = [first]
+    try:
+        yield minify.minify_part(first)
+        for html in chunks:
+            sent.append(html)
+            yield minify.minify_part(html)
+    except Exception as e:
+        # Os cabeçalhos (200, com s-maxage) já foram enviados: a exceção faz o servidor
+        # interromper a conexão sem o bloco final, e o CDN descarta a página incompleta
+        current_app.logger.error(f"Erro ao renderizar a página {request.path} em partes: {e}")
+        raise
+    finally:
+        chunks.close()
+    if 'surrogate_keys' in g:
+        route_sections.set(key, g.surrogate_keys)
+    if _listeners:
+        html = ''.join(sent)
+        for fn in _listeners:
+            try:
+                fn(html)
+            except Exception as e:
+                current_app.logger.error(f"Erro ao processar a página enviada em partes: {e}")
+
+
+def render_page(template_name, **context):
+    """
+    Renderiza uma página pública: com o streaming ativo, a resposta é enviada em partes;
+    caso contrário (ou fora de um GET), equivale a render_template
+    """
+    if not ENABLED or request.method != 'GET':
+        return render_template(template_name, **context)
+    chunks = _chunks(template_name, context)
+    # O primeiro bloco é renderizado aqui: erros no head/cabeçalho ainda geram a resposta de erro normal
+    first = next(chunks, '')
+    key = _route_key()
+    if 'surrogate_keys' in g:
+        expect_surrogate_keys(route_sections.get(key) or [ALL_CONTENT_TAG])
+    response = Response(stream_with_context(_body(chunks, first, key)), mimetype='text/html')
+    # Proxies como o nginx não devem acumular a resposta antes de repassá-la
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
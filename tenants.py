@@ -0,0 +1,188 @@
+"""
+Hospedagem de vários sites (casas) no mesmo processo
+Cada host da requisição é associado a um tenant; dados, caches e templates são
+separados por tenant, enquanto os workers e os templates compilados são compartilhados
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import abort, g, request
+from flask.templating import Environment
+
+# Tenant dos hosts não configurados (e das tarefas sem tenant): usa os arquivos de data/
+DEFAULT_TENANT = os.environ.get('DEFAULT_TENANT', 'default')
+
+# Recusar (404) hosts que não pertencem a nenhum tenant configurado
+TENANT_STRICT = os.environ.get('TENANT_STRICT', '0') == '1'
+
+_NAME_RE = re.compile(r'^[a-z0-9][a-z0-9_-]{0,49}$')
+
+
+def parse_tenants(value):
+    """
+    Lê a configuração 'nome:host1,host2;nome2:host3' e retorna {host: nome}
+    Nomes de tenant inválidos (usados em caminhos de arquivos) são rejeitados
+    """
+    hosts = {}
+    for entry in (value or '').split(';'):
+        if not entry.strip():
+            continue
+        name, _, host_list = entry.partition(':')
+        name = name.strip().lower()
+        if not _NAME_RE.match(name):
+            raise ValueError(f'Nome de tenant inválido: {name!r}')
+        for host in host_list.split(','):
+            host = host.strip().lower()
+            if host:
+                hosts[host] = name
+    return hosts
+
+
+TENANT_HOSTS = parse_tenants(os.environ.get('SITE_TENANTS', ''))
+
+_current = ContextVar('tenant', default=DEFAULT_TENANT)
+
+
+def current_tenant():
+    """Tenant da requisição (ou da tarefa) atual"""
+    return _current.get()
+
+
+def tenant_names():
+    """Tenants configurados, incluindo o padrão"""
+    return sorted(set(TENANT_HOSTS.values()) | {DEFAULT_TENANT})
+
+
+def tenant_for_host(host):
+    """Tenant de um host (sem a porta); None se desconhecido e TENANT_STRICT estiver ativo"""
+    host = (host or '').split(':', 1)[0].strip().lower()
+    tenant = TENANT_HOSTS.get(host)
+    if tenant is None and not TENANT_STRICT:
+        return DEFAULT_TENANT
+    return tenant
+
+
+def tenant_host(tenant=None):
+    """Primeiro host configurado para o tenant (ex.: para pré-renderizar páginas)"""
+    tenant = tenant or current_tenant()
+    for host, name in TENANT_HOSTS.items():
+        if name == tenant:
+            return host
+    return None
+
+
+@contextmanager
+def tenant_context(tenant):
+    """Executa um bloco (ex.: uma tarefa em segundo plano) como o tenant informado"""
+    token = _current.set(tenant)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def tenant_path(base_dir, *parts, tenant=None):
+    """
+    Caminho de um arquivo do tenant: o tenant padrão usa base_dir diretamente
+    e os demais usam base_dir/tenants/<nome>
+    """
+    tenant = tenant or current_tenant()
+    if tenant == DEFAULT_TENANT:
+        return os.path.join(base_dir, *parts)
+    return os.path.join(base_dir, 'tenants', tenant, *parts)
+
+
+class TenantRegistry:
+    """
+    Objetos por tenant (caches, índices) criados sob demanda por factory(tenant)
+    Mantém no máximo max_tenants; o tenant usado há mais tempo é descartado
+    """
+
+    def __init__(self, factory, max_tenants=32):
+        self._factory = factory
+        self.max_tenants = max_tenants
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, tenant=None):
+        tenant = tenant or current_tenant()
+        with self._lock:
+            item = self._items.get(tenant)
+            if item is not None:
+                self._items.move_to_end(tenant)
+                return item
+            item = self._factory(tenant)
+            self._items[tenant] = item
+            while len(self._items) > self.max_tenants:
+                self._items.popitem(last=False)
+            return item
+
+    def values(self):
+        with self._lock:
+            return list(self._items.values())
+
+
+class TenantEnvironment(Environment):
+    """
+    Ambiente Jinja compartilhado por todos os tenants
+    Um template em templates/tenants/<tenant>/ substitui o de mesmo nome para aquele
+    tenant; os demais templates são compilados uma única vez e servem a todos
+    """
+
+    def get_template(self, name, parent=None, globals=None):
+        if isinstance(name, str):
+            name = self.tenant_template(name)
+        return super().get_template(name, parent, globals)
+
+    def tenant_template(self, name):
+        tenant = current_tenant()
+        if tenant == DEFAULT_TENANT or name.startswith('tenants/'):
+            return name
+        override = f'tenants/{tenant}/{name}'
+        return override if override in self._overrides(tenant) else name
+
+    def _overrides(self, tenant):
+        """Templates próprios do tenant (lidos uma vez; sempre relidos com auto_reload)"""
+        cache = self.__dict__.setdefault('_tenant_overrides', {})
+        if tenant in cache and not self.auto_reload:
+            return cache[tenant]
+        found = set()
+        folder = os.path.join(self.app.root_path, self.app.template_folder or 'templates',
+                              'tenants', tenant)
+        for root, _, files in os.walk(folder):
+            for filename in files:
+                relative = os.path.relpath(os.path.join(root, filename), folder).replace(os.sep, '/')
+                found.add(f'tenants/{tenant}/{relative}')
+        cache[tenant] = found
+        return found
+
+
+def init_app(app):
+    """Resolve o tenant de cada requisição pelo host e ativa os templates por tenant"""
+    # Precisa ser definido antes do primeiro acesso a app.jinja_env
+    app.jinja_environment = TenantEnvironment
+
+    @app.before_request
+    def _select_tenant():
+        tenant = tenant_for_host(request.host)
+        if tenant is None:
+            abort(404)
+        g.tenant = tenant
+        g._tenant_token = _current.set(tenant)
+
+    @app.teardown_request
+    def _reset_tenant(exc=None):
+        token = g.pop('_tenant_token', None)
+        if token is not None:
+            try:
+                _current.reset(token)
+            except ValueError:
+                # Token criado em outro contexto (ex.: streaming); apenas volta ao padrão
+                _current.set(DEFAULT_TENANT)
+
+    @app.context_processor
+    def _inject_tenant():
+        return dict(tenant=current_tenant())
@@ -0,0 +1,173 @@
+"""
+Limitação de tentativas de login e de envios do formulário de contato
+Token buckets por IP e por usuário guardados em SQLite (compartilhados entre os workers
+do gunicorn) e um limite de verificações de senha simultâneas em cada worker, para que
+uma rajada de logins não ocupe todos os workers calculando hashes; logins de usuários
+inexistentes esperam o tempo de um hash, sem calculá-lo
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from tenants import current_tenant
+
+THROTTLE_DB = os.environ.get(
+    'THROTTLE_DB',
+    os.path.join(os.path.dirname(__file__), 'data', 'cache', 'throttle.sqlite3')
+)
+
+# Tentativas em sequência (burst) e tentativas recuperadas por minuto
+LOGIN_IP_BURST = int(os.environ.get('LOGIN_IP_BURST', 10))
+LOGIN_IP_PER_MINUTE = float(os.environ.get('LOGIN_IP_PER_MINUTE', 10))
+LOGIN_USER_BURST = int(os.environ.get('LOGIN_USER_BURST', 5))
+LOGIN_USER_PER_MINUTE = float(os.environ.get('LOGIN_USER_PER_MINUTE', 2))
+
+# Mensagens do formulário de contato por IP (burst e recuperadas por hora)
+CONTACT_IP_BURST = int(os.environ.get('CONTACT_IP_BURST', 5))
+CONTACT_IP_PER_HOUR = float(os.environ.get('CONTACT_IP_PER_HOUR', 10))
+
+# Verificações de hash simultâneas por worker e espera máxima por uma vaga
+LOGIN_HASH_CONCURRENCY = int(os.environ.get('LOGIN_HASH_CONCURRENCY', 2))
+LOGIN_HASH_WAIT = float(os.environ.get('LOGIN_HASH_WAIT', 2))
+
+
+class ThrottledError(Exception):
+    """Tentativa recusada; retry_after indica em quantos segundos tentar de novo"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Muitas tentativas, tente novamente em {retry_after} segundos')
+        self.retry_after = retry_after
+
+
+class TokenBucketStore:
+    """Token buckets persistidos em SQLite, atualizados atomicamente entre processos"""
+
+    def __init__(self, path, prune_interval=600.0):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._schema_ready = False
+        self._last_prune = 0.0
+
+    def take(self, key, capacity, per_second, now=None):
+        """
+        Consome um token do bucket; retorna 0 se permitido ou os segundos até
+        o próximo token ficar disponível
+        """
+        now = time.time() if now is None else now
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tokens, updated_at FROM buckets WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                tokens = float(capacity)
+            else:
+                tokens = min(float(capacity), row[0] + (now - row[1]) * per_second)
+
+            if tokens >= 1:
+                tokens -= 1
+                retry_after = 0
+            else:
+                retry_after = max(1, int((1 - tokens) / per_second + 0.999))
+
+            conn.execute(
+                'INSERT INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                (key, tokens, now)
+            )
+            if now - self._last_prune > self.prune_interval:
+                # Buckets parados há muito tempo já estariam cheios; podem ser removidos
+                self._last_prune = now
+                conn.execute('DELETE FROM buckets WHERE updated_at < ?', (now - 86400,))
+            conn.execute('COMMIT')
+        return retry_after
+
+    @contextmanager
+    def _connect(self):
+        if not self._schema_ready:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            if not self._schema_ready:
+                conn.execute('PRAGMA journal_mode=WAL')
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS buckets ('
+                    'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+                )
+                self._schema_ready = True
+            yield conn
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+
+class LoginThrottle:
+    """Limita as tentativas de login por IP e por nome de usuário"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def check(self, ip, username):
+        """
+        Consome uma tentativa; levanta ThrottledError se o IP ou o usuário (do tenant
+        atual) excederem o limite
+        """
+        retry_after = self.store.take(f'ip:{ip}', LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE / 60)
+        if not retry_after and username:
+            retry_after = self.store.take(f'user:{current_tenant()}:{username.strip().lower()}',
+                                          LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE / 60)
+        if retry_after:
+            raise ThrottledError(retry_after)
+
+
+_hash_slots = threading.BoundedSemaphore(LOGIN_HASH_CONCURRENCY)
+
+
+@contextmanager
+def hash_slot():
+    """Reserva uma das vagas para verificar um hash de senha neste worker"""
+    if not _hash_slots.acquire(timeout=LOGIN_HASH_WAIT):
+        raise ThrottledError(int(LOGIN_HASH_WAIT) or 1)
+    try:
+        yield
+    finally:
+        _hash_slots.release()
+
+
+_hash_seconds = None
+_hash_seconds_lock = threading.Lock()
+
+
+def password_hash_seconds():
+    """Tempo de verificação de um hash de senha neste worker (medido uma vez)"""
+    global _hash_seconds
+    if _hash_seconds is None:
+        with _hash_seconds_lock:
+            if _hash_seconds is None:
+                from werkzeug.security import check_password_hash, generate_password_hash
+                hashed = generate_password_hash('medida')
+                start = time.perf_counter()
+                check_password_hash(hashed, 'outra')
+                _hash_seconds = time.perf_counter() - start
+    return _hash_seconds
+
+
+def pad_unverified_login():
+    """
+    Usuário inexistente ou inativo: nenhum hash é calculado, mas a resposta demora o mesmo
+    que uma verificação (espera sem usar CPU), para o tempo não revelar quais usuários existem
+    """
+    time.sleep(password_hash_seconds())
+
+
+def check_contact(ip):
+    """Consome um envio do formulário de contato; levanta ThrottledError acima do limite"""
+    retry_after = bucket_store.take(f'contact:{ip}', CONTACT_IP_BURST, CONTACT_IP_PER_HOUR / 3600)
+    if retry_after:
+        raise ThrottledError(retry_after)
+
+
+bucket_store = TokenBucketStore(THROTTLE_DB)
+login_throttle = LoginThrottle(bucket_store)